@@ -0,0 +1,33 @@
+"""
+usage: teuthology-benchmark -h
+       teuthology-benchmark --list
+       teuthology-benchmark [-v] [options] [<benchmark>...]
+
+Benchmark teuthology's scheduling and reporting hot paths using synthetic
+suites, archives and remote output streams.
+
+positional arguments:
+  <benchmark>                 Names of benchmarks to run. Defaults to all.
+
+optional arguments:
+  -h, --help                  Show this help message and exit
+  -v, --verbose               Be more verbose
+  --list                      List the available benchmarks
+  -r N, --repeat N            How many times to time each benchmark
+                              [default: 5]
+  -s N, --scale N             Size of the synthetic inputs [default: 1]
+  -o FILE, --output FILE      Write the results as JSON to FILE
+  -c FILE, --compare FILE     Compare against results previously written with
+                              --output, and exit non-zero on a regression
+  -t RATIO, --threshold RATIO
+                              The slowdown ratio considered a regression
+                              [default: 1.25]
+"""
+import docopt
+
+import teuthology.benchmark
+
+
+def main():
+    args = docopt.docopt(__doc__)
+    teuthology.benchmark.main(args)
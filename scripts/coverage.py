@@ -15,6 +15,8 @@ options:
                         analyze) [default: ../../coverage]
   --skip-init           skip initialization (useful if a run stopped partway
                         through)
+  -j N, --processes N   the number of tests to analyze, and of lcov merges to
+                        run, at once; 0 for one per CPU [default: 0]
   -v, --verbose         be more verbose
 """
 import docopt
@@ -54,6 +54,12 @@ options only for describing combinations represented by a suite:
                                      2/<outof> ... <outof>-1/<outof>
                                      will list all jobs in the
                                      suite (many more than once).
+  -j <procs>, --processes <procs>    Describe combinations in this many
+                                     processes; 0 means one per CPU. Ignored
+                                     with --limit. [default: 0]
+  --no-sort                          Do not sort the combinations. With the
+                                     json and csv formats, they are written
+                                     as they are described.
 """
 
 
@@ -0,0 +1,45 @@
+import docopt
+import sys
+
+import teuthology.config
+import teuthology.grep
+
+doc = """
+usage: teuthology-grep -h
+       teuthology-grep [-v] [options] <pattern> [<run>...]
+       teuthology-grep [-v] [options] --index [<run>...]
+       teuthology-grep [-v] [options] --failures [<pattern>]
+
+Search the logs of archived jobs in parallel, or index and look up the
+reasons jobs failed.
+
+positional arguments:
+  <pattern>                 A regular expression
+  <run>                     The names of the runs to search or index. By
+                            default, the newest runs are used.
+
+optional arguments:
+  -h, --help                Show this help message and exit
+  -v, --verbose             Be more verbose
+  -a DIR, --archive-dir DIR
+                            The archive directory
+                            [default: {archive_base}]
+  -n N, --last N            Use the newest N runs [default: 10]
+  -j N, --processes N       The number of worker processes; 0 for one per
+                            CPU [default: 0]
+  -i, --ignore-case         Ignore case when matching
+  -l, --files-with-matches  Only print the names of matching logs
+  -m N, --max-count N       Stop reading a log after N matching lines; 0 for
+                            no limit [default: 0]
+  --remote                  Also search the logs collected from test nodes
+  --index                   Add the normalized failure reasons of the jobs in
+                            the runs to the failure signature index
+  --failures                Print the indexed failure signatures, most common
+                            first, with the jobs which hit them. If <pattern>
+                            is given, only matching signatures are printed.
+""".format(archive_base=teuthology.config.config.archive_base)
+
+
+def main():
+    args = docopt.docopt(doc)
+    sys.exit(teuthology.grep.main(args))
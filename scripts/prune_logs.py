@@ -29,6 +29,9 @@ optional arguments:
                         Compress (using gzip) any teuthology.log files older
                         than DAYS. Negative values will skip this operation.
                         [default: 30]
+  --seekable            Compress logs as independently compressed blocks with
+                        an index, so that they can be read from any line or
+                        timestamp. gzip tools can still read them.
 """.format(archive_base=teuthology.config.config.archive_base)
 
 
@@ -0,0 +1,18 @@
+import docopt
+
+from script import Script
+from scripts import benchmark
+
+doc = benchmark.__doc__
+
+
+class TestBenchmark(Script):
+    script_name = 'teuthology-benchmark'
+
+    def test_args(self):
+        args = docopt.docopt(doc, ["-s", "2", "--compare", "base.json",
+                                   "matrix_index", "job_info"])
+        assert args["--scale"] == "2"
+        assert args["--repeat"] == "5"
+        assert args["--compare"] == "base.json"
+        assert args["<benchmark>"] == ["matrix_index", "job_info"]
@@ -17,6 +17,7 @@ class TestCoverage(Script):
             "--html-output=html/output/dir",
             "--cov-tools-dir=cov/tools/dir",
             "--verbose",
+            "--processes=4",
             "some/test/dir"]
         )
         assert args["--skip-init"]
@@ -25,6 +26,7 @@ class TestCoverage(Script):
         assert args["--html-output"] == "html/output/dir"
         assert args["--cov-tools-dir"] == "cov/tools/dir"
         assert args["--verbose"]
+        assert args["--processes"] == "4"
 
     def test_missing_optional_args(self):
         args = docopt(doc, [
@@ -35,3 +37,4 @@ class TestCoverage(Script):
         assert not args['--skip-init']
         assert not args['--verbose']
         assert args['--cov-tools-dir'] == "../../coverage"
+        assert args['--processes'] == "0"
@@ -0,0 +1,22 @@
+import docopt
+
+from script import Script
+from scripts import grep
+
+doc = grep.doc
+
+
+class TestGrep(Script):
+    script_name = 'teuthology-grep'
+
+    def test_args(self):
+        args = docopt.docopt(doc, ["-i", "-n", "3", "FAILED assert", "run1"])
+        assert args["--ignore-case"]
+        assert args["--last"] == "3"
+        assert args["<pattern>"] == "FAILED assert"
+        assert args["<run>"] == ["run1"]
+
+    def test_failures(self):
+        args = docopt.docopt(doc, ["--failures"])
+        assert args["--failures"]
+        assert args["<pattern>"] is None
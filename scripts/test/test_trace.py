@@ -0,0 +1,16 @@
+import docopt
+
+from script import Script
+from scripts import trace
+
+doc = trace.__doc__
+
+
+class TestTrace(Script):
+    script_name = 'teuthology-trace'
+
+    def test_args(self):
+        args = docopt.docopt(doc, ["--top", "3", "some/archive/dir"])
+        assert args["--top"] == "3"
+        assert not args["--json"]
+        assert args["<archive_dir>"] == "some/archive/dir"
@@ -0,0 +1,24 @@
+"""
+usage: teuthology-trace -h
+       teuthology-trace [-v] [--json] [-n N] <archive_dir>
+
+Summarize the per-command telemetry recorded by jobs run with
+'command_trace' enabled.
+
+positional arguments:
+  <archive_dir>       The archive directory of a run or of a single job
+
+optional arguments:
+  -h, --help          Show this help message and exit
+  -v, --verbose       Be more verbose
+  -n N, --top N       How many of the slowest commands to show [default: 10]
+  --json              Output the summary as JSON
+"""
+import docopt
+
+import teuthology.trace
+
+
+def main():
+    args = docopt.docopt(__doc__)
+    teuthology.trace.main(args)
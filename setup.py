@@ -117,6 +117,9 @@ setup(
             'teuthology-queue = scripts.queue:main',
             'teuthology-prune-logs = scripts.prune_logs:main',
             'teuthology-describe-tests = scripts.describe_tests:main',
+            'teuthology-trace = scripts.trace:main',
+            'teuthology-benchmark = scripts.benchmark:main',
+            'teuthology-grep = scripts.grep:main',
             ],
         },
 
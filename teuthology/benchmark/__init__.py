@@ -0,0 +1,153 @@
+"""
+Benchmarks for teuthology's scheduling and reporting hot paths.
+
+Results are written as JSON so that they can be kept as a baseline and
+compared against later runs::
+
+    teuthology-benchmark -o baseline.json
+    teuthology-benchmark --compare baseline.json
+"""
+import json
+import logging
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+import teuthology
+
+from .benchmarks import BENCHMARKS
+
+log = logging.getLogger(__name__)
+
+
+def main(args):
+    if args['--verbose']:
+        teuthology.log.setLevel(logging.DEBUG)
+    else:
+        # The code being measured logs a lot at INFO; keep that from
+        # drowning the results
+        teuthology.log.setLevel(logging.WARNING)
+
+    if args['--list']:
+        for name, func in BENCHMARKS.iteritems():
+            print "{name:24} {desc}".format(
+                name=name, desc=func.__doc__.strip())
+        return
+
+    results = run_benchmarks(
+        names=args['<benchmark>'],
+        repeat=int(args['--repeat']),
+        scale=int(args['--scale']),
+    )
+    if args['--output']:
+        with open(args['--output'], 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args['--compare']:
+        with open(args['--compare']) as f:
+            baseline = json.load(f)
+        comparison = compare(results, baseline,
+                             threshold=float(args['--threshold']))
+        print_comparison(comparison)
+        if any(item['regressed'] for item in comparison):
+            sys.exit(1)
+    else:
+        print_results(results)
+
+
+def run_benchmarks(names=None, repeat=5, scale=1):
+    """
+    Run benchmarks
+
+    :param names:  The names of the benchmarks to run. Defaults to all of them.
+    :param repeat: How many times to time each benchmark
+    :param scale:  Size of the synthetic inputs
+    :returns:      A dict suitable for serializing as JSON
+    """
+    names = names or BENCHMARKS.keys()
+    unknown = set(names) - set(BENCHMARKS.keys())
+    if unknown:
+        raise ValueError("Unknown benchmarks: {0}".format(
+            ', '.join(sorted(unknown))))
+    results = dict(
+        python=platform.python_version(),
+        scale=scale,
+        repeat=repeat,
+        timestamp=int(time.time()),
+        benchmarks=dict(),
+    )
+    for name in names:
+        log.debug("Running benchmark %s", name)
+        results['benchmarks'][name] = run_benchmark(
+            BENCHMARKS[name], repeat, scale)
+    return results
+
+
+def run_benchmark(func, repeat, scale):
+    """
+    Set up a single benchmark in a scratch directory and time it
+
+    :returns: A dict with the min, mean and max times, in seconds
+    """
+    workdir = tempfile.mkdtemp(prefix='teuthology-benchmark-')
+    try:
+        timed = func(workdir, scale)
+        times = list()
+        for i in range(repeat):
+            start = time.time()
+            timed()
+            times.append(time.time() - start)
+    finally:
+        shutil.rmtree(workdir)
+    return dict(
+        min=min(times),
+        mean=sum(times) / len(times),
+        max=max(times),
+    )
+
+
+def compare(results, baseline, threshold=1.25):
+    """
+    Compare results with a baseline. Minimum times are compared since they are
+    the least sensitive to noise.
+
+    :param results:   The output of run_benchmarks()
+    :param baseline:  The output of an earlier run_benchmarks()
+    :param threshold: The ratio of new to old time above which a benchmark is
+                      considered to have regressed
+    :returns:         A list of dicts, one per benchmark present in both
+    """
+    if results.get('scale') != baseline.get('scale'):
+        log.warning("Comparing results at scale %s against a baseline at "
+                    "scale %s", results.get('scale'), baseline.get('scale'))
+    comparison = list()
+    for name in sorted(results['benchmarks']):
+        if name not in baseline.get('benchmarks', dict()):
+            log.warning("Benchmark %s is not in the baseline", name)
+            continue
+        new = results['benchmarks'][name]['min']
+        old = baseline['benchmarks'][name]['min']
+        ratio = new / old if old else float('inf')
+        comparison.append(dict(
+            name=name,
+            old=old,
+            new=new,
+            ratio=ratio,
+            regressed=ratio > threshold,
+        ))
+    return comparison
+
+
+def print_results(results):
+    for name in sorted(results['benchmarks']):
+        times = results['benchmarks'][name]
+        print "{name:24} min {min:9.4f}s mean {mean:9.4f}s max {max:9.4f}s".format(  # noqa
+            name=name, **times)
+
+
+def print_comparison(comparison):
+    for item in comparison:
+        print "{name:24} {old:9.4f}s -> {new:9.4f}s {ratio:6.2f}x{flag}".format(
+            flag=' REGRESSED' if item['regressed'] else '', **item)
@@ -0,0 +1,204 @@
+"""
+The benchmarks themselves. Each one is registered with @benchmark and is
+called with a scratch directory and a scale; it prepares its inputs and
+returns a callable which performs the work to be timed.
+"""
+import copy
+import logging
+import os
+
+from collections import OrderedDict
+
+from .. import prune
+from ..config import config, JobConfig, YamlConfig
+from ..misc import deep_merge
+from ..orchestra.run import copy_to_log
+from ..report import ResultsSerializer
+from ..suite import build_matrix, matrix
+from ..suite.run import Run
+from ..suite.util import FragmentFilter
+
+from . import fixtures
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(func):
+    """
+    Register a benchmark under its function's name
+    """
+    BENCHMARKS[func.__name__] = func
+    return func
+
+
+@benchmark
+def build_matrix_full(workdir, scale):
+    """
+    build_matrix() over a whole synthetic suite
+    """
+    suite_path = fixtures.make_suite_tree(workdir, scale)
+
+    def func():
+        build_matrix.clear_matrix_cache()
+        build_matrix.build_matrix(suite_path)
+    return func
+
+
+@benchmark
+def build_matrix_subset(workdir, scale):
+    """
+    build_matrix() for one 1/7 subset of a synthetic suite
+    """
+    suite_path = fixtures.make_suite_tree(workdir, scale)
+
+    def func():
+        build_matrix.clear_matrix_cache()
+        build_matrix.build_matrix(suite_path, subset=(3, 7))
+    return func
+
+
+@benchmark
+def build_matrix_filtered(workdir, scale):
+    """
+    build_matrix() with the filters of collect_jobs_filtered pushed down
+    """
+    suite_path = fixtures.make_suite_tree(workdir, scale)
+
+    def func():
+        build_matrix.clear_matrix_cache()
+        fragment_filter = FragmentFilter(
+            ['choice1', 'part2', 'nomatch'], ['facet2/choice0'])
+        build_matrix.build_matrix(suite_path, fragment_filter=fragment_filter)
+    return func
+
+
+@benchmark
+def matrix_index(workdir, scale):
+    """
+    Product.index() for every combination of a synthetic suite
+    """
+    suite_path = fixtures.make_suite_tree(workdir, scale)
+    mat = build_matrix._build_matrix(suite_path)
+
+    def func():
+        for i in range(mat.size()):
+            mat.index(i)
+    return func
+
+
+@benchmark
+def compiled_matrix_index(workdir, scale):
+    """
+    CompiledMatrix.index_range() over every combination of a synthetic suite
+    """
+    suite_path = fixtures.make_suite_tree(workdir, scale)
+    mat = matrix.compile_matrix(build_matrix._build_matrix(suite_path))
+    return lambda: mat.index_range(0, mat.size())
+
+
+def _make_run(filter_in=None, filter_out=None):
+    # Run.__init__ fetches repos and talks to gitbuilder; only the attributes
+    # collect_jobs() needs are set here
+    run = Run.__new__(Run)
+    run.args = YamlConfig.from_dict(dict(
+        filter_in=filter_in,
+        filter_out=filter_out,
+        limit=0,
+    ))
+    run.base_config = JobConfig.from_dict(dict(
+        os_type='ubuntu',
+        os_version='14.04',
+        sha1='0' * 40,
+    ))
+    run.base_args = ['teuthology-schedule', '--name', 'benchmark']
+    run.base_yaml_paths = list()
+    run.package_versions = dict()
+    return run
+
+
+def _collect_jobs(workdir, scale, filter_in=None, filter_out=None):
+    suite_path = fixtures.make_suite_tree(workdir, scale)
+    configs = build_matrix.build_matrix(suite_path)
+    run = _make_run(filter_in, filter_out)
+
+    def func():
+        verify = config.suite_verify_ceph_hash
+        config.suite_verify_ceph_hash = False
+        try:
+            run.collect_jobs('x86_64', configs)
+        finally:
+            config.suite_verify_ceph_hash = verify
+    return func
+
+
+@benchmark
+def collect_jobs(workdir, scale):
+    """
+    Run.collect_jobs() without filters
+    """
+    return _collect_jobs(workdir, scale)
+
+
+@benchmark
+def collect_jobs_filtered(workdir, scale):
+    """
+    Run.collect_jobs() with --filter and --filter-out
+    """
+    return _collect_jobs(workdir, scale,
+                         filter_in=['choice1', 'part2', 'nomatch'],
+                         filter_out=['facet2/choice0'])
+
+
+@benchmark
+def deep_merge_config(workdir, scale):
+    """
+    misc.deep_merge() of job-config-sized dicts
+    """
+    base = fixtures.make_job_config(scale)
+    other = fixtures.make_job_config(scale)
+    copies = 50
+
+    def func():
+        for i in range(copies):
+            deep_merge(copy.deepcopy(base), other)
+    return func
+
+
+@benchmark
+def job_info(workdir, scale):
+    """
+    ResultsSerializer.job_info() for every job in a synthetic archive
+    """
+    archive_base = os.path.join(workdir, 'archive')
+    runs = fixtures.make_archive(archive_base, scale)
+    serializer = ResultsSerializer(archive_base)
+
+    def func():
+        for run_name, job_ids in runs.iteritems():
+            for job_id in job_ids:
+                serializer.job_info(run_name, job_id)
+    return func
+
+
+@benchmark
+def copy_to_log_throughput(workdir, scale):
+    """
+    orchestra.run.copy_to_log() of chatty remote command output
+    """
+    output = fixtures.make_remote_output(scale)
+    logger = logging.getLogger('teuthology.benchmark.copy_to_log')
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+    return lambda: copy_to_log(fixtures.make_remote_stream(output), logger)
+
+
+@benchmark
+def prune_archive(workdir, scale):
+    """
+    prune.prune_archive() in dry-run mode over a synthetic archive
+    """
+    archive_base = os.path.join(workdir, 'archive')
+    fixtures.make_archive(archive_base, scale)
+    return lambda: prune.prune_archive(archive_base, 0, 0, 0, dry_run=True)
@@ -0,0 +1,164 @@
+"""
+Synthetic inputs for the benchmarks: suite trees, archives and remote output
+streams. Every size is derived from a single integer scale so that results
+taken at the same scale are comparable.
+"""
+import os
+import shutil
+import time
+import yaml
+
+from cStringIO import StringIO
+
+
+def make_suite_tree(root, scale):
+    """
+    Write a suite below root which resembles the ceph-qa-suite layout: a
+    product ('%') of facet directories, one of which is itself a sum of
+    concatenated ('+') subdirectories.
+
+    With F facets of C choices each, where C grows with scale, the suite has
+    C ** F combinations before any filtering.
+
+    :returns: The path to the suite
+    """
+    facets = 4
+    choices = 2 + 2 * scale
+    suite_path = os.path.join(root, 'suites', 'synthetic')
+    os.makedirs(suite_path)
+    _touch(os.path.join(suite_path, '%'))
+    for facet in range(facets):
+        facet_dir = os.path.join(suite_path, 'facet%d' % facet)
+        os.mkdir(facet_dir)
+        for choice in range(choices):
+            if facet == facets - 1 and choice == 0:
+                # a concatenation, like ceph-qa-suite's 'tasks/+' dirs
+                concat_dir = os.path.join(facet_dir, 'concat')
+                os.mkdir(concat_dir)
+                _touch(os.path.join(concat_dir, '+'))
+                for part in range(3):
+                    _write_fragment(
+                        os.path.join(concat_dir, 'part%d.yaml' % part),
+                        facet, part)
+                continue
+            _write_fragment(
+                os.path.join(facet_dir, 'choice%d.yaml' % choice),
+                facet, choice)
+    return suite_path
+
+
+def _touch(path):
+    open(path, 'w').close()
+
+
+def _write_fragment(path, facet, choice):
+    fragment = dict(
+        meta=[dict(desc='facet %d choice %d' % (facet, choice))],
+        overrides=dict(
+            ceph=dict(conf=dict(osd={
+                'facet %d option' % facet: choice,
+            })),
+        ),
+        tasks=[{'exec': dict(client=['echo facet%d-%d' % (facet, choice)])}],
+    )
+    if facet == 0:
+        fragment['os_type'] = ['ubuntu', 'centos'][choice % 2]
+    with open(path, 'w') as f:
+        yaml.safe_dump(fragment, f, default_flow_style=False)
+
+
+def make_job_config(scale):
+    """
+    :returns: A nested job config dict similar in shape to a real one
+    """
+    config = dict(
+        roles=[['mon.a', 'osd.%d' % i, 'client.%d' % i]
+               for i in range(3 * (scale + 1))],
+        overrides=dict(
+            ceph=dict(
+                conf=dict(
+                    ('section%d' % i, dict(('key%d' % j, j)
+                                           for j in range(10 * (scale + 1))))
+                    for i in range(5)),
+                log_whitelist=['slow request', 'wrongly marked me down'],
+            ),
+            install=dict(ceph=dict(sha1='0' * 40)),
+        ),
+        tasks=[{'install': None}, {'ceph': None}],
+    )
+    return config
+
+
+def make_archive(archive_base, scale, runs=None):
+    """
+    Populate archive_base with fake runs: an info.yaml per job, a
+    summary.yaml for every job but the hung ones, plus a config.yaml and a
+    teuthology.log.
+    The runs' mtimes are pushed a year into the past so that
+    teuthology.prune considers them.
+
+    :returns: A dict mapping run names to lists of job IDs
+    """
+    if os.path.exists(archive_base):
+        shutil.rmtree(archive_base)
+    os.mkdir(archive_base)
+    config_yaml = yaml.safe_dump(make_job_config(scale))
+    runs = runs or 2 * (scale + 1)
+    job_count = 25 * (scale + 1)
+    last_year = time.time() - 365 * 24 * 60 * 60
+    result = dict()
+    for run_index in range(runs):
+        run_name = 'synthetic-run-%d' % run_index
+        run_dir = os.path.join(archive_base, run_name)
+        os.mkdir(run_dir)
+        job_ids = list()
+        for job_index in range(job_count):
+            job_id = job_index + 1
+            job_dir = os.path.join(run_dir, str(job_id))
+            os.mkdir(job_dir)
+            description = 'description for job with id %s' % job_id
+            info = dict(description=description, job_id=job_id,
+                        run_name=run_name, owner='job@owner',
+                        pid=1000 + job_index)
+            _write_yaml(os.path.join(job_dir, 'info.yaml'), info)
+            # every tenth job is hung, and has no summary
+            if job_index % 10 != 0:
+                summary = dict(description=description,
+                               duration=60 * job_id, owner='job@owner',
+                               success=job_index % 3 != 0)
+                if not summary['success']:
+                    summary['failure_reason'] = 'Failure reason!'
+                _write_yaml(os.path.join(job_dir, 'summary.yaml'), summary)
+            with open(os.path.join(job_dir, 'config.yaml'), 'w') as f:
+                f.write(config_yaml)
+            with open(os.path.join(job_dir, 'teuthology.log'), 'w') as f:
+                f.write('teuthology log line\n' * 100)
+            os.utime(job_dir, (last_year, last_year))
+            job_ids.append(str(job_id))
+        os.utime(run_dir, (last_year, last_year))
+        result[run_name] = job_ids
+    return result
+
+
+def _write_yaml(path, data):
+    with open(path, 'w') as f:
+        yaml.safe_dump(data, f)
+
+
+def make_remote_output(scale):
+    """
+    :returns: A string shaped like the output of a chatty remote command,
+              e.g. a ceph daemon running with debug logging
+    """
+    line = ('2016-10-18 12:00:00.000000 7f0000000000 10 osd.0 pg_epoch: 42 '
+            'pg[1.0( v 42\'1 (0\'0,42\'1] local-les=41 n=1 ec=1) active+clean]'
+            ' do_op osd_op(client.4100.0:1 1.0 obj [write 0~4096])\n')
+    return line * (20000 * (scale + 1))
+
+
+def make_remote_stream(output):
+    """
+    :returns: A file-like object which yields output the way a ChannelFile
+              does
+    """
+    return StringIO(output)
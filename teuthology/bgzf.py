@@ -0,0 +1,337 @@
+"""
+Seekable gzip files for archived logs
+
+The format is that of BGZF: a series of independently compressed gzip
+members ("blocks"), each holding at most BLOCK_SIZE bytes of input and
+recording its own compressed size in a 'BC' extra field. Since a series of
+gzip members is itself a valid gzip file, zcat, zgrep and gzip.open() read
+these files like any other.
+
+Blocks are cut at line boundaries where possible. An index stored next to
+the file (with INDEX_SUFFIX appended) maps each block to its uncompressed
+offset, the number of the line it starts in and the first timestamp found in
+it, so that Reader can start reading at any of those without decompressing
+what comes before.
+"""
+import collections
+import logging
+import os
+import re
+import shutil
+import struct
+import zlib
+
+log = logging.getLogger(__name__)
+
+# The maximum uncompressed size of a block; BGZF's own limit
+BLOCK_SIZE = 0xff00
+INDEX_SUFFIX = '.idx'
+INDEX_HEADER = '# teuthology bgzf index v1'
+
+# teuthology.log lines start with e.g. 2016-10-18T15:22:33.123
+TIMESTAMP_PATTERN = re.compile(r'^(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d(?:\.\d+)?) ',
+                               re.MULTILINE)
+
+# ID1 ID2 CM FLG(FEXTRA) MTIME(4) XFL OS(unknown) XLEN, then the BC subfield
+_HEADER = '\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+_HEADER_SIZE = len(_HEADER) + 2
+# An empty block, which BGZF writers append to mark the end of the file
+EOF_BLOCK = _HEADER + '\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+Block = collections.namedtuple(
+    'Block', ['coffset', 'csize', 'uoffset', 'usize', 'line', 'timestamp'])
+
+
+def compress_block(data, level=6):
+    """
+    Return data as a single gzip member in BGZF format
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(data) + compressor.flush()
+    csize = _HEADER_SIZE + len(deflated) + 8
+    if csize > 0x10000:
+        raise ValueError("Block of %d bytes does not compress into 64KiB" %
+                         len(data))
+    return ''.join([
+        _HEADER,
+        struct.pack('<H', csize - 1),
+        deflated,
+        struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data)),
+    ])
+
+
+def decompress_block(data):
+    return zlib.decompress(data, 16 + zlib.MAX_WBITS)
+
+
+def iter_chunks(f, block_size=BLOCK_SIZE):
+    """
+    Yield chunks of at most block_size bytes read from f, ending each at the
+    last newline it contains, if any
+    """
+    pending = ''
+    while True:
+        data = f.read(block_size - len(pending))
+        if not data:
+            break
+        pending += data
+        if len(pending) < block_size:
+            continue
+        cut = pending.rfind('\n') + 1 or len(pending)
+        yield pending[:cut]
+        pending = pending[cut:]
+    if pending:
+        yield pending
+
+
+def _first_timestamp(data):
+    match = TIMESTAMP_PATTERN.search(data)
+    return match.group(1) if match else None
+
+
+def compress(in_path, out_path, block_size=BLOCK_SIZE, level=6):
+    """
+    Compress in_path into out_path, writing the index alongside it and
+    preserving the original permissions, atime and mtime. Does not remove
+    the original.
+
+    :returns: The index, as a list of Blocks
+    """
+    index = list()
+    coffset = uoffset = line = 0
+    with open(in_path, 'rb') as src, open(out_path, 'wb') as dest:
+        for chunk in iter_chunks(src, block_size):
+            block = compress_block(chunk, level)
+            dest.write(block)
+            index.append(Block(coffset, len(block), uoffset, len(chunk),
+                               line, _first_timestamp(chunk)))
+            coffset += len(block)
+            uoffset += len(chunk)
+            line += chunk.count('\n')
+        dest.write(EOF_BLOCK)
+    write_index(out_path, index)
+    shutil.copystat(in_path, out_path)
+    return index
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def write_index(path, index):
+    with open(index_path(path), 'w') as f:
+        f.write(INDEX_HEADER + '\n')
+        for block in index:
+            f.write('{0} {1} {2} {3} {4} {5}\n'.format(
+                block.coffset, block.csize, block.uoffset, block.usize,
+                block.line, block.timestamp or '-'))
+
+
+def read_index(path):
+    """
+    Read the index of the BGZF file at path. If the index is missing, it is
+    rebuilt and written.
+
+    :returns: A list of Blocks
+    """
+    try:
+        with open(index_path(path)) as f:
+            if f.readline().rstrip('\n') != INDEX_HEADER:
+                raise ValueError("%s is not a bgzf index" % index_path(path))
+            index = list()
+            for line in f:
+                fields = line.split()
+                index.append(Block(
+                    *[int(field) for field in fields[:5]] +
+                    [None if fields[5] == '-' else fields[5]]))
+            return index
+    except IOError:
+        log.debug("Rebuilding missing index for %s", path)
+    index = build_index(path)
+    write_index(path, index)
+    return index
+
+
+def build_index(path):
+    """
+    Build the index of the BGZF file at path by reading each of its blocks.
+
+    :raises: ValueError if the file is not in BGZF format
+    """
+    index = list()
+    uoffset = line = 0
+    with open(path, 'rb') as f:
+        coffset = 0
+        while True:
+            header = f.read(_HEADER_SIZE)
+            if not header:
+                break
+            if header[:len(_HEADER)] != _HEADER:
+                raise ValueError("%s is not in BGZF format" % path)
+            csize = struct.unpack('<H', header[-2:])[0] + 1
+            data = decompress_block(header + f.read(csize - _HEADER_SIZE))
+            if data:
+                index.append(Block(coffset, csize, uoffset, len(data), line,
+                                   _first_timestamp(data)))
+            coffset += csize
+            uoffset += len(data)
+            line += data.count('\n')
+    return index
+
+
+def is_bgzf(path):
+    """
+    :returns: True if the file at path starts with a BGZF block
+    """
+    with open(path, 'rb') as f:
+        return f.read(len(_HEADER)) == _HEADER
+
+
+class Reader(object):
+    """
+    Random access to the contents of a BGZF file
+
+    Offsets are those in the uncompressed data, and lines are numbered from
+    zero.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.index = read_index(path)
+        self._file = open(path, 'rb')
+
+    @property
+    def size(self):
+        """
+        The uncompressed size of the file
+        """
+        if not self.index:
+            return 0
+        last = self.index[-1]
+        return last.uoffset + last.usize
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
+
+    def read_block(self, i):
+        block = self.index[i]
+        self._file.seek(block.coffset)
+        return decompress_block(self._file.read(block.csize))
+
+    def _bisect(self, key, value):
+        """
+        Return the index of the last block whose key is <= value, or 0
+        """
+        lo, hi = 0, len(self.index)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if key(self.index[mid]) <= value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return max(lo - 1, 0)
+
+    def read(self, offset, size):
+        """
+        Return up to size bytes starting at offset
+        """
+        chunks = list()
+        i = self._bisect(lambda b: b.uoffset, offset)
+        skip = offset - self.index[i].uoffset if self.index else 0
+        while size > 0 and i < len(self.index):
+            data = self.read_block(i)[skip:skip + size]
+            chunks.append(data)
+            size -= len(data)
+            skip = 0
+            i += 1
+        return ''.join(chunks)
+
+    def _line_start(self, i):
+        """
+        Return the index of the closest block at or before block i which
+        starts at the beginning of a line
+        """
+        while i > 0 and not self.read_block(i - 1).endswith('\n'):
+            i -= 1
+        return i
+
+    def _lines_from_block(self, i):
+        """
+        Yield (line number, offset, line) for each line from the start of
+        block i, which must start at the beginning of a line, to the end of
+        the file
+        """
+        if not self.index:
+            return
+        line = self.index[i].line
+        offset = self.index[i].uoffset
+        pending = ''
+        for j in range(i, len(self.index)):
+            data = pending + self.read_block(j)
+            lines = data.split('\n')
+            pending = lines.pop()
+            for text in lines:
+                yield line, offset, text + '\n'
+                line += 1
+                offset += len(text) + 1
+        if pending:
+            yield line, offset, pending
+
+    def lines(self, start=0):
+        """
+        Yield the lines of the file, starting with line number start
+        """
+        i = self._line_start(self._bisect(lambda b: b.line, start))
+        for line, _, text in self._lines_from_block(i):
+            if line >= start:
+                yield text
+
+    def lines_at_offset(self, offset):
+        """
+        Yield the lines of the file, starting with the one containing offset
+        """
+        i = self._line_start(self._bisect(lambda b: b.uoffset, offset))
+        for _, line_offset, text in self._lines_from_block(i):
+            if line_offset + len(text) > offset:
+                yield text
+
+    def lines_since(self, timestamp):
+        """
+        Yield the lines of the file, starting with the first one stamped at
+        or after timestamp
+
+        :param timestamp: A string such as '2016-10-18T15:22:33' or a prefix
+                          of one, e.g. '2016-10-18T15'
+        """
+        stamped = [i for i, block in enumerate(self.index)
+                   if block.timestamp is not None]
+        lo, hi = 0, len(stamped)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.index[stamped[mid]].timestamp < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        i = self._line_start(stamped[lo - 1] if lo > 0 else 0)
+        found = False
+        for _, _, text in self._lines_from_block(i):
+            if not found:
+                match = TIMESTAMP_PATTERN.match(text)
+                if not match or match.group(1) < timestamp:
+                    continue
+                found = True
+            yield text
+
+
+def open_log(path):
+    """
+    Return a Reader for path, or None if path is not in BGZF format
+    """
+    if not os.path.exists(path) or not is_bgzf(path):
+        return None
+    return Reader(path)
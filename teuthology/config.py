@@ -128,11 +128,14 @@ class TeuthologyConfig(YamlConfig):
     """
     yaml_path = os.path.join(os.path.expanduser('~/.teuthology.yaml'))
     _defaults = {
+        'ansible_fact_cache': '~/.cache/teuthology/ansible-facts',
+        'ansible_fact_cache_ttl': 3600,
         'archive_base': '/home/teuthworker/archive',
         'archive_upload': None,
         'archive_upload_key': None,
         'archive_upload_url': None,
         'automated_scheduling': False,
+        'build_metadata_ttl': 300,
         'reserve_machines': 5,
         'ceph_git_base_url': 'https://github.com/ceph/',
         'ceph_git_url': None,
@@ -142,6 +145,9 @@ class TeuthologyConfig(YamlConfig):
         'conserver_port': 3109,
         'gitbuilder_host': 'gitbuilder.ceph.com',
         'githelper_base_url': 'http://git.ceph.com:8080',
+        'ipmitool': 'ipmitool',
+        'ipmi_concurrency': 32,
+        'ipmi_subnet_concurrency': 8,
         'check_package_signatures': True,
         'lab_domain': 'front.sepia.ceph.com',
         'lock_server': 'http://paddles.front.sepia.ceph.com/',
@@ -152,6 +158,7 @@ class TeuthologyConfig(YamlConfig):
         'results_timeout': 43200,
         'src_base_path': os.path.expanduser('~/src'),
         'verify_host_keys': True,
+        'vm_host_concurrency': 2,
         'watchdog_interval': 120,
         'kojihub_url': 'http://koji.fedoraproject.org/kojihub',
         'kojiroot_url': 'http://kojipkgs.fedoraproject.org/packages',
@@ -162,6 +169,10 @@ class TeuthologyConfig(YamlConfig):
         'teuthology_path': None,
         'suite_verify_ceph_hash': True,
         'suite_allow_missing_packages': False,
+        'command_trace': False,
+        'sftp_window_size': None,
+        'sftp_max_packet_size': None,
+        'sftp_buffer_size': 1048576,
         'openstack': {
             'clone': 'git clone http://github.com/ceph/teuthology',
             'user-data': 'teuthology/openstack/openstack-{os_type}-{os_version}-user-data.txt',
@@ -1,16 +1,22 @@
 from contextlib import closing
+import functools
 import logging
 import os
 import shutil
 import subprocess
+import tempfile
 import MySQLdb
 import yaml
 
 import teuthology
 from teuthology.config import config
+from teuthology.parallel import process_map
 
 log = logging.getLogger(__name__)
 
+# How many tracefiles each lcov process merges into one
+MERGE_FANIN = 4
+
 """
 The coverage database can be created in mysql with:
 
@@ -104,14 +110,127 @@ def main(args):
             args['--cov-tools-dir'],
             args['--lcov-output'],
             args['--html-output'],
-            args['--skip-init']
+            args['--skip-init'],
+            int(args['--processes']),
         )
     except Exception:
         log.exception('error generating coverage')
         raise
 
 
-def analyze(test_dir, cov_tools_dir, lcov_output, html_output, skip_init):
+def _make_work_dir(test, lcov_output):
+    """
+    Make a working directory for cov-analyze.sh in lcov_output, holding a
+    copy of its ceph tree and base.lcov made of hard links
+    """
+    work_dir = tempfile.mkdtemp(prefix=test + '.', dir=lcov_output)
+    subprocess.check_call(
+        args=['cp', '-al', os.path.join(lcov_output, 'ceph'), work_dir])
+    # cov-analyze.sh's cp writes over existing .gcda files in place, so
+    # none of them may be links to the original tree's
+    subprocess.check_call(
+        args=['find', os.path.join(work_dir, 'ceph'), '-name', '*.gcda',
+              '-type', 'f', '-delete'])
+    os.link(os.path.join(lcov_output, 'base.lcov'),
+            os.path.join(work_dir, 'base.lcov'))
+    return work_dir
+
+
+def analyze_test(test, test_dir, cov_tools_dir, lcov_output,
+                 private_copy=False):
+    """
+    Run cov-analyze.sh for one test, which leaves its tracefile in
+    lcov_output as <test>.lcov
+
+    cov-analyze.sh copies the .gcda files of the test into the ceph tree
+    of its working directory, captures them and deletes them, and names its
+    intermediate tracefiles after the test's machines. Concurrent runs
+    sharing lcov_output would mix up each other's data, so with
+    private_copy it works in a copy of lcov_output instead.
+
+    :returns: The coverage read from its output; see read_coverage()
+    """
+    log.info('analyzing coverage for %s', test)
+    work_dir = lcov_output
+    if private_copy:
+        work_dir = _make_work_dir(test, lcov_output)
+    try:
+        proc = subprocess.Popen(
+            args=[
+                os.path.join(cov_tools_dir, 'cov-analyze.sh'),
+                '-t', os.path.join(test_dir, test),
+                '-d', work_dir,
+                '-o', test,
+            ],
+            stdout=subprocess.PIPE,
+        )
+        output, _ = proc.communicate()
+        if private_copy:
+            tracefile = '{name}.lcov'.format(name=test)
+            os.rename(os.path.join(work_dir, tracefile),
+                      os.path.join(lcov_output, tracefile))
+    finally:
+        if private_copy:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return read_coverage(output)
+
+
+def merge_tracefiles(paths, output_path):
+    """
+    Merge lcov tracefiles into output_path
+
+    :returns: The output of lcov
+    """
+    args = ['lcov']
+    for path in paths:
+        args.extend(['-a', path])
+    args.extend(['-o', output_path])
+    proc = subprocess.Popen(args=args, stdout=subprocess.PIPE)
+    output, _ = proc.communicate()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args)
+    return output
+
+
+def _merge_group(group_and_output):
+    return merge_tracefiles(*group_and_output)
+
+
+def merge_tree(paths, output_path, processes=None, fanin=MERGE_FANIN):
+    """
+    Merge lcov tracefiles into output_path by merging groups of fanin of them
+    at a time, in parallel, until one is left. Each line of coverage is then
+    read about log(len(paths)) times rather than len(paths) times.
+
+    The intermediate tracefiles are removed; paths are not.
+
+    :returns: The output of the last lcov run
+    """
+    level = list(paths)
+    intermediate = set()
+    round_ = 0
+    while True:
+        groups = [level[i:i + fanin] for i in range(0, len(level), fanin)]
+        if len(groups) == 1:
+            outputs = [output_path]
+        else:
+            outputs = [
+                '{0}.merge-{1}-{2}'.format(output_path, round_, i)
+                for i in range(len(groups))]
+        log.info('merging %d tracefiles into %d', len(level), len(outputs))
+        results = process_map(_merge_group, zip(groups, outputs), processes)
+        for path in level:
+            if path in intermediate:
+                os.remove(path)
+        if len(outputs) == 1:
+            return results[0]
+        intermediate.update(outputs)
+        level = outputs
+        round_ += 1
+
+
+def analyze(test_dir, cov_tools_dir, lcov_output, html_output, skip_init,
+            processes=None):
     tests = [
         f for f in sorted(os.listdir(test_dir))
         if not f.startswith('.')
@@ -155,40 +274,26 @@ def analyze(test_dir, cov_tools_dir, lcov_output, html_output, skip_init):
             os.path.join(lcov_output, 'total.lcov')
         )
 
+    tests = sorted(test_summaries.keys())
+    results = process_map(
+        functools.partial(analyze_test, test_dir=test_dir,
+                          cov_tools_dir=cov_tools_dir,
+                          lcov_output=lcov_output,
+                          private_copy=processes != 1),
+        tests, processes)
     test_coverage = {}
-    for test, summary in test_summaries.iteritems():
-        lcov_file = '{name}.lcov'.format(name=test)
+    for test, coverage in zip(tests, results):
+        desc = test_summaries[test].get('description', test)
+        test_coverage[desc] = coverage
 
-        log.info('analyzing coverage for %s', test)
-        proc = subprocess.Popen(
-            args=[
-                os.path.join(cov_tools_dir, 'cov-analyze.sh'),
-                '-t', os.path.join(test_dir, test),
-                '-d', lcov_output,
-                '-o', test,
-            ],
-            stdout=subprocess.PIPE,
-        )
-        output, _ = proc.communicate()
-        desc = summary.get('description', test)
-        test_coverage[desc] = read_coverage(output)
-
-        log.info('adding %s data to total', test)
-        proc = subprocess.Popen(
-            args=[
-                'lcov',
-                '-a', os.path.join(lcov_output, lcov_file),
-                '-a', os.path.join(lcov_output, 'total.lcov'),
-                '-o', os.path.join(lcov_output, 'total_tmp.lcov'),
-            ],
-            stdout=subprocess.PIPE,
-        )
-        output, _ = proc.communicate()
-
-        os.rename(
-            os.path.join(lcov_output, 'total_tmp.lcov'),
-            os.path.join(lcov_output, 'total.lcov')
-        )
+    log.info('adding data of %d tests to total', len(tests))
+    total = os.path.join(lcov_output, 'total.lcov')
+    total_tmp = os.path.join(lcov_output, 'total_tmp.lcov')
+    output = merge_tree(
+        [total] + [os.path.join(lcov_output, '{name}.lcov'.format(name=test))
+                   for test in tests],
+        total_tmp, processes)
+    os.rename(total_tmp, total)
 
     coverage = read_coverage(output)
     test_coverage['total for {suite}'.format(suite=suite)] = coverage
@@ -205,4 +310,5 @@ def analyze(test_dir, cov_tools_dir, lcov_output, html_output, skip_init):
                 os.path.join(lcov_output, 'total.lcov'),
             ])
 
-    store_coverage(test_coverage, summary['ceph-sha1'], suite)
+    store_coverage(test_coverage, test_summaries[tests[-1]]['ceph-sha1'],
+                   suite)
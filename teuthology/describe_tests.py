@@ -2,13 +2,20 @@
 
 import csv
 import json
+import multiprocessing
 from prettytable import PrettyTable, FRAME, ALL
 import os
 import sys
 import yaml
 
 from teuthology.exceptions import ParseError
-from teuthology.suite.build_matrix import build_matrix, combine_path
+from teuthology.parallel import process_map
+from teuthology.suite import matrix
+from teuthology.suite.build_matrix import _get_matrix, combine_path
+
+# How many index ranges iter_combinations() gives each process; more means
+# smaller batches of output, and less time idle behind a slow range
+CHUNKS_PER_PROCESS = 4
 
 
 def main(args):
@@ -35,9 +42,17 @@ def describe_tests(args):
         subset = None
         if args['--subset']:
             subset = map(int, args['--subset'].split('/'))
-        headers, rows = get_combinations(suite_dir, fields, subset,
-                                         limit, filter_in,
-                                         filter_out, include_facet)
+        processes = int(args['--processes'])
+        if args['--no-sort'] and output_format != 'plain':
+            headers, rows = stream_combinations(
+                suite_dir, fields, subset, limit, filter_in, filter_out,
+                include_facet, processes)
+        else:
+            headers, rows = get_combinations(suite_dir, fields, subset,
+                                             limit, filter_in,
+                                             filter_out, include_facet,
+                                             processes=processes,
+                                             sort=not args['--no-sort'])
         hrule = ALL
     else:
         headers, rows = describe_suite(suite_dir, fields, include_facet,
@@ -50,15 +65,20 @@ def describe_tests(args):
 def output_results(headers, rows, output_format, hrule):
     """
     Write the headers and rows given in the specified output format to
-    stdout.
+    stdout. In the json and csv formats, rows may be any iterable and are
+    written as they are produced.
     """
     if output_format == 'json':
-        objects = [{k: v for k, v in zip(headers, row) if v}
-                   for row in rows]
-        print(json.dumps(dict(headers=headers, data=objects)))
+        sys.stdout.write('{"headers": %s, "data": [' % json.dumps(headers))
+        for i, row in enumerate(rows):
+            obj = {k: v for k, v in zip(headers, row) if v}
+            sys.stdout.write((', ' if i else '') + json.dumps(obj))
+        sys.stdout.write(']}\n')
     elif output_format == 'csv':
         writer = csv.writer(sys.stdout)
-        writer.writerows([headers] + rows)
+        writer.writerow(headers)
+        for row in rows:
+            writer.writerow(row)
     else:
         table = PrettyTable(headers)
         table.align = 'l'
@@ -69,89 +89,219 @@ def output_results(headers, rows, output_format, hrule):
         print(table)
 
 
-def get_combinations(suite_dir, fields, subset,
-                     limit, filter_in, filter_out,
-                     include_facet):
-    """
-    Describes the combinations of a suite, optionally limiting
-    or filtering output based on the given parameters. Includes
-    columns for the subsuite and facets when include_facet is True.
-
-    Returns a tuple of (headers, rows) where both elements are lists
-    of strings.
-    """
-    configs = [(combine_path(suite_dir, item[0]), item[1]) for item in
-               build_matrix(suite_dir, subset)]
+def _matches_filters(fragment_paths, filter_in, filter_out):
+    if filter_in and not any([f in path for f in filter_in
+                              for path in fragment_paths]):
+        return False
+    if filter_out and any([f in path for f in filter_out
+                           for path in fragment_paths]):
+        return False
+    return True
 
-    num_listed = 0
-    rows = []
 
-    facet_headers = set()
-    dirs = {}
-    max_dir_depth = 0
+def _describe_range(suite_dir, mat, start, stop, fields, limit, filter_in,
+                    filter_out, info_cache):
+    """
+    Describe the combinations with matrix indexes from start to stop, which
+    pass the filters, stopping after limit of them if limit is positive.
 
-    for _, fragment_paths in configs:
-        if limit > 0 and num_listed >= limit:
+    :param info_cache: A dict caching extract_info() results per fragment,
+                       since each fragment appears in many combinations
+    :returns: A list of (fragment paths, metadata) tuples
+    """
+    described = []
+    for i in xrange(start, stop):
+        if limit > 0 and len(described) >= limit:
             break
-        if filter_in and not any([f in path for f in filter_in
-                                  for path in fragment_paths]):
+        fragment_paths = matrix.generate_paths(suite_dir, mat.index(i),
+                                               combine_path)
+        if not _matches_filters(fragment_paths, filter_in, filter_out):
             continue
-        if filter_out and any([f in path for f in filter_out
-                               for path in fragment_paths]):
-            continue
-
-        fragment_fields = [extract_info(path, fields)
-                           for path in fragment_paths]
 
         # merge fields from multiple fragments by joining their values with \n
         metadata = {}
-        for fragment_meta in fragment_fields:
-            for field, value in fragment_meta.items():
+        for path in fragment_paths:
+            if path not in info_cache:
+                info_cache[path] = extract_info(path, fields)
+            for field, value in info_cache[path].items():
                 if value == '':
                     continue
                 if field in metadata:
                     metadata[field] += '\n' + str(value)
                 else:
                     metadata[field] = str(value)
+        described.append((fragment_paths, metadata))
+    return described
 
-        if include_facet:
-            # map final dir (facet) -> filename without the .yaml suffix
-            for path in fragment_paths:
-                facet_dir = os.path.dirname(path)
-                facet = os.path.basename(facet_dir)
-                metadata[facet] = os.path.basename(path)[:-5]
-                facet_headers.add(facet)
-                facet_dirs = facet_dir.split('/')[:-1]
-                for i, dir_ in enumerate(facet_dirs):
-                    if i not in dirs:
-                        dirs[i] = set()
-                    dirs[i].add(dir_)
-                    metadata['_dir_' + str(i)] = os.path.basename(dir_)
-                    max_dir_depth = max(max_dir_depth, i)
-
-        rows.append(metadata)
-        num_listed += 1
+
+def _chunks(start, stop, count):
+    """
+    Split the range from start to stop into at most count ranges
+    """
+    size = max(1, -(-(stop - start) // max(count, 1)))
+    return [(i, min(i + size, stop)) for i in xrange(start, stop, size)]
+
+
+def iter_combinations(suite_dir, fields, subset, limit, filter_in,
+                      filter_out, processes=1):
+    """
+    Generate (fragment paths, metadata) tuples for the combinations of a
+    suite, in matrix order.
+
+    Without a limit, the matrix index range is split over processes
+    processes (0 meaning one per CPU), a few chunks per process at a time so
+    that results can be consumed as they come. With a limit, combinations
+    are described in a single process, which stops as soon as it has enough.
+    """
+    mat, first, matlimit = _get_matrix(suite_dir, subset)
+    info_cache = dict()
+    if limit > 0 or processes == 1:
+        for item in _describe_range(suite_dir, mat, first, matlimit, fields,
+                                    limit, filter_in, filter_out,
+                                    info_cache):
+            yield item
+        return
+
+    # the workers are forked, so they inherit the parent's cache but
+    # anything they add to it is lost; fill it in before they start
+    for path in suite_fragments(suite_dir):
+        info_cache[path] = extract_info(path, fields)
+
+    processes = processes or multiprocessing.cpu_count()
+    chunks = _chunks(first, matlimit, processes * CHUNKS_PER_PROCESS)
+
+    def describe_chunk(chunk):
+        start, stop = chunk
+        return _describe_range(suite_dir, mat, start, stop, fields, 0,
+                               filter_in, filter_out, info_cache)
+
+    for i in xrange(0, len(chunks), processes):
+        for described in process_map(describe_chunk,
+                                     chunks[i:i + processes], processes):
+            for item in described:
+                yield item
+
+
+def facet_layout(fragment_path_lists):
+    """
+    Work out the facet and subsuite columns for a set of combinations
+
+    :param fragment_path_lists: An iterable of lists of fragment paths
+    :returns: A tuple of the subsuite headers, the sorted facet headers and
+              the depth of the first subsuite directory
+    """
+    facet_headers = set()
+    dirs = {}
+    max_dir_depth = 0
+    for fragment_paths in fragment_path_lists:
+        for path in fragment_paths:
+            facet_dir = os.path.dirname(path)
+            facet_headers.add(os.path.basename(facet_dir))
+            for i, dir_ in enumerate(facet_dir.split('/')[:-1]):
+                dirs.setdefault(i, set()).add(dir_)
+                max_dir_depth = max(max_dir_depth, i)
+
+    first_subsuite_depth = max_dir_depth
+    for i in range(max_dir_depth):
+        if len(dirs[i]) > 1:
+            first_subsuite_depth = i
+            break
+
+    subsuite_headers = ['subsuite depth ' + str(i)
+                        for i in
+                        range(0, max_dir_depth - first_subsuite_depth + 1)]
+    return subsuite_headers, sorted(facet_headers), first_subsuite_depth
+
+
+def facet_columns(fragment_paths, subsuite_headers, first_subsuite_depth):
+    """
+    :returns: A dict mapping each facet of a combination to the chosen
+              fragment, without the .yaml suffix, and each subsuite header
+              to the directory at that depth
+    """
+    columns = {}
+    dir_names = {}
+    for path in fragment_paths:
+        facet_dir = os.path.dirname(path)
+        columns[os.path.basename(facet_dir)] = os.path.basename(path)[:-5]
+        for i, dir_ in enumerate(facet_dir.split('/')[:-1]):
+            dir_names[i] = os.path.basename(dir_)
+    for i, header in enumerate(subsuite_headers):
+        columns[header] = dir_names.get(first_subsuite_depth + i, '')
+    return columns
+
+
+def get_combinations(suite_dir, fields, subset,
+                     limit, filter_in, filter_out,
+                     include_facet, processes=1, sort=True):
+    """
+    Describes the combinations of a suite, optionally limiting
+    or filtering output based on the given parameters. Includes
+    columns for the subsuite and facets when include_facet is True.
+
+    Returns a tuple of (headers, rows) where both elements are lists
+    of strings.
+    """
+    described = list(iter_combinations(suite_dir, fields, subset, limit,
+                                       filter_in, filter_out, processes))
 
     subsuite_headers = []
+    facet_headers = []
     if include_facet:
-        first_subsuite_depth = max_dir_depth
-        for i in range(max_dir_depth):
-            if len(dirs[i]) > 1:
-                first_subsuite_depth = i
-                break
+        subsuite_headers, facet_headers, first_subsuite_depth = \
+            facet_layout(paths for paths, _ in described)
+        for fragment_paths, metadata in described:
+            metadata.update(facet_columns(fragment_paths, subsuite_headers,
+                                          first_subsuite_depth))
 
-        subsuite_headers = ['subsuite depth ' + str(i)
-                            for i in
-                            range(0, max_dir_depth - first_subsuite_depth + 1)]
+    headers = subsuite_headers + facet_headers + fields
+    rows = [[metadata.get(field, '') for field in headers]
+            for _, metadata in described]
+    if sort:
+        rows.sort()
+    return headers, rows
 
-        for row in rows:
-            for i in range(first_subsuite_depth, max_dir_depth + 1):
-                row[subsuite_headers[i - first_subsuite_depth]] = \
-                    row.get('_dir_' + str(i), '')
 
-    headers = subsuite_headers + sorted(facet_headers) + fields
-    return headers, sorted([[row.get(field, '') for field in headers]
-                            for row in rows])
+def suite_fragments(suite_dir):
+    """
+    :returns: The path of every yaml fragment below suite_dir
+    """
+    paths = []
+    for root, _, files in os.walk(suite_dir, followlinks=True):
+        for name in sorted(files):
+            if name.endswith('.yaml'):
+                paths.append(combine_path(root, name))
+    return paths
+
+
+def stream_combinations(suite_dir, fields, subset, limit, filter_in,
+                        filter_out, include_facet, processes=1):
+    """
+    Like get_combinations(), but the rows are generated in matrix order as
+    they are described rather than collected and sorted. Since the facet
+    columns must be known up front, they are worked out from every fragment
+    in the suite, so facets that no listed combination uses still get a
+    column.
+
+    Returns a tuple of (headers, rows) where rows is a generator.
+    """
+    subsuite_headers = []
+    facet_headers = []
+    first_subsuite_depth = 0
+    if include_facet:
+        subsuite_headers, facet_headers, first_subsuite_depth = \
+            facet_layout([path] for path in suite_fragments(suite_dir))
+    headers = subsuite_headers + facet_headers + fields
+
+    def rows():
+        for fragment_paths, metadata in iter_combinations(
+                suite_dir, fields, subset, limit, filter_in, filter_out,
+                processes):
+            if include_facet:
+                metadata.update(facet_columns(
+                    fragment_paths, subsuite_headers, first_subsuite_depth))
+            yield [metadata.get(field, '') for field in headers]
+    return headers, rows()
 
 
 def describe_suite(suite_dir, fields, include_facet, output_format):
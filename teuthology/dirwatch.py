@@ -0,0 +1,116 @@
+"""
+Wait for files to appear in directories
+
+DirectoryWatcher uses Linux's inotify, through ctypes, when it can; elsewhere
+it falls back to waking up every POLL_INTERVAL seconds. Either way, callers
+re-check whatever they are waiting for after each wakeup; events only make
+the wakeups timely.
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+
+import gevent
+import gevent.select
+
+log = logging.getLogger(__name__)
+
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+
+# How long DirectoryWatcher.wait() sleeps for at most without inotify
+POLL_INTERVAL = 5
+
+
+def _load_libc():
+    name = ctypes.util.find_library('c')
+    if name is None:
+        return None
+    try:
+        libc = ctypes.CDLL(name, use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, 'inotify_init1'):
+        return None
+    return libc
+
+_libc = _load_libc()
+
+
+class DirectoryWatcher(object):
+    """
+    Wakes up waiters when files are created in, or moved into, any of the
+    watched directories
+    """
+    def __init__(self):
+        self.watched = set()
+        self._fd = None
+        if _libc is not None:
+            fd = _libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+            if fd >= 0:
+                self._fd = fd
+            else:
+                log.debug("inotify_init1 failed: %s",
+                          os.strerror(ctypes.get_errno()))
+
+    @property
+    def using_inotify(self):
+        return self._fd is not None
+
+    def watch(self, path):
+        """
+        Watch a directory; directories already watched are ignored
+        """
+        if path in self.watched:
+            return
+        self.watched.add(path)
+        if self._fd is None:
+            return
+        wd = _libc.inotify_add_watch(self._fd, path,
+                                     IN_CREATE | IN_MOVED_TO)
+        if wd < 0:
+            # e.g. ENOSPC once fs.inotify.max_user_watches is reached;
+            # polling still finds the files
+            self.watched.discard(path)
+            log.debug("Cannot watch %s: %s", path,
+                      os.strerror(ctypes.get_errno()))
+
+    def wait(self, timeout):
+        """
+        Wait until something is created in a watched directory, or for at
+        most timeout seconds
+
+        :returns: True if an event was seen, False otherwise
+        """
+        timeout = max(timeout, 0)
+        if self._fd is None:
+            gevent.sleep(min(timeout, POLL_INTERVAL))
+            return False
+        readable, _, _ = gevent.select.select([self._fd], [], [], timeout)
+        if not readable:
+            return False
+        # drain the queue; callers re-check everything anyway
+        while True:
+            try:
+                if not os.read(self._fd, 65536):
+                    break
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    break
+                raise
+        return True
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
@@ -182,3 +182,19 @@ class NoRemoteError(Exception):
 
     def __str__(self):
         return self.message
+
+
+class OpenStackAPIError(Exception):
+    """
+    An OpenStack API request failed
+    """
+    def __init__(self, method, url, status, message):
+        self.method = method
+        self.url = url
+        self.status = status
+        self.message = message
+
+    def __str__(self):
+        return "{method} {url} failed with status {status}: {message}".format(
+            method=self.method, url=self.url, status=self.status,
+            message=self.message)
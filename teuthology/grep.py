@@ -0,0 +1,271 @@
+import contextlib
+import errno
+import functools
+import gzip
+import json
+import logging
+import os
+import re
+
+import yaml
+
+import teuthology
+from .ls import get_jobs
+from .parallel import process_map
+
+log = logging.getLogger(__name__)
+
+# The name of the failure signature index, kept in the archive directory
+SIGNATURE_INDEX = '.failure_signatures.json'
+INDEX_VERSION = 1
+
+# Applied in order by normalize_reason()
+_NORMALIZERS = [
+    (re.compile(r'\d{4}-\d\d-\d\d[T ]\d\d:\d\d:\d\d(\.\d+)?'), '<time>'),
+    (re.compile(r'\b\d+\.\d+\.\d+\.\d+(:\d+)?\b'), '<ip>'),
+    (re.compile(r'\b[0-9a-f]{8}(-[0-9a-f]{4}){3}-[0-9a-f]{12}\b'), '<uuid>'),
+    (re.compile(r'\b0x[0-9a-fA-F]+\b'), '<hex>'),
+    (re.compile(r'\b[0-9a-f]{7,40}\b'), '<sha1>'),
+    (re.compile(r'\d+'), 'N'),
+    (re.compile(r'\s+'), ' '),
+]
+
+
+def main(args):
+    """
+    Main function; parses args and either searches logs, updates the failure
+    signature index or prints indexed failures
+    """
+    if args['--verbose']:
+        teuthology.log.setLevel(logging.DEBUG)
+    archive_dir = args['--archive-dir']
+    processes = int(args['--processes'])
+    if args['--failures']:
+        print_failures(lookup_failures(archive_dir, args['<pattern>']))
+        return
+    runs = args['<run>'] or find_runs(archive_dir, int(args['--last']))
+    if args['--index']:
+        update_index(archive_dir, runs, processes)
+        return
+    flags = re.IGNORECASE if args['--ignore-case'] else 0
+    paths = list()
+    for run in runs:
+        paths.extend(find_logs(os.path.join(archive_dir, run),
+                               remote=args['--remote']))
+    results = grep_logs(paths, args['<pattern>'], flags,
+                        max_count=int(args['--max-count']),
+                        processes=processes)
+    found = False
+    for path, matches in results:
+        if not matches:
+            continue
+        found = True
+        name = os.path.relpath(path, archive_dir)
+        if args['--files-with-matches']:
+            print name
+            continue
+        for lineno, line in matches:
+            print '{0}:{1}:{2}'.format(name, lineno, line.rstrip('\n'))
+    return 0 if found else 1
+
+
+def find_runs(archive_dir, last=None):
+    """
+    :returns: The names of the run directories in archive_dir, newest first,
+              limited to the first last of them if given
+    """
+    runs = list()
+    for name in os.listdir(archive_dir):
+        path = os.path.join(archive_dir, name)
+        if name.startswith('.') or os.path.islink(path) or \
+                not os.path.isdir(path):
+            continue
+        runs.append((os.path.getmtime(path), name))
+    runs.sort(reverse=True)
+    names = [name for _, name in runs]
+    if last:
+        names = names[:last]
+    return names
+
+
+def find_logs(run_dir, remote=False):
+    """
+    :param remote: Include the logs collected from the test nodes
+    :returns: The paths of the logs of each job in run_dir
+    """
+    paths = list()
+    for job in get_jobs(run_dir):
+        job_dir = os.path.join(run_dir, job)
+        for name in ('teuthology.log', 'teuthology.log.gz'):
+            path = os.path.join(job_dir, name)
+            if os.path.isfile(path):
+                paths.append(path)
+        if not remote:
+            continue
+        for root, _, files in os.walk(os.path.join(job_dir, 'remote')):
+            for name in sorted(files):
+                if name.endswith('.log') or name.endswith('.log.gz'):
+                    paths.append(os.path.join(root, name))
+    return paths
+
+
+def open_log(path):
+    """
+    Open a log file, which may be gzipped
+    """
+    if path.endswith('.gz'):
+        return contextlib.closing(gzip.open(path, 'rb'))
+    return open(path, 'rb')
+
+
+def grep_file(path, regex, max_count=0):
+    """
+    :param max_count: Stop after this many matches, if not 0
+    :returns: A list of (line number, line) tuples for each line in path
+              matching regex. Lines are numbered from 1.
+    """
+    matches = list()
+    try:
+        with open_log(path) as f:
+            for lineno, line in enumerate(f, 1):
+                if regex.search(line):
+                    matches.append((lineno, line))
+                    if len(matches) == max_count:
+                        break
+    except (IOError, EOFError, ValueError):
+        log.warning("Failed to read %s", path)
+    return matches
+
+
+def grep_logs(paths, pattern, flags=0, max_count=0, processes=None):
+    """
+    Search logs for a regular expression, spreading them over a number of
+    processes
+
+    :returns: A list of (path, matches) tuples, in the order of paths; see
+              grep_file()
+    """
+    regex = re.compile(pattern, flags)
+    results = process_map(
+        functools.partial(grep_file, regex=regex, max_count=max_count),
+        paths, processes)
+    return zip(paths, results)
+
+
+def normalize_reason(reason):
+    """
+    Reduce a failure reason to a signature shared by failures with the same
+    cause, by replacing times, addresses, hashes and numbers with
+    placeholders
+    """
+    signature = reason.strip()
+    for regex, replacement in _NORMALIZERS:
+        signature = regex.sub(replacement, signature)
+    return signature
+
+
+def read_job_signatures(run_dir):
+    """
+    :returns: A dict mapping the ID of each job in run_dir which has a
+              failure reason to its signature
+    """
+    signatures = dict()
+    for job in get_jobs(run_dir):
+        summary_path = os.path.join(run_dir, job, 'summary.yaml')
+        summary = dict()
+        try:
+            with open(summary_path) as f:
+                for new in yaml.safe_load_all(f):
+                    summary.update(new or dict())
+        except IOError as e:
+            if e.errno != errno.ENOENT:
+                raise
+            continue
+        except yaml.YAMLError:
+            log.warning("Failed to parse %s", summary_path)
+            continue
+        reason = summary.get('failure_reason')
+        if reason:
+            signatures[job] = normalize_reason(str(reason))
+    return signatures
+
+
+def index_path(archive_dir):
+    return os.path.join(archive_dir, SIGNATURE_INDEX)
+
+
+def read_index(archive_dir):
+    try:
+        with open(index_path(archive_dir)) as f:
+            index = json.load(f)
+    except (IOError, ValueError):
+        return dict(version=INDEX_VERSION, runs=dict())
+    if index.get('version') != INDEX_VERSION:
+        return dict(version=INDEX_VERSION, runs=dict())
+    return index
+
+
+def _run_mtime(run_dir):
+    """
+    :returns: The latest mtime of run_dir and its job directories, which
+              changes when a job writes its summary
+    """
+    return max([os.path.getmtime(run_dir)] + [
+        os.path.getmtime(os.path.join(run_dir, job))
+        for job in get_jobs(run_dir)])
+
+
+def update_index(archive_dir, runs, processes=None):
+    """
+    Add the failure signatures of the jobs in runs to the index. Runs which
+    have not changed since they were last indexed are skipped.
+
+    :returns: The index
+    """
+    index = read_index(archive_dir)
+    stale = list()
+    for run in runs:
+        mtime = _run_mtime(os.path.join(archive_dir, run))
+        entry = index['runs'].get(run)
+        if entry is None or entry['mtime'] != mtime:
+            stale.append((run, mtime))
+    log.debug("Indexing %d of %d runs", len(stale), len(runs))
+    results = process_map(
+        read_job_signatures,
+        [os.path.join(archive_dir, run) for run, _ in stale],
+        processes)
+    for (run, mtime), signatures in zip(stale, results):
+        index['runs'][run] = dict(mtime=mtime, jobs=signatures)
+    tmp_path = index_path(archive_dir) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.rename(tmp_path, index_path(archive_dir))
+    return index
+
+
+def lookup_failures(archive_dir, pattern=None):
+    """
+    Group the indexed jobs by failure signature
+
+    :param pattern: Only include signatures matching this regular expression
+    :returns: A list of (signature, jobs) tuples, most common first. Jobs are
+              given as 'run/job_id'.
+    """
+    regex = re.compile(pattern) if pattern else None
+    failures = dict()
+    for run, entry in read_index(archive_dir)['runs'].items():
+        for job, signature in entry['jobs'].items():
+            if regex is not None and not regex.search(signature):
+                continue
+            failures.setdefault(signature, []).append(
+                '{0}/{1}'.format(run, job))
+    return sorted(((signature, sorted(jobs))
+                   for signature, jobs in failures.items()),
+                  key=lambda item: (-len(item[1]), item[0]))
+
+
+def print_failures(failures):
+    for signature, jobs in failures:
+        print '{0:6d}  {1}'.format(len(jobs), signature)
+        for job in jobs:
+            print '        {0}'.format(job)
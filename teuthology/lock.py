@@ -451,8 +451,9 @@ def lock_many(ctx, num, machine_type, user=None, description=None,
                 machines=', '.join(machines.keys())))
             if machine_type == 'vps':
                 ok_machs = {}
+                created = provision.create_many_if_vm(ctx, machines.keys())
                 for machine in machines:
-                    if provision.create_if_vm(ctx, machine):
+                    if created[machine]:
                         ok_machs[machine] = machines[machine]
                     else:
                         log.error('Unable to create virtual machine: %s',
@@ -9,6 +9,7 @@ import os
 import logging
 import configobj
 import getpass
+import hashlib
 import socket
 import subprocess
 import sys
@@ -24,7 +25,8 @@ import pprint
 from teuthology import safepath
 from teuthology.exceptions import (CommandCrashedError, CommandFailedError,
                                    ConnectionLostError)
-from .orchestra import run
+from .orchestra import compression, run
+import teuthology.orchestra.cluster
 from .config import config
 from .contextutil import safe_while
 from .orchestra.opsys import DEFAULT_OS_VERSION
@@ -331,15 +333,25 @@ def ceph_role(role):
     return type_ + '.' + id_
 
 
+# role -> (cluster, type, id); roles come from a small, fixed set per job
+_split_roles = dict()
+
+
 def split_role(role):
     """
     Return a tuple of cluster, type, and id
     If no cluster is included in the role, the default cluster, 'ceph', is used
     """
+    try:
+        return _split_roles[role]
+    except KeyError:
+        pass
+    name = role
     cluster = 'ceph'
-    if role.count('.') > 1:
-        cluster, role = role.split('.', 1)
-    type_, id_ = role.split('.', 1)
+    if name.count('.') > 1:
+        cluster, name = name.split('.', 1)
+    type_, id_ = name.split('.', 1)
+    _split_roles[role] = (cluster, type_, id_)
     return cluster, type_, id_
 
 
@@ -372,6 +384,14 @@ def cluster_roles_of_type(roles_for_host, type_, cluster):
         yield role
 
 
+def _has_role_index(cluster):
+    """
+    Whether cluster is a Cluster, which can answer role queries from its
+    index, rather than e.g. a mock with a remotes dict
+    """
+    return isinstance(cluster, teuthology.orchestra.cluster.Cluster)
+
+
 def all_roles(cluster):
     """
     Generator of role values.  Each call returns another role.
@@ -391,6 +411,10 @@ def all_roles_of_type(cluster, type_):
     :param cluster: Cluster extracted from the ctx.
     :type_: role type
     """
+    if _has_role_index(cluster):
+        for role in cluster.find_roles(type_):
+            yield split_role(role)[2]
+        return
     for _, roles_for_host in cluster.remotes.iteritems():
         for id_ in roles_of_type(roles_for_host, type_):
             yield id_
@@ -424,6 +448,8 @@ def num_instances_of_type(cluster, type_, ceph_cluster='ceph'):
     :param type_: role
     :param ceph_cluster: filter for ceph cluster name
     """
+    if _has_role_index(cluster):
+        return len(cluster.find_roles(type_, ceph_cluster))
     remotes_and_roles = cluster.remotes.items()
     roles = [roles for (remote, roles) in remotes_and_roles]
     is_ceph_type = is_type(type_, ceph_cluster)
@@ -538,6 +564,72 @@ def sudo_write_file(remote, path, data, perms=None, owner=None):
     )
 
 
+# Copies stdin to the file named by argv[1], then fails unless the SHA-1 of
+# what was written matches argv[2]
+_VERIFIED_WRITE = """import hashlib, sys
+stdin = getattr(sys.stdin, "buffer", sys.stdin)
+h = hashlib.sha1()
+with open(sys.argv[1], "wb") as f:
+    while True:
+        chunk = stdin.read(65536)
+        if not chunk:
+            break
+        h.update(chunk)
+        f.write(chunk)
+if h.hexdigest() != sys.argv[2]:
+    sys.exit("checksum mismatch writing %s" % sys.argv[1])
+"""
+
+
+def write_file_if_changed(remote, path, data, sha1=None, sudo=False,
+                          perms=None, owner=None):
+    """
+    Write data to a remote file unless it already has exactly that content.
+    The data is checksummed on the remote as it is written, and the command
+    fails if the result does not match.
+
+    :param remote: Remote site.
+    :param path: Path on the remote being written to.
+    :param data: Data to be written, as a string.
+    :param sha1: The hex SHA-1 of data, if already known.
+    :param sudo: Read and write the file as super user
+    :param perms: Permissions on the file being written; requires sudo
+    :param owner: Owner for the file being written; requires sudo
+    :returns: True if the file was written, False if it was up to date
+    """
+    if not sudo and (perms is not None or owner is not None):
+        raise ValueError("To specify perms or owner, sudo must be True")
+    if sha1 is None:
+        sha1 = hashlib.sha1(data).hexdigest()
+    sudo_args = ['sudo'] if sudo else []
+    permargs = []
+    if perms:
+        permargs = [run.Raw('&&'), 'sudo', 'chmod', perms, path]
+    owner_args = []
+    if owner:
+        owner_args = [run.Raw('&&'), 'sudo', 'chown', owner, path]
+
+    proc = remote.run(
+        args=sudo_args + ['sha1sum', '--', path],
+        stdout=StringIO(),
+        stderr=StringIO(),
+        check_status=False,
+    )
+    existing = proc.stdout.getvalue().split()
+    if proc.exitstatus == 0 and existing and existing[0] == sha1:
+        log.debug("%s:%s is up to date", remote.shortname, path)
+        if owner_args or permargs:
+            remote.run(args=(owner_args + permargs)[1:])
+        return False
+
+    remote.run(
+        args=sudo_args + ['python', '-c', _VERIFIED_WRITE, path, sha1] +
+        owner_args + permargs,
+        stdin=data,
+    )
+    return True
+
+
 def copy_file(from_remote, from_path, to_remote, to_path=None):
     """
     Copies a file from one remote to another.
@@ -741,48 +833,77 @@ def get_file(remote, path, sudo=False, dest_dir='/tmp'):
     return file_data
 
 
-def pull_directory(remote, remotedir, localdir):
+def pull_directory(remote, remotedir, localdir, codec=None):
     """
     Copy a remote directory to a local directory.
+
+    :param codec: The name of the compression codec to transfer with; see
+                  compression.choose_codec()
     """
-    log.debug('Transferring archived files from %s:%s to %s',
-              remote.shortname, remotedir, localdir)
+    codec = compression.choose_codec(remote, codec)
+    log.debug('Transferring archived files from %s:%s to %s using %s',
+              remote.shortname, remotedir, localdir, codec.name)
     if not os.path.exists(localdir):
         os.mkdir(localdir)
-    r = remote.get_tar_stream(remotedir, sudo=True)
-    tar = tarfile.open(mode='r|gz', fileobj=r.stdout)
-    while True:
-        ti = tar.next()
-        if ti is None:
-            break
+    start = time.time()
+    r = remote.get_tar_stream(remotedir, sudo=True, codec=codec)
+    with compression.DecompressingReader(r.stdout, codec) as stream:
+        tar = tarfile.open(mode='r|', fileobj=stream)
+        while True:
+            ti = tar.next()
+            if ti is None:
+                break
 
-        if ti.isdir():
-            # ignore silently; easier to just create leading dirs below
-            # XXX this mean empty dirs are not transferred
-            pass
-        elif ti.isfile():
-            sub = safepath.munge(ti.name)
-            safepath.makedirs(root=localdir, path=os.path.dirname(sub))
-            tar.makefile(ti, targetpath=os.path.join(localdir, sub))
-        else:
-            if ti.isdev():
-                type_ = 'device'
-            elif ti.issym():
-                type_ = 'symlink'
-            elif ti.islnk():
-                type_ = 'hard link'
+            if ti.isdir():
+                # ignore silently; easier to just create leading dirs below
+                # XXX this mean empty dirs are not transferred
+                pass
+            elif ti.isfile():
+                sub = safepath.munge(ti.name)
+                safepath.makedirs(root=localdir, path=os.path.dirname(sub))
+                tar.makefile(ti, targetpath=os.path.join(localdir, sub))
             else:
-                type_ = 'unknown'
-            log.info('Ignoring tar entry: %r type %r', ti.name, type_)
+                if ti.isdev():
+                    type_ = 'device'
+                elif ti.issym():
+                    type_ = 'symlink'
+                elif ti.islnk():
+                    type_ = 'hard link'
+                else:
+                    type_ = 'unknown'
+                log.info('Ignoring tar entry: %r type %r', ti.name, type_)
+    log_transfer_stats(remote, remotedir, codec, stream.compressed_bytes,
+                       stream.bytes_read, time.time() - start)
 
 
-def pull_directory_tarball(remote, remotedir, localfile):
+def log_transfer_stats(remote, path, codec, compressed, uncompressed,
+                       elapsed):
+    """
+    Log the size, compression ratio and throughput of a directory transfer
+    """
+    ratio = float(uncompressed) / compressed if compressed else 1.0
+    rate = compressed / elapsed / 1024.0 ** 2 if elapsed else 0.0
+    log.info(
+        'Pulled %s:%s using %s: %d bytes, %d uncompressed (%.1fx) in %.1fs '
+        '(%.1f MB/s)', remote.shortname, path, codec.name, compressed,
+        uncompressed, ratio, elapsed, rate)
+
+
+def pull_directory_tarball(remote, remotedir, localfile, codec=None):
     """
     Copy a remote directory to a local tarball.
+
+    :param codec: The name of the compression codec to use, or 'auto'; see
+                  compression.choose_codec(). By default the tarball is
+                  gzipped, as its suffix usually says; the suffix of
+                  localfile is not changed to match other codecs.
     """
-    log.debug('Transferring archived files from %s:%s to %s',
-              remote.shortname, remotedir, localfile)
-    remote.get_tar(remotedir, localfile, sudo=True)
+    if codec is not None:
+        codec = compression.choose_codec(remote, codec)
+    log.debug('Transferring archived files from %s:%s to %s using %s',
+              remote.shortname, remotedir, localfile,
+              codec.name if codec else 'gzip')
+    remote.get_tar(remotedir, localfile, sudo=True, codec=codec)
 
 
 def get_wwn_id_map(remote, devs):
@@ -1018,6 +1139,8 @@ def get_mon_names(ctx, cluster='ceph'):
     """
     :returns: a list of monitor names
     """
+    if _has_role_index(ctx.cluster):
+        return ctx.cluster.find_roles('mon', cluster)
     is_mon = is_type('mon', cluster)
     host_mons = [[role for role in roles if is_mon(role)]
                  for roles in ctx.cluster.remotes.values()]
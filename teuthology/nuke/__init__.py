@@ -1,6 +1,5 @@
 import argparse
 import datetime
-import json
 import logging
 import os
 import subprocess
@@ -17,7 +16,9 @@ from ..misc import (
     canonicalize_hostname, config_file, decanonicalize_hostname, merge_configs,
     get_user, sh
 )
-from ..openstack import OpenStack, OpenStackInstance, enforce_json_dictionary
+from ..openstack import (Inventory, OpenStack, OpenStackInstance,
+                         enforce_json_dictionary)
+from ..orchestra.console import ConsoleManager
 from ..orchestra.remote import Remote
 from ..parallel import parallel
 from ..task.internal import check_lock, add_remotes, connect
@@ -87,17 +88,16 @@ def stale_openstack_instances(ctx, instances, locked_nodes):
 
 
 def openstack_delete_volume(id):
-    OpenStack().run("volume delete " + id + " || true")
+    OpenStack().volume_delete(id)
+    Inventory.forget(volume_ids=[id])
 
 
 def stale_openstack_volumes(ctx, volumes):
     now = datetime.datetime.now()
     for volume in volumes:
         volume_id = volume.get('ID') or volume['id']
-        try:
-            volume = json.loads(OpenStack().run("volume show -f json " +
-                                                volume_id))
-        except subprocess.CalledProcessError:
+        volume = (Inventory.current() or OpenStack()).volume_show(volume_id)
+        if volume is None:
             log.debug("stale-openstack: {id} disappeared, ignored"
                       .format(id=volume_id))
             continue
@@ -241,6 +241,7 @@ def nuke(ctx, should_unlock, sync_clocks=True, reboot_all=True, noipmi=False):
                         log.info(
                             "Not nuking %s because description doesn't match",
                             lock['name'])
+    console_manager = ConsoleManager()
     with parallel() as p:
         for target, hostkey in ctx.config['targets'].iteritems():
             p.spawn(
@@ -252,10 +253,13 @@ def nuke(ctx, should_unlock, sync_clocks=True, reboot_all=True, noipmi=False):
                 reboot_all,
                 ctx.config.get('check-locks', True),
                 noipmi,
+                console_manager,
             )
         for unnuked in p:
             if unnuked:
                 total_unnuked.update(unnuked)
+    if console_manager.results:
+        console_manager.report()
     if total_unnuked:
         log.error('Could not nuke the following targets:\n' +
                   '\n  '.join(['targets:', ] +
@@ -265,7 +269,7 @@ def nuke(ctx, should_unlock, sync_clocks=True, reboot_all=True, noipmi=False):
 
 
 def nuke_one(ctx, target, should_unlock, synch_clocks, reboot_all,
-             check_locks, noipmi):
+             check_locks, noipmi, console_manager=None):
     ret = None
     ctx = argparse.Namespace(
         config=dict(targets=target),
@@ -276,6 +280,7 @@ def nuke_one(ctx, target, should_unlock, synch_clocks, reboot_all,
         teuthology_config=config.to_dict(),
         name=ctx.name,
         noipmi=noipmi,
+        console_manager=console_manager,
     )
     try:
         nuke_helper(ctx, should_unlock)
@@ -309,7 +314,7 @@ def nuke_helper(ctx, should_unlock):
     if (not ctx.noipmi and 'ipmi_user' in config and
             'vpm' not in shortname):
         try:
-            check_console(host)
+            check_console(host, ctx.console_manager)
         except Exception:
             log.exception('')
             log.info("Will attempt to connect via SSH")
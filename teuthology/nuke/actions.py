@@ -403,10 +403,26 @@ def unlock_firmware_repo(ctx):
                           '/lib/firmware/updates/.git/index.lock', ])
 
 
-def check_console(hostname):
-    remote = Remote(hostname)
-    shortname = remote.shortname
-    console = remote.console
+def check_console(hostname, console_manager=None):
+    """
+    Make sure hostname is at its login prompt, powering it on or cycling it
+    if it is not
+
+    :param console_manager: The ConsoleManager to run the check through, so
+                            that the checks of many hosts are coordinated.
+                            It tries the check only once, as the check may
+                            have power cycled the host before it failed.
+    """
+    if console_manager is None:
+        _check_console(Remote(hostname).console)
+        return
+    result = console_manager.run_one(hostname, _check_console)
+    if not result.ok:
+        raise result.error
+
+
+def _check_console(console):
+    shortname = console.shortname
     cname = '{host}.{domain}'.format(
         host=shortname,
         domain=console.ipmidomain,
@@ -28,6 +28,7 @@ import logging
 import os
 import paramiko
 import re
+import requests
 import socket
 import subprocess
 import tempfile
@@ -40,11 +41,22 @@ from subprocess import CalledProcessError
 from teuthology.contextutil import safe_while
 from teuthology.config import config as teuth_config
 from teuthology.config import set_config_attr
+from teuthology.exceptions import MaxWhileTries, OpenStackAPIError
+from teuthology.openstack.client import Client, credentials_from_env
 from teuthology.orchestra import connection
 from teuthology import misc
 
 log = logging.getLogger(__name__)
 
+# What the API calls of the methods which ignore failures, like the
+# '|| true' of their CLI counterparts, may raise: errors from OpenStack,
+# waiting too long, and connection errors or timeouts
+API_FAILURES = (OpenStackAPIError, MaxWhileTries, requests.RequestException)
+
+# How long, in seconds, an Inventory snapshot is used for, unless
+# openstack: inventory-ttl is set
+INVENTORY_TTL = 60
+
 def enforce_json_dictionary(something):
     if type(something) is not types.DictType:
         raise Exception(
@@ -54,23 +66,276 @@ def enforce_json_dictionary(something):
             ' you are encouraged to add a comment if you want it to be'
             ' fixed.')
 
+
+def format_dict(d):
+    """
+    Format a dict the way the openstack CLI shows properties
+    """
+    return ', '.join("%s='%s'" % (k, v) for k, v in sorted(d.items()))
+
+
+def format_addresses(addresses):
+    """
+    Format the addresses of a server the way the openstack CLI does, e.g.
+    net1=10.0.0.3, 2001:db8::3; net2=192.168.0.4
+    """
+    return '; '.join(
+        '%s=%s' % (network, ', '.join(a['addr'] for a in network_addresses))
+        for network, network_addresses in sorted(addresses.items()))
+
+
+def server_show_info(server):
+    """
+    Return what 'openstack server show -f json' shows for an API server
+    """
+    info = dict((k, v) for k, v in server.items() if k != 'links')
+    info['addresses'] = format_addresses(server.get('addresses') or {})
+    info['properties'] = format_dict(server.get('metadata') or {})
+    for key in ('flavor', 'image'):
+        if isinstance(info.get(key), dict):
+            info[key] = info[key].get('id', '')
+    return info
+
+
+def server_list_info(server):
+    """
+    Return what 'openstack server list -f json --long' shows for an API
+    server
+    """
+    return {
+        'ID': server['id'],
+        'Name': server['name'],
+        'Status': server['status'],
+        'Networks': format_addresses(server.get('addresses') or {}),
+        'Properties': format_dict(server.get('metadata') or {}),
+    }
+
+
+def volume_show_info(volume):
+    info = dict((k, v) for k, v in volume.items() if k != 'links')
+    info['properties'] = format_dict(volume.get('metadata') or {})
+    return info
+
+
+def volume_list_info(volume):
+    return {
+        'ID': volume['id'],
+        'Display Name': volume.get('name') or '',
+        'Status': volume['status'],
+        'Size': volume['size'],
+        'Attached to': ', '.join(
+            "Attached to %s on %s" % (a['server_id'], a.get('device'))
+            for a in volume.get('attachments', [])),
+        'Properties': format_dict(volume.get('metadata') or {}),
+    }
+
+
+def parse_properties(properties):
+    """
+    Parse properties as the openstack CLI shows them, e.g.
+    ownedby='1.2.3.4', teuthology='x'
+    """
+    if isinstance(properties, dict):
+        return properties
+    return dict(re.findall(r"([^\s=,]+)='([^']*)'", properties or ''))
+
+
+class Inventory(object):
+    """
+    A snapshot of the servers and volumes of the tenant, indexed by ID,
+    name and ownedby property, and shared by everything in the process that
+    looks them up: nuke's stale sweeps, provisioning and OpenStackInstance.
+
+    The shared snapshot is taken again once it is older than
+    openstack: inventory-ttl seconds, or after invalidate(); forget() drops
+    the servers and volumes being destroyed from it. A server or volume
+    missing from the snapshot is looked up again rather than assumed gone.
+
+    With the native API a snapshot is two requests, and holds everything
+    'server show' and 'volume show' would. With the CLI it is what 'server
+    list --long' and 'volume list --long' show, and the details are
+    fetched, once, when asked for.
+
+    server_show() and volume_show() are those of OpenStack, so either can
+    be used to look servers and volumes up.
+    """
+    _shared = None
+
+    def __init__(self, openstack=None):
+        self.openstack = openstack or OpenStack()
+        self.created = time.time()
+        self.server_info = dict()
+        self.volume_info = dict()
+        api = self.openstack.get_api()
+        if api is None:
+            self.server_rows = self.openstack.server_list()
+            self.volume_rows = self.openstack.volume_list()
+        else:
+            servers = api.servers()
+            volumes = api.volumes()
+            self.server_rows = map(server_list_info, servers)
+            self.volume_rows = map(volume_list_info, volumes)
+            for server in servers:
+                self.server_info[server['id']] = server_show_info(server)
+            for volume in volumes:
+                self.volume_info[volume['id']] = volume_show_info(volume)
+        self._index()
+
+    def _index(self):
+        self.servers_by_id, self.servers_by_name, self.servers_by_owner = \
+            self._index_rows(self.server_rows, 'Name')
+        self.volumes_by_id, self.volumes_by_name, self.volumes_by_owner = \
+            self._index_rows(self.volume_rows, 'Display Name')
+
+    @staticmethod
+    def _index_rows(rows, name_key):
+        by_id = dict()
+        by_name = dict()
+        by_owner = dict()
+        for row in rows:
+            by_id[row['ID']] = row
+            by_name.setdefault(row.get(name_key), []).append(row)
+            owner = parse_properties(row.get('Properties')).get('ownedby')
+            by_owner.setdefault(owner, []).append(row)
+        return by_id, by_name, by_owner
+
+    @staticmethod
+    def ttl():
+        return teuth_config.openstack.get('inventory-ttl', INVENTORY_TTL)
+
+    @property
+    def expired(self):
+        return time.time() - self.created > self.ttl()
+
+    @classmethod
+    def get(cls):
+        """
+        Return the shared snapshot, taking it first if there is none or it
+        has expired
+        """
+        if cls._shared is None or cls._shared.expired:
+            cls._shared = cls()
+        return cls._shared
+
+    @classmethod
+    def current(cls):
+        """
+        Return the shared snapshot, or None if there is none or it has
+        expired
+        """
+        if cls._shared is None or cls._shared.expired:
+            return None
+        return cls._shared
+
+    @classmethod
+    def invalidate(cls):
+        """
+        Drop the shared snapshot, e.g. after creating servers
+        """
+        cls._shared = None
+
+    @classmethod
+    def forget(cls, server_id=None, volume_ids=()):
+        """
+        Drop a server and volumes from the shared snapshot, e.g. when they
+        are destroyed
+        """
+        inventory = cls._shared
+        if inventory is None:
+            return
+        inventory.server_rows = [row for row in inventory.server_rows
+                                 if row['ID'] != server_id]
+        inventory.volume_rows = [row for row in inventory.volume_rows
+                                 if row['ID'] not in volume_ids]
+        inventory.server_info.pop(server_id, None)
+        for volume_id in volume_ids:
+            inventory.volume_info.pop(volume_id, None)
+        inventory._index()
+
+    @staticmethod
+    def _find(by_id, by_name, name_or_id):
+        if name_or_id in by_id:
+            return by_id[name_or_id]
+        found = by_name.get(name_or_id, [])
+        if len(found) == 1:
+            return found[0]
+        return None
+
+    def server_list(self, ownedby=None, name=None):
+        """
+        Return what 'openstack server list -f json --long' shows
+
+        :param ownedby: Only the servers with this ownedby property
+        :param name:    Only the servers with names matching this regular
+                        expression, as 'server list --name' does
+        """
+        if ownedby is None:
+            rows = self.server_rows
+        else:
+            rows = self.servers_by_owner.get(ownedby, [])
+        if name:
+            rows = [row for row in rows if re.search(name, row['Name'])]
+        return list(rows)
+
+    def server_show(self, name_or_id):
+        """
+        Return what 'openstack server show -f json' shows, or None if there
+        is no such server
+        """
+        row = self._find(self.servers_by_id, self.servers_by_name,
+                         name_or_id)
+        if row is None:
+            return self.openstack.server_show(name_or_id)
+        if row['ID'] not in self.server_info:
+            info = self.openstack.server_show(row['ID'])
+            if info is None:
+                return None
+            self.server_info[row['ID']] = info
+        return copy.deepcopy(self.server_info[row['ID']])
+
+    def volume_list(self, ownedby=None):
+        """
+        Return what 'openstack volume list -f json --long' shows
+
+        :param ownedby: Only the volumes with this ownedby property
+        """
+        if ownedby is None:
+            return list(self.volume_rows)
+        return list(self.volumes_by_owner.get(ownedby, []))
+
+    def volume_show(self, name_or_id):
+        """
+        Return what 'openstack volume show -f json' shows, or None if there
+        is no such volume
+        """
+        row = self._find(self.volumes_by_id, self.volumes_by_name,
+                         name_or_id)
+        if row is None:
+            return self.openstack.volume_show(name_or_id)
+        if row['ID'] not in self.volume_info:
+            info = self.openstack.volume_show(row['ID'])
+            if info is None:
+                return None
+            self.volume_info[row['ID']] = info
+        return copy.deepcopy(self.volume_info[row['ID']])
+
+
 class OpenStackInstance(object):
 
     def __init__(self, name_or_id, info=None):
         self.name_or_id = name_or_id
         self.ip = None
         if info is None:
-            self.set_info()
+            inventory = Inventory.current()
+            if inventory is None:
+                self.set_info()
+            else:
+                self.info = inventory.server_show(name_or_id)
         else:
             self.info = dict(map(lambda (k,v): (k.lower(), v), info.iteritems()))
 
     def set_info(self):
-        try:
-            self.info = json.loads(
-                OpenStack().run("server show -f json " + self.name_or_id))
-            enforce_json_dictionary(self.info)
-        except CalledProcessError:
-            self.info = None
+        self.info = OpenStack().server_show(self.name_or_id)
 
     def __getitem__(self, name):
         return self.info[name.lower()]
@@ -105,7 +370,7 @@ class OpenStackInstance(object):
                 self.set_info()
 
     def get_ip_neutron(self):
-        subnets = json.loads(misc.sh("neutron subnet-list -f json -c id -c ip_version"))
+        subnets = OpenStack().subnet_list()
         subnet_id = None
         for subnet in subnets:
             if subnet['ip_version'] == 4:
@@ -113,7 +378,7 @@ class OpenStackInstance(object):
                 break
         if not subnet_id:
             raise Exception("no subnet with ip_version == 4")
-        ports = json.loads(misc.sh("neutron port-list -f json -c fixed_ips -c device_id"))
+        ports = OpenStack().port_list()
         fixed_ips = None
         for port in ports:
             if port['device_id'] == self['id']:
@@ -143,7 +408,7 @@ class OpenStackInstance(object):
                               self.get_addresses())[0]
 
     def get_floating_ip(self):
-        ips = json.loads(OpenStack().run("ip floating list -f json"))
+        ips = OpenStack().floating_ip_list()
         for ip in ips:
             if ip['Instance ID'] == self['id']:
                 return ip['IP']
@@ -163,13 +428,13 @@ class OpenStackInstance(object):
         if not self.exists():
             return True
         volumes = self.get_volumes()
-        OpenStack().run("server set --name REMOVE-ME-" + self.name_or_id +
-                        " " + self['id'])
-        OpenStack().run("server delete --wait " + self['id'] +
-                        " || true")
+        openstack = OpenStack()
+        openstack.server_set_name(self['id'], "REMOVE-ME-" + self.name_or_id)
+        openstack.server_delete(self['id'])
         for volume in volumes:
-            OpenStack().run("volume set --name REMOVE-ME " + volume + " || true")
-            OpenStack().run("volume delete " + volume + " || true")
+            openstack.volume_set_name(volume, "REMOVE-ME")
+            openstack.volume_delete(volume)
+        Inventory.forget(self['id'], volumes)
         return True
 
 
@@ -211,6 +476,225 @@ class OpenStack(object):
     token_expires = None
     token_cache_duration = 3600
 
+    _api = None
+
+    @staticmethod
+    def get_api():
+        """
+        Return the Client shared by this process, or None if the
+        openstack CLI is to be used instead: when the credentials are not
+        in the environment, or native-api is false in the openstack section
+        of the teuthology configuration.
+        """
+        if not teuth_config.openstack.get('native-api', True):
+            return None
+        credentials = credentials_from_env()
+        if credentials is None:
+            return None
+        api = OpenStack._api
+        if api is None or api.credentials != credentials:
+            api = OpenStack._api = Client(credentials)
+        return api
+
+    def server_show(self, name_or_id):
+        """
+        Return what 'openstack server show -f json' shows, or None if there
+        is no such server
+        """
+        api = self.get_api()
+        if api is None:
+            try:
+                info = json.loads(self.run("server show -f json " +
+                                           name_or_id))
+            except CalledProcessError:
+                return None
+            enforce_json_dictionary(info)
+            return info
+        server = api.server(name_or_id)
+        if server is None:
+            return None
+        return server_show_info(server)
+
+    def server_list(self, name=None):
+        """
+        Return what 'openstack server list -f json --long' shows
+        """
+        api = self.get_api()
+        if api is None:
+            cmd = "server list -f json --long"
+            if name:
+                cmd += " --name '" + name + "'"
+            return json.loads(self.run(cmd))
+        params = dict(name=name) if name else dict()
+        return [server_list_info(server) for server in api.servers(**params)]
+
+    def server_set_name(self, server_id, name):
+        api = self.get_api()
+        if api is None:
+            self.run("server set --name " + name + " " + server_id)
+            return
+        api.rename_server(server_id, name)
+
+    def server_delete(self, server_id):
+        """
+        Delete a server and wait until it is gone, ignoring failures
+        """
+        api = self.get_api()
+        if api is None:
+            self.run("server delete --wait " + server_id + " || true")
+            return
+        try:
+            api.delete_server(server_id, wait=True)
+        except API_FAILURES as e:
+            log.debug("ignoring failure to delete server: %s", e)
+
+    def server_add_volume(self, server, volume):
+        api = self.get_api()
+        if api is None:
+            # do not use OpenStack().run because its
+            # bugous for volume
+            misc.sh("openstack server add volume " + server + " " + volume)
+            return
+        api.attach_volume(api.server(server)['id'],
+                          api.volume(volume)['id'])
+
+    def volume_show(self, name_or_id):
+        """
+        Return what 'openstack volume show -f json' shows, or None if there
+        is no such volume
+        """
+        api = self.get_api()
+        if api is None:
+            try:
+                return json.loads(self.run("volume show -f json " +
+                                           name_or_id))
+            except CalledProcessError:
+                return None
+        volume = api.volume(name_or_id)
+        if volume is None:
+            return None
+        return volume_show_info(volume)
+
+    def volume_list(self):
+        """
+        Return what 'openstack volume list -f json --long' shows
+        """
+        api = self.get_api()
+        if api is None:
+            return json.loads(self.run("volume list -f json --long"))
+        return [volume_list_info(volume) for volume in api.volumes()]
+
+    def volume_set_name(self, volume_id, name):
+        """
+        Rename a volume, ignoring failures
+        """
+        api = self.get_api()
+        if api is None:
+            self.run("volume set --name " + name + " " + volume_id +
+                     " || true")
+            return
+        try:
+            api.rename_volume(volume_id, name)
+        except API_FAILURES as e:
+            log.debug("ignoring failure to rename volume: %s", e)
+
+    def volume_delete(self, volume_id):
+        """
+        Delete a volume, ignoring failures
+        """
+        api = self.get_api()
+        if api is None:
+            self.run("volume delete " + volume_id + " || true")
+            return
+        try:
+            api.delete_volume(volume_id)
+        except API_FAILURES as e:
+            log.debug("ignoring failure to delete volume: %s", e)
+
+    def flavor_list(self):
+        """
+        Return what 'openstack flavor list -f json' shows
+        """
+        api = self.get_api()
+        if api is None:
+            return json.loads(self.run("flavor list -f json"))
+        return [{
+            'ID': flavor['id'],
+            'Name': flavor['name'],
+            'RAM': flavor['ram'],
+            'Disk': flavor['disk'],
+            'VCPUs': flavor['vcpus'],
+        } for flavor in api.flavors()]
+
+    def image_list(self, name):
+        """
+        Return what 'openstack image list -f json' shows for the images
+        called name
+        """
+        api = self.get_api()
+        if api is None:
+            return json.loads(self.run("image list -f json --property name='" +
+                                       name + "'"))
+        return [{
+            'ID': image['id'],
+            'Name': image['name'],
+            'Status': image['status'],
+        } for image in api.images(name=name)]
+
+    def network_show(self, name_or_id):
+        """
+        Return what 'openstack network show -f json' shows
+        """
+        api = self.get_api()
+        if api is None:
+            return json.loads(self.run("network show -f json " + name_or_id))
+        networks = (api.networks(name=name_or_id) or
+                    api.networks(id=name_or_id))
+        if not networks:
+            raise OpenStackAPIError('GET', 'networks', 404,
+                                    "no network " + name_or_id)
+        return networks[0]
+
+    def floating_ip_list(self):
+        """
+        Return what 'openstack ip floating list -f json' shows
+        """
+        api = self.get_api()
+        if api is None:
+            return json.loads(self.run("ip floating list -f json"))
+        return [{
+            'ID': ip['id'],
+            'IP': ip['ip'],
+            'Pool': ip.get('pool'),
+            'Fixed IP': ip.get('fixed_ip'),
+            'Instance ID': ip.get('instance_id'),
+        } for ip in api.floating_ips()]
+
+    def subnet_list(self):
+        """
+        Return what 'neutron subnet-list -f json -c id -c ip_version' shows
+        """
+        api = self.get_api()
+        if api is None:
+            return json.loads(misc.sh(
+                "neutron subnet-list -f json -c id -c ip_version"))
+        return [dict(id=subnet['id'], ip_version=subnet['ip_version'])
+                for subnet in api.subnets()]
+
+    def port_list(self):
+        """
+        Return what 'neutron port-list -f json -c fixed_ips -c device_id'
+        shows
+        """
+        api = self.get_api()
+        if api is None:
+            return json.loads(misc.sh(
+                "neutron port-list -f json -c fixed_ips -c device_id"))
+        return [dict(device_id=port['device_id'],
+                     fixed_ips='\n'.join(json.dumps(fixed_ip)
+                                         for fixed_ip in port['fixed_ips']))
+                for port in api.ports()]
+
     def cache_token(self):
         if self.provider != 'ovh':
             return False
@@ -313,16 +797,13 @@ class OpenStack(object):
         """
         Return true if the image exists in OpenStack.
         """
-        found = self.run("image list -f json --property name='" +
-                        self.image_name(image) + "'")
-        return len(json.loads(found)) > 0
+        return len(self.image_list(self.image_name(image))) > 0
 
     def net_id(self, network):
         """
         Return the uuid of the network in OpenStack.
         """
-        r = json.loads(self.run("network show -f json " +
-                               network))
+        r = self.network_show(network)
         return self.get_value(r, 'id')
 
     def type_version(self, os_type, os_version):
@@ -369,8 +850,8 @@ class OpenStack(object):
         """
         Return the smallest flavor that satisfies the desired size.
         """
-        flavors_string = self.run("flavor list -f json")
-        flavors = json.loads(flavors_string)
+        flavors = self.flavor_list()
+        flavors_string = json.dumps(flavors)
         found = []
         for flavor in flavors:
             if select and not re.match(select, flavor['Name']):
@@ -413,19 +894,15 @@ class OpenStack(object):
 
     @staticmethod
     def list_instances():
-        ownedby = "ownedby='" + teuth_config.openstack['ip'] + "'"
-        all = json.loads(OpenStack().run(
-            "server list -f json --long --name 'target'"))
-        return filter(lambda instance: ownedby in instance['Properties'], all)
+        return Inventory.get().server_list(
+            ownedby=teuth_config.openstack['ip'], name='target')
 
     @staticmethod
     def list_volumes():
-        ownedby = "ownedby='" + teuth_config.openstack['ip'] + "'"
-        all = json.loads(OpenStack().run("volume list -f json --long"))
-        def select(volume):
-            return (ownedby in volume['Properties'] and
-                    volume['Display Name'].startswith('target'))
-        return filter(select, all)
+        volumes = Inventory.get().volume_list(
+            ownedby=teuth_config.openstack['ip'])
+        return [volume for volume in volumes
+                if volume['Display Name'].startswith('target')]
 
     def cloud_init_wait(self, instance):
         """
@@ -441,7 +918,9 @@ class OpenStack(object):
         if self.key_filename:
             log.debug("using key " + self.key_filename)
             client_args['key_filename'] = self.key_filename
-        with safe_while(sleep=30, tries=30,
+        # poll often rather than sleeping ahead of time: sshd may accept
+        # connections a little before the key it should accept is installed
+        with safe_while(sleep=5, tries=180,
                         action="cloud_init_wait " + ip) as proceed:
             success = False
             # CentOS 6.6 logs in /var/log/clout-init-output.log
@@ -774,7 +1253,7 @@ openstack security group rule create --proto udp --dst-port 16000:65535 teutholo
         """
         Return a floating IP address not associated with an instance or None.
         """
-        ips = json.loads(OpenStack().run("ip floating list -f json"))
+        ips = OpenStack().floating_ip_list()
         for ip in ips:
             if not ip['Instance ID']:
                 return ip['IP']
@@ -816,7 +1295,7 @@ openstack security group rule create --proto udp --dst-port 16000:65535 teutholo
         """
         Return the id of a floating IP
         """
-        results = json.loads(OpenStack().run("ip floating list -f json"))
+        results = OpenStack().floating_ip_list()
         for result in results:
             if result['IP'] == ip:
                 return str(result['ID'])
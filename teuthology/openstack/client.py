@@ -0,0 +1,307 @@
+"""
+A client for the parts of the OpenStack APIs teuthology uses
+
+Each call of the openstack CLI costs a python-openstackclient startup and a
+Keystone authentication. Client instead keeps one requests session, with a
+pool of connections per endpoint, and one token per set of credentials for
+as long as it is valid. Credentials are read from the same OS_* environment
+variables the CLI uses.
+
+The methods return the resources as the APIs describe them; the OpenStack
+class turns them into what the CLI would have printed.
+"""
+import calendar
+import logging
+import os
+import re
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from teuthology.contextutil import safe_while
+from teuthology.exceptions import OpenStackAPIError
+
+log = logging.getLogger(__name__)
+
+# The number of connections kept open to each endpoint
+POOL_SIZE = 16
+# Tokens are renewed this many seconds before they expire
+TOKEN_MARGIN = 300
+REQUEST_TIMEOUT = 60
+
+# The version path each service's endpoint needs, when the catalog does not
+# include one
+_VERSIONS = {
+    'network': 'v2.0',
+    'image': 'v2',
+}
+
+
+def parse_time(timestamp):
+    """
+    Return the epoch time of an ISO 8601 UTC timestamp as found in Keystone
+    responses, e.g. 2016-10-18T15:22:33Z or 2016-10-18T15:22:33.000000Z
+    """
+    match = re.match(r'(\d+)-(\d+)-(\d+)T(\d+):(\d+):(\d+)', timestamp)
+    return calendar.timegm([int(field) for field in match.groups()])
+
+
+def credentials_from_env(env=None):
+    """
+    Read the OS_* environment variables
+
+    :returns: A dict, or None if OS_AUTH_URL is not set
+    """
+    env = os.environ if env is None else env
+    if 'OS_AUTH_URL' not in env:
+        return None
+    return dict(
+        auth_url=env['OS_AUTH_URL'].rstrip('/'),
+        username=env.get('OS_USERNAME'),
+        password=env.get('OS_PASSWORD'),
+        project_name=env.get('OS_PROJECT_NAME') or env.get('OS_TENANT_NAME'),
+        project_id=env.get('OS_PROJECT_ID') or env.get('OS_TENANT_ID'),
+        user_domain=env.get('OS_USER_DOMAIN_NAME', 'Default'),
+        project_domain=env.get('OS_PROJECT_DOMAIN_NAME', 'Default'),
+        region=env.get('OS_REGION_NAME'),
+        identity_version=env.get('OS_IDENTITY_API_VERSION'),
+    )
+
+
+class Client(object):
+    """
+    An authenticated session with an OpenStack cloud
+    """
+    # Tokens and service catalogs by credentials, shared by all clients
+    _tokens = dict()
+
+    def __init__(self, credentials):
+        self.credentials = credentials
+        self.auth_url = credentials['auth_url']
+        self.v3 = (credentials.get('identity_version') == '3' or
+                   self.auth_url.endswith('/v3'))
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE,
+                              pool_maxsize=POOL_SIZE)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    @property
+    def _token_key(self):
+        c = self.credentials
+        return (self.auth_url, c['username'], c['project_name'],
+                c['project_id'])
+
+    def _auth_request(self):
+        c = self.credentials
+        if self.v3:
+            url = self.auth_url
+            if not url.endswith('/v3'):
+                url += '/v3'
+            if c['project_id']:
+                project = dict(id=c['project_id'])
+            else:
+                project = dict(name=c['project_name'],
+                               domain=dict(name=c['project_domain']))
+            body = dict(auth=dict(
+                identity=dict(
+                    methods=['password'],
+                    password=dict(user=dict(
+                        name=c['username'],
+                        domain=dict(name=c['user_domain']),
+                        password=c['password'],
+                    )),
+                ),
+                scope=dict(project=project),
+            ))
+            return url + '/auth/tokens', body
+        auth = dict(passwordCredentials=dict(username=c['username'],
+                                             password=c['password']))
+        if c['project_id']:
+            auth['tenantId'] = c['project_id']
+        else:
+            auth['tenantName'] = c['project_name']
+        return self.auth_url + '/tokens', dict(auth=auth)
+
+    def authenticate(self):
+        """
+        Get a new token and service catalog from Keystone
+        """
+        url, body = self._auth_request()
+        log.debug("Authenticating with %s", url)
+        response = self.session.post(url, json=body, timeout=REQUEST_TIMEOUT)
+        if not response.ok:
+            raise OpenStackAPIError('POST', url, response.status_code,
+                                    response.text)
+        result = response.json()
+        if self.v3:
+            token = response.headers['X-Subject-Token']
+            expires = parse_time(result['token']['expires_at'])
+            catalog = dict()
+            for service in result['token'].get('catalog', []):
+                catalog[service['type']] = [
+                    (e.get('region_id') or e.get('region'), e['url'])
+                    for e in service['endpoints']
+                    if e.get('interface') == 'public']
+        else:
+            access = result['access']
+            token = access['token']['id']
+            expires = parse_time(access['token']['expires'])
+            catalog = dict()
+            for service in access.get('serviceCatalog', []):
+                catalog[service['type']] = [
+                    (e.get('region'), e['publicURL'])
+                    for e in service['endpoints']]
+        Client._tokens[self._token_key] = (token, expires, catalog)
+        return token
+
+    def _cached(self):
+        cached = Client._tokens.get(self._token_key)
+        if cached is None or cached[1] - TOKEN_MARGIN < time.time():
+            self.authenticate()
+            cached = Client._tokens[self._token_key]
+        return cached
+
+    @property
+    def token(self):
+        return self._cached()[0]
+
+    def invalidate_token(self):
+        Client._tokens.pop(self._token_key, None)
+
+    def endpoint(self, service_type):
+        """
+        Return the public URL of a service, e.g. 'compute', in the region
+        given by OS_REGION_NAME if there is one
+        """
+        catalog = self._cached()[2]
+        types = [service_type]
+        if service_type == 'volume':
+            types = ['volumev2', 'volume']
+        region = self.credentials.get('region')
+        for type_ in types:
+            for endpoint_region, url in catalog.get(type_, []):
+                if region and endpoint_region and endpoint_region != region:
+                    continue
+                url = url.rstrip('/')
+                version = _VERSIONS.get(service_type)
+                if version and not re.search(r'/v\d+(\.\d+)?$', url):
+                    url += '/' + version
+                return url
+        raise OpenStackAPIError('GET', self.auth_url, None,
+                                "no %s endpoint in the service catalog" %
+                                service_type)
+
+    def request(self, method, service_type, path, **kwargs):
+        """
+        Make a request to a service, authenticating again once if the token
+        has been revoked
+
+        :returns: The decoded JSON response, or None if there is none
+        """
+        url = self.endpoint(service_type) + path
+        for attempt in (1, 2):
+            headers = {'X-Auth-Token': self.token,
+                       'Accept': 'application/json'}
+            response = self.session.request(method, url, headers=headers,
+                                            timeout=REQUEST_TIMEOUT,
+                                            **kwargs)
+            if response.status_code == 401 and attempt == 1:
+                self.invalidate_token()
+                continue
+            break
+        if not response.ok:
+            raise OpenStackAPIError(method, url, response.status_code,
+                                    response.text)
+        if not response.content:
+            return None
+        return response.json()
+
+    def get(self, service_type, path, **params):
+        return self.request('GET', service_type, path, params=params or None)
+
+    def _find(self, service_type, collection, key, name_or_id):
+        """
+        Find a resource by ID, then by exact name
+
+        :returns: The resource, or None if there is none
+        """
+        try:
+            return self.get(service_type, '/%s/%s' % (collection,
+                                                      name_or_id))[key]
+        except OpenStackAPIError as e:
+            if e.status not in (400, 404):
+                raise
+        found = self.get(service_type, '/%s/detail' % collection,
+                         name=name_or_id)[collection]
+        found = [item for item in found if item.get('name') == name_or_id]
+        return found[0] if found else None
+
+    # compute
+
+    def server(self, name_or_id):
+        return self._find('compute', 'servers', 'server', name_or_id)
+
+    def servers(self, **params):
+        return self.get('compute', '/servers/detail', **params)['servers']
+
+    def rename_server(self, server_id, name):
+        self.request('PUT', 'compute', '/servers/' + server_id,
+                     json=dict(server=dict(name=name)))
+
+    def delete_server(self, server_id, wait=False):
+        self.request('DELETE', 'compute', '/servers/' + server_id)
+        if not wait:
+            return
+        with safe_while(sleep=2, tries=150,
+                        action="delete server " + server_id) as proceed:
+            while proceed():
+                try:
+                    self.get('compute', '/servers/' + server_id)
+                except OpenStackAPIError as e:
+                    if e.status == 404:
+                        return
+                    raise
+
+    def attach_volume(self, server_id, volume_id):
+        self.request('POST', 'compute',
+                     '/servers/%s/os-volume_attachments' % server_id,
+                     json=dict(volumeAttachment=dict(volumeId=volume_id)))
+
+    def flavors(self):
+        return self.get('compute', '/flavors/detail')['flavors']
+
+    def floating_ips(self):
+        return self.get('compute', '/os-floating-ips')['floating_ips']
+
+    # block storage
+
+    def volume(self, name_or_id):
+        return self._find('volume', 'volumes', 'volume', name_or_id)
+
+    def volumes(self, **params):
+        return self.get('volume', '/volumes/detail', **params)['volumes']
+
+    def rename_volume(self, volume_id, name):
+        self.request('PUT', 'volume', '/volumes/' + volume_id,
+                     json=dict(volume=dict(name=name)))
+
+    def delete_volume(self, volume_id):
+        self.request('DELETE', 'volume', '/volumes/' + volume_id)
+
+    # network
+
+    def networks(self, **params):
+        return self.get('network', '/networks', **params)['networks']
+
+    def subnets(self, **params):
+        return self.get('network', '/subnets', **params)['subnets']
+
+    def ports(self, **params):
+        return self.get('network', '/ports', **params)['ports']
+
+    # image
+
+    def images(self, **params):
+        return self.get('image', '/images', **params)['images']
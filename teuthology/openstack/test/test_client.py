@@ -0,0 +1,337 @@
+import BaseHTTPServer
+import json
+import os
+import re
+import requests
+import threading
+import time
+import urlparse
+
+from mock import patch
+from pytest import raises
+
+from teuthology import nuke
+from teuthology.config import config
+from teuthology.exceptions import MaxWhileTries, OpenStackAPIError
+from teuthology.openstack import Inventory, OpenStack, OpenStackInstance
+from teuthology.openstack.client import Client, parse_time
+
+
+class FakeCloud(object):
+    """
+    Just enough of Keystone, Nova, Cinder, Neutron and Glance for the tests
+    """
+    def __init__(self):
+        self.auth_count = 0
+        self.revoked = set()
+        self.requests = []
+        self.servers = {
+            's1': dict(id='s1', name='target1', status='ACTIVE',
+                       created='2016-10-18T15:22:33Z',
+                       addresses={'net': [dict(addr='10.0.0.3')]},
+                       metadata=dict(ownedby='1.2.3.4', teuthology='x'),
+                       links=[],
+                       **{'os-extended-volumes:volumes_attached':
+                          [dict(id='v1')]}),
+            's2': dict(id='s2', name='target2', status='ACTIVE',
+                       created='2016-10-18T15:22:33Z', addresses={},
+                       metadata=dict(ownedby='5.6.7.8'),
+                       **{'os-extended-volumes:volumes_attached': []}),
+        }
+        self.volumes = {
+            'v1': dict(id='v1', name='target1-0', status='in-use', size=1,
+                       created_at='2000-11-02T15:43:12.000000',
+                       metadata=dict(ownedby='1.2.3.4'), attachments=[]),
+        }
+
+    def catalog(self, base):
+        return [
+            dict(type=type_, endpoints=[
+                dict(interface='public', region_id='R1', url=base + path),
+                dict(interface='public', region_id='R2', url='http://no/'),
+            ])
+            for type_, path in (('compute', '/compute/v2.1/t'),
+                                ('volumev2', '/volume/v2/t'),
+                                ('network', '/network/'),
+                                ('image', '/image'))]
+
+    def handle(self, handler, method):
+        url = urlparse.urlparse(handler.path)
+        query = dict(urlparse.parse_qsl(url.query))
+        length = int(handler.headers.get('Content-Length') or 0)
+        body = json.loads(handler.rfile.read(length)) if length else None
+        self.requests.append((method, url.path))
+        if url.path == '/v3/auth/tokens':
+            self.auth_count += 1
+            token = 'token%d' % self.auth_count
+            base = 'http://%s:%d' % handler.server.server_address
+            return 201, dict(token=dict(
+                expires_at='2100-01-01T00:00:00.000000Z',
+                catalog=self.catalog(base))), {'X-Subject-Token': token}
+        token = handler.headers.get('X-Auth-Token')
+        if token in self.revoked or not token:
+            return 401, dict(error='unauthorized'), {}
+        for pattern, func in self.routes:
+            match = re.match(pattern + '$', url.path)
+            if match and func.__name__.startswith(method.lower()):
+                return func(self, query, body, *match.groups())
+        return 404, dict(itemNotFound='not found'), {}
+
+    def get_server(self, query, body, server_id):
+        if server_id not in self.servers:
+            return 404, dict(itemNotFound=server_id), {}
+        return 200, dict(server=self.servers[server_id]), {}
+
+    def get_servers(self, query, body):
+        name = query.get('name', '')
+        return 200, dict(servers=[s for s in self.servers.values()
+                                  if re.search(name, s['name'])]), {}
+
+    def put_server(self, query, body, server_id):
+        self.servers[server_id].update(body['server'])
+        return 200, dict(server=self.servers[server_id]), {}
+
+    def delete_server(self, query, body, server_id):
+        del self.servers[server_id]
+        return 204, None, {}
+
+    def get_floating_ips(self, query, body):
+        return 200, dict(floating_ips=[
+            dict(id=1, ip='8.8.8.8', pool='ext', fixed_ip='10.0.0.3',
+                 instance_id='s1')]), {}
+
+    def get_flavors(self, query, body):
+        return 200, dict(flavors=[
+            dict(id='f1', name='big', ram=16000, disk=100, vcpus=4),
+            dict(id='f2', name='small', ram=8000, disk=40, vcpus=1)]), {}
+
+    def get_volume(self, query, body, volume_id):
+        if volume_id not in self.volumes:
+            return 404, dict(itemNotFound=volume_id), {}
+        return 200, dict(volume=self.volumes[volume_id]), {}
+
+    def get_volumes(self, query, body):
+        return 200, dict(volumes=[
+            v for v in self.volumes.values()
+            if 'name' not in query or v['name'] == query['name']]), {}
+
+    def put_volume(self, query, body, volume_id):
+        self.volumes[volume_id].update(body['volume'])
+        return 200, dict(volume=self.volumes[volume_id]), {}
+
+    def delete_volume(self, query, body, volume_id):
+        del self.volumes[volume_id]
+        return 202, None, {}
+
+    def get_subnets(self, query, body):
+        return 200, dict(subnets=[dict(id='sub6', ip_version=6),
+                                  dict(id='sub4', ip_version=4)]), {}
+
+    def get_ports(self, query, body):
+        return 200, dict(ports=[dict(device_id='s1', fixed_ips=[
+            dict(subnet_id='sub6', ip_address='fe80::1'),
+            dict(subnet_id='sub4', ip_address='10.0.0.3')])]), {}
+
+    def get_images(self, query, body):
+        images = [dict(id='i1', name='teuthology-ubuntu-14.04',
+                       status='active')]
+        return 200, dict(images=[i for i in images
+                                 if i['name'] == query.get('name')]), {}
+
+    routes = [
+        ('/compute/v2.1/t/servers/detail', get_servers),
+        ('/compute/v2.1/t/servers/([^/]+)', get_server),
+        ('/compute/v2.1/t/servers/([^/]+)', put_server),
+        ('/compute/v2.1/t/servers/([^/]+)', delete_server),
+        ('/compute/v2.1/t/os-floating-ips', get_floating_ips),
+        ('/compute/v2.1/t/flavors/detail', get_flavors),
+        ('/volume/v2/t/volumes/detail', get_volumes),
+        ('/volume/v2/t/volumes/([^/]+)', get_volume),
+        ('/volume/v2/t/volumes/([^/]+)', put_volume),
+        ('/volume/v2/t/volumes/([^/]+)', delete_volume),
+        ('/network/v2.0/subnets', get_subnets),
+        ('/network/v2.0/ports', get_ports),
+        ('/image/v2/images', get_images),
+    ]
+
+
+def make_handler(cloud):
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        def respond(self, method):
+            status, body, headers = cloud.handle(self, method)
+            data = json.dumps(body) if body is not None else ''
+            self.send_response(status)
+            for key, value in headers.items():
+                self.send_header(key, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.respond('GET')
+
+        def do_POST(self):
+            self.respond('POST')
+
+        def do_PUT(self):
+            self.respond('PUT')
+
+        def do_DELETE(self):
+            self.respond('DELETE')
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+
+class TestClient(object):
+    def setup(self):
+        self.cloud = FakeCloud()
+        self.server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                                make_handler(self.cloud))
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs=dict(poll_interval=0.05))
+        self.thread.daemon = True
+        self.thread.start()
+        self.env = patch.dict(os.environ, {
+            'OS_AUTH_URL': 'http://127.0.0.1:%d/v3' %
+            self.server.server_address[1],
+            'OS_USERNAME': 'user',
+            'OS_PASSWORD': 'secret',
+            'OS_PROJECT_NAME': 'project',
+            'OS_REGION_NAME': 'R1',
+        })
+        self.env.start()
+        self.saved_openstack = config.openstack
+        config.openstack = dict(self.saved_openstack, ip='1.2.3.4')
+        OpenStack._api = None
+        Client._tokens.clear()
+        Inventory.invalidate()
+
+    def teardown(self):
+        self.env.stop()
+        config.openstack = self.saved_openstack
+        self.server.shutdown()
+        self.server.server_close()
+        OpenStack._api = None
+        Client._tokens.clear()
+        Inventory.invalidate()
+
+    def test_parse_time(self):
+        assert parse_time('1970-01-02T00:00:01Z') == 86401
+        assert parse_time('1970-01-01T00:01:00.000000Z') == 60
+
+    def test_token_reused(self):
+        o = OpenStack()
+        assert o.server_show('s1')['id'] == 's1'
+        assert OpenStack().server_show('target2')['id'] == 's2'
+        assert o.volume_show('missing') is None
+        assert self.cloud.auth_count == 1
+        assert OpenStack.get_api() is o.get_api()
+
+    def test_token_renewed(self):
+        api = OpenStack.get_api()
+        api.servers()
+        # revoked
+        self.cloud.revoked.add(api.token)
+        api.servers()
+        assert self.cloud.auth_count == 2
+        # about to expire
+        token, _, catalog = Client._tokens[api._token_key]
+        Client._tokens[api._token_key] = (token, time.time() + 10, catalog)
+        api.servers()
+        assert self.cloud.auth_count == 3
+
+    def test_errors(self):
+        api = OpenStack.get_api()
+        with raises(OpenStackAPIError) as e:
+            api.request('GET', 'compute', '/nowhere')
+        assert e.value.status == 404
+        with raises(OpenStackAPIError):
+            api.endpoint('object-store')
+
+    def test_native_api_disabled(self):
+        config.openstack['native-api'] = False
+        assert OpenStack.get_api() is None
+
+    def test_server_show(self):
+        i = OpenStackInstance('target1')
+        assert i['id'] == 's1'
+        assert i['addresses'] == 'net=10.0.0.3'
+        assert i['properties'] == "ownedby='1.2.3.4', teuthology='x'"
+        assert i.get_volumes() == ['v1']
+        assert i.get_floating_ip() == '8.8.8.8'
+        assert i.get_ip_neutron() == '10.0.0.3'
+        assert not OpenStackInstance('nothere').exists()
+
+    def test_lists(self):
+        assert [i['ID'] for i in OpenStack.list_instances()] == ['s1']
+        assert [v['ID'] for v in OpenStack.list_volumes()] == ['v1']
+        hint = dict(ram=8000, cpus=1, disk=20)
+        assert OpenStack().flavor(hint, None) == 'small'
+        assert OpenStack().image_exists('ubuntu-14.04')
+        assert not OpenStack().image_exists('centos-7.2')
+
+    def test_destroy(self):
+        OpenStackInstance('s1').destroy()
+        assert self.cloud.servers.keys() == ['s2']
+        assert self.cloud.volumes == {}
+        assert ('PUT', '/compute/v2.1/t/servers/s1') in self.cloud.requests
+        assert ('PUT', '/volume/v2/t/volumes/v1') in self.cloud.requests
+
+    def test_delete_failures_ignored(self):
+        api = OpenStack.get_api()
+        for error in (MaxWhileTries("stuck deleting"),
+                      requests.ConnectionError("connection refused"),
+                      requests.Timeout("timed out")):
+            with patch.object(api, 'delete_server', side_effect=error):
+                OpenStack().server_delete('s1')
+            with patch.object(api, 'delete_volume', side_effect=error):
+                OpenStack().volume_delete('v1')
+            with patch.object(api, 'rename_volume', side_effect=error):
+                OpenStack().volume_set_name('v1', 'gone')
+
+    def test_stale_openstack_volumes(self):
+        ctx = type('Ctx', (object,), dict(dry_run=False))()
+        nuke.stale_openstack_volumes(ctx, OpenStack.list_volumes())
+        assert self.cloud.volumes == {}
+
+    def test_inventory(self):
+        OpenStack.list_instances()
+        OpenStack.list_volumes()
+        count = len(self.cloud.requests)
+        inventory = Inventory.current()
+        assert inventory.servers_by_name['target2'][0]['ID'] == 's2'
+        assert [s['ID'] for s in inventory.server_list(ownedby='5.6.7.8')] \
+            == ['s2']
+        assert [v['ID'] for v in inventory.volume_list(ownedby='1.2.3.4')] \
+            == ['v1']
+        i = OpenStackInstance('target1')
+        assert i['properties'] == "ownedby='1.2.3.4', teuthology='x'"
+        assert i.get_volumes() == ['v1']
+        assert inventory.volume_show('target1-0')['id'] == 'v1'
+        # all of the above came from the snapshot
+        assert len(self.cloud.requests) == count
+        # what is missing from the snapshot is looked up again
+        assert inventory.server_show('s3') is None
+        assert len(self.cloud.requests) > count
+
+    def test_inventory_ttl(self):
+        config.openstack['inventory-ttl'] = 0
+        inventory = Inventory.get()
+        time.sleep(0.01)
+        assert Inventory.current() is None
+        assert Inventory.get() is not inventory
+        config.openstack['inventory-ttl'] = 60
+        assert Inventory.get() is Inventory.get()
+        Inventory.invalidate()
+        assert Inventory.current() is None
+
+    def test_inventory_forget(self):
+        Inventory.get()
+        OpenStackInstance('s1').destroy()
+        inventory = Inventory.current()
+        assert inventory.servers_by_id.keys() == ['s2']
+        assert inventory.volume_list() == []
+        assert not OpenStackInstance('s1').exists()
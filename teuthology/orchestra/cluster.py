@@ -2,12 +2,22 @@
 Cluster definition
 part of context, Cluster is used to save connection information.
 """
+import hashlib
+
 import teuthology.misc
+from teuthology.parallel import parallel
+
+# How many nodes write_file() and distribute_file() write to at once
+MAX_CONCURRENT_WRITES = 16
 
 
 class Cluster(object):
     """
     Manage SSH connections to a cluster of machines.
+
+    Role lookups are answered from an index which is rebuilt after add(), or
+    when the remotes dict is replaced. Roles should therefore not be changed
+    in place.
     """
 
     def __init__(self, remotes=None):
@@ -16,6 +26,8 @@ class Cluster(object):
                             (Remote, [role_1, role_2 ...])
         """
         self.remotes = {}
+        self._index = None
+        self._index_key = None
         if remotes is not None:
             for remote, roles in remotes:
                 self.add(remote, roles)
@@ -49,6 +61,51 @@ class Cluster(object):
                     ),
                 )
         self.remotes[remote] = list(roles)
+        self._index = None
+
+    def _get_index(self):
+        """
+        Return the role index, building it first if it is stale.
+
+        The index is a dict with these keys:
+
+            by_role: role -> list of remotes with that role
+            by_type: (ceph cluster name, type) -> list of roles, and
+                     (None, type) -> list of roles in any ceph cluster
+
+        Lists keep the order of self.remotes and of each remote's roles, so
+        answers are the same as those of a scan.
+        """
+        key = (id(self.remotes), len(self.remotes))
+        if self._index is not None and self._index_key == key:
+            return self._index
+        by_role = dict()
+        by_type = dict()
+        for remote, roles in self.remotes.iteritems():
+            for role in roles:
+                role_remotes = by_role.setdefault(role, [])
+                if not role_remotes or role_remotes[-1] is not remote:
+                    role_remotes.append(remote)
+                try:
+                    ceph_cluster, type_, _ = teuthology.misc.split_role(role)
+                except ValueError:
+                    continue
+                by_type.setdefault((ceph_cluster, type_), []).append(role)
+                by_type.setdefault((None, type_), []).append(role)
+        self._index = dict(by_role=by_role, by_type=by_type)
+        self._index_key = key
+        return self._index
+
+    def find_roles(self, type_, cluster=None):
+        """
+        Return the roles of the given type, e.g. 'osd', in the order a scan
+        of self.remotes would find them.
+
+        :param type_:   The role type
+        :param cluster: Only return roles of this ceph cluster. By default,
+                        roles of every ceph cluster are returned.
+        """
+        return list(self._get_index()['by_type'].get((cluster, type_), []))
 
     def run(self, **kwargs):
         """
@@ -63,23 +120,61 @@ class Cluster(object):
         remotes = sorted(self.remotes.iterkeys(), key=lambda rem: rem.name)
         return [remote.run(**kwargs) for remote in remotes]
 
-    def write_file(self, file_name, content, sudo=False, perms=None, owner=None):
+    def write_file(self, file_name, content, sudo=False, perms=None,
+                   owner=None, max_concurrent=MAX_CONCURRENT_WRITES):
         """
-        Write text to a file on each node.
+        Write text to a file on each node, writing to up to max_concurrent
+        nodes at once.
 
         :param file_name: file name
-        :param content: file content
+        :param content: file content; a string or a file-like object, which
+                        is read once
         :param sudo: use sudo
         :param perms: file permissions (passed to chmod) ONLY if sudo is True
+        :param owner: file owner (passed to chown) ONLY if sudo is True
+        :param max_concurrent: the maximum number of concurrent writes
         """
+        if not sudo and (perms is not None or owner is not None):
+            raise ValueError("To specify perms or owner, sudo must be True")
+        if hasattr(content, 'read'):
+            content = content.read()
         remotes = sorted(self.remotes.iterkeys(), key=lambda rem: rem.name)
-        for remote in remotes:
-            if sudo:
-                teuthology.misc.sudo_write_file(remote, file_name, content, perms=perms, owner=owner)
-            else:
-                if perms is not None or owner is not None:
-                    raise ValueError("To specify perms or owner, sudo must be True")
-                teuthology.misc.write_file(remote, file_name, content)
+        with parallel(size=max_concurrent) as p:
+            for remote in remotes:
+                if sudo:
+                    p.spawn(teuthology.misc.sudo_write_file, remote,
+                            file_name, content, perms=perms, owner=owner)
+                else:
+                    p.spawn(teuthology.misc.write_file, remote, file_name,
+                            content)
+
+    def distribute_file(self, file_name, content, sudo=False, perms=None,
+                        owner=None, max_concurrent=MAX_CONCURRENT_WRITES):
+        """
+        Like write_file(), but each node verifies the checksum of what it
+        received, and nodes whose file already has the same content are
+        skipped. Use this for keyrings, configuration files and binaries which
+        are pushed to many nodes, possibly more than once.
+
+        :returns: A list of the remotes that were written to, sorted by name
+        """
+        if not sudo and (perms is not None or owner is not None):
+            raise ValueError("To specify perms or owner, sudo must be True")
+        if hasattr(content, 'read'):
+            content = content.read()
+        sha1 = hashlib.sha1(content).hexdigest()
+
+        def write(remote):
+            written = teuthology.misc.write_file_if_changed(
+                remote, file_name, content, sha1=sha1, sudo=sudo,
+                perms=perms, owner=owner)
+            return remote, written
+
+        with parallel(size=max_concurrent) as p:
+            for remote in self.remotes.iterkeys():
+                p.spawn(write, remote)
+            written = [remote for remote, changed in p if changed]
+        return sorted(written, key=lambda rem: rem.name)
 
     def only(self, *roles):
         """
@@ -100,16 +195,26 @@ class Cluster(object):
 
 	    web = mycluster.only(lambda role: role.startswith('web-'))
         """
-        c = self.__class__()
-        want = frozenset(r for r in roles if not callable(r))
+        index = self._get_index()
+        want = set(r for r in roles if not callable(r))
         matchers = [r for r in roles if callable(r)]
 
-        for remote, has_roles in self.remotes.iteritems():
-            # strings given as roles must all match
-            if frozenset(has_roles) & want != want:
-                # not a match
-                continue
+        if want:
+            # start from the least common role, then keep the remotes which
+            # have all of the others
+            by_role = index['by_role']
+            candidates = min((by_role.get(role, []) for role in want),
+                             key=len)
+            candidates = [
+                remote for remote in candidates
+                if want.issubset(self.remotes[remote])
+            ]
+        else:
+            candidates = self.remotes.keys()
 
+        c = self.__class__()
+        for remote in candidates:
+            has_roles = self.remotes[remote]
             # every matcher given must match at least one role
             if not all(
                 any(matcher(role) for role in has_roles)
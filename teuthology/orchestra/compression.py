@@ -0,0 +1,167 @@
+"""
+Stream compression for tarballs pulled from test nodes
+
+The node pipes tar's output through the codec's compressor; locally the
+stream is fed to the codec's decompressor in a separate process, so that
+decompression overlaps with writing the extracted files.
+"""
+import collections
+import logging
+import shutil
+import subprocess
+
+import gevent
+
+from distutils.spawn import find_executable
+from gevent.fileobject import FileObject
+
+from . import run
+
+log = logging.getLogger(__name__)
+
+Codec = collections.namedtuple(
+    'Codec', ['name', 'compress', 'decompress', 'suffix'])
+
+CODECS = collections.OrderedDict((codec.name, codec) for codec in [
+    Codec('zstd', ['zstd', '-q', '-c', '-T0'], ['zstd', '-q', '-d', '-c'],
+          '.tar.zst'),
+    Codec('pigz', ['pigz', '-c'], ['gzip', '-d', '-c'], '.tar.gz'),
+    Codec('lz4', ['lz4', '-q', '-c'], ['lz4', '-q', '-d', '-c'], '.tar.lz4'),
+    Codec('gzip', ['gzip', '-c'], ['gzip', '-d', '-c'], '.tar.gz'),
+    Codec('none', None, None, '.tar'),
+])
+
+# CODECS is in order of preference when choosing automatically
+AUTO = 'auto'
+
+_local_codecs = None
+
+
+def local_codecs():
+    """
+    Return the names of the codecs whose decompressor is installed locally
+    """
+    global _local_codecs
+    if _local_codecs is None:
+        _local_codecs = [
+            codec.name for codec in CODECS.values()
+            if codec.decompress is None or find_executable(codec.decompress[0])
+        ]
+    return _local_codecs
+
+
+def choose_codec(remote, name=None):
+    """
+    Pick the codec to pull from remote with
+
+    :param remote: The Remote the stream comes from
+    :param name:   A codec name, or 'auto' (the default) for the preferred
+                   codec that both remote and the local host support. A codec
+                   that either side lacks is replaced with the automatic
+                   choice.
+    :returns:      A Codec
+    """
+    name = name or AUTO
+    if name != AUTO and name not in CODECS:
+        raise ValueError("Unknown codec '{0}'; choose one of: {1}".format(
+            name, ', '.join([AUTO] + CODECS.keys())))
+    usable = [codec for codec in local_codecs()
+              if codec in remote.compressors]
+    if name in usable:
+        return CODECS[name]
+    if name != AUTO:
+        log.warning("Codec %s is not available for %s; choosing another",
+                    name, remote.shortname)
+    return CODECS[usable[0]]
+
+
+def compress_args(codec):
+    """
+    Return the arguments to append to a tar command writing to stdout so that
+    its output is compressed with codec
+    """
+    if codec.compress is None:
+        return []
+    return [run.Raw('|')] + codec.compress
+
+
+class CountingReader(object):
+    """
+    Wraps a file-like object, counting the bytes read from it
+    """
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+class DecompressingReader(object):
+    """
+    A file-like object returning the decompressed contents of fileobj, which
+    holds data compressed with codec. Use it as a context manager so that the
+    decompressor is cleaned up.
+
+    compressed_bytes and bytes_read count the data read from fileobj and
+    returned by read(), respectively.
+    """
+    def __init__(self, fileobj, codec):
+        self.codec = codec
+        self._source = CountingReader(fileobj)
+        self._proc = None
+        self._stdin = self._stdout = None
+        self._feeder = None
+        if codec.decompress is None:
+            self._output = CountingReader(self._source)
+            return
+        # not gevent.subprocess, whose child watcher would reap the children
+        # of other subprocess users; see LocalProcess.execute()
+        self._proc = subprocess.Popen(
+            codec.decompress,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._stdin = FileObject(self._proc.stdin, 'wb', 0)
+        self._stdout = FileObject(self._proc.stdout, 'rb', 0)
+        self._output = CountingReader(self._stdout)
+        self._feeder = gevent.spawn(self._feed)
+
+    def _feed(self):
+        try:
+            shutil.copyfileobj(self._source, self._stdin)
+        except (IOError, OSError):
+            # the decompressor exited early; read() sees the short stream
+            log.debug("%s decompressor stopped reading", self.codec.name)
+        finally:
+            self._stdin.close()
+
+    @property
+    def compressed_bytes(self):
+        return self._source.bytes_read
+
+    @property
+    def bytes_read(self):
+        return self._output.bytes_read
+
+    def read(self, size=-1):
+        return self._output.read(size)
+
+    def close(self):
+        if self._proc is None:
+            return
+        if self._feeder is not None:
+            self._feeder.kill()
+        self._stdout.close()
+        if self._proc.poll() is None:
+            self._proc.kill()
+        self._proc.wait()
+        self._proc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type_, value, traceback):
+        self.close()
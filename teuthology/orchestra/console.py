@@ -1,13 +1,19 @@
+import collections
 import logging
 import os
 import pexpect
 import psutil
+import socket
 import subprocess
 import sys
 import time
 
+import gevent
+import gevent.lock
+
 from teuthology import lockstatus as ls
 from teuthology.config import config
+from teuthology.parallel import parallel
 
 from ..exceptions import ConsoleError
 
@@ -20,6 +26,21 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# ConsoleManager tries each operation in RETRIED_OPERATIONS this many times,
+# sleeping CONSOLE_BACKOFF seconds after the first failure, then twice as
+# long after each of the following ones
+CONSOLE_TRIES = 3
+CONSOLE_BACKOFF = 5
+# The operations which leave a node in the same state however many times
+# they run, and so may be tried again; e.g. trying power_cycle again after
+# it failed half way through would cycle the node once more
+RETRIED_OPERATIONS = frozenset(
+    ['check_power', 'check_status', 'power_on', 'power_off'])
+
+ConsoleResult = collections.namedtuple(
+    'ConsoleResult',
+    ['hostname', 'operation', 'ok', 'value', 'error', 'attempts', 'latency'])
+
 
 class PhysicalConsole():
     """
@@ -93,9 +114,10 @@ class PhysicalConsole():
 
     def _ipmi_command(self, subcommand):
         self._check_ipmi_credentials()
-        template = \
-            'ipmitool -H {s}.{dn} -I lanplus -U {ipmiuser} -P {ipmipass} {cmd}'
+        template = ('{ipmitool} -H {s}.{dn} -I lanplus -U {ipmiuser} '
+                    '-P {ipmipass} {cmd}')
         return template.format(
+            ipmitool=config.ipmitool,
             cmd=subcommand,
             s=self.shortname,
             dn=self.ipmidomain,
@@ -380,3 +402,156 @@ class VirtualConsole():
         self.vm_domain.info().create()
         log.info('Power off for {i} seconds completed'.format(
             s=self.shortname, i=interval))
+
+
+class ConsoleManager(object):
+    """
+    Run console operations, e.g. power cycles, on many hosts at once
+
+    At most ipmi_concurrency operations run at once, and at most
+    ipmi_subnet_concurrency of them against the BMCs of the same /24 subnet,
+    so that a rack's worth of nodes neither overloads its BMCs nor waits
+    for them one at a time. An operation named in retried (by default
+    RETRIED_OPERATIONS) which raises is tried again, up to CONSOLE_TRIES
+    times, with exponential backoff; the slots it holds are released while
+    it waits. Any other operation, e.g. power_cycle, is tried once.
+
+    The outcome of each operation is kept in results as a ConsoleResult;
+    report() sums them up.
+    """
+    def __init__(self, concurrency=None, subnet_concurrency=None,
+                 tries=CONSOLE_TRIES, backoff=CONSOLE_BACKOFF,
+                 retried=RETRIED_OPERATIONS):
+        self.semaphore = gevent.lock.BoundedSemaphore(
+            concurrency or config.ipmi_concurrency)
+        self.subnet_concurrency = (subnet_concurrency or
+                                   config.ipmi_subnet_concurrency)
+        self.subnet_semaphores = dict()
+        self.tries = tries
+        self.backoff = backoff
+        self.retried = frozenset(retried)
+        self.results = list()
+
+    @staticmethod
+    def get_console(hostname):
+        return remote.getRemoteConsole(hostname)
+
+    @staticmethod
+    def bmc_subnet(console):
+        """
+        :returns: The /24 subnet of the BMC of console, or its IPMI domain
+                  if its address cannot be resolved
+        """
+        domain = getattr(console, 'ipmidomain', None)
+        try:
+            address = socket.gethostbyname(
+                '{0}.{1}'.format(console.shortname, domain))
+        except (socket.error, UnicodeError):
+            return domain
+        return address.rsplit('.', 1)[0]
+
+    def _subnet_semaphore(self, subnet):
+        semaphore = self.subnet_semaphores.get(subnet)
+        if semaphore is None:
+            semaphore = self.subnet_semaphores[subnet] = \
+                gevent.lock.BoundedSemaphore(self.subnet_concurrency)
+        return semaphore
+
+    def run_one(self, hostname, operation, *args, **kwargs):
+        """
+        Call operation on the console of hostname
+
+        :param operation: The name of a console method, e.g. 'power_cycle',
+                          or a function called with the console as its
+                          first argument. It is only tried again if its
+                          name is in retried.
+        :returns:         A ConsoleResult
+        """
+        if callable(operation):
+            name = operation.__name__
+        else:
+            name = operation
+        start = time.time()
+        value = error = None
+        ok = False
+        attempts = 0
+        try:
+            console = self.get_console(hostname)
+            subnet_semaphore = self._subnet_semaphore(
+                self.bmc_subnet(console))
+        except Exception as e:
+            log.exception("Cannot get the console of %s", hostname)
+            error = e
+        else:
+            if callable(operation):
+                func = lambda: operation(console, *args, **kwargs)
+            else:
+                func = lambda: getattr(console, operation)(*args, **kwargs)
+            tries = self.tries if name in self.retried else 1
+            delay = self.backoff
+            while attempts < tries:
+                attempts += 1
+                with self.semaphore, subnet_semaphore:
+                    try:
+                        value = func()
+                        ok = True
+                    except Exception as e:
+                        error = e
+                if ok:
+                    error = None
+                    break
+                log.warning("%s of %s failed (attempt %d of %d): %s",
+                            name, hostname, attempts, tries, error)
+                if attempts < tries:
+                    gevent.sleep(delay)
+                    delay *= 2
+        result = ConsoleResult(hostname, name, ok, value, error, attempts,
+                               time.time() - start)
+        self.results.append(result)
+        return result
+
+    def run(self, hostnames, operation, *args, **kwargs):
+        """
+        Call run_one() for each of hostnames concurrently, and log a report
+
+        :returns: A list of ConsoleResults, in the order of hostnames
+        """
+        hostnames = list(hostnames)
+        with parallel() as p:
+            for hostname in hostnames:
+                p.spawn(self.run_one, hostname, operation, *args, **kwargs)
+            by_hostname = dict((result.hostname, result) for result in p)
+        results = [by_hostname[hostname] for hostname in hostnames]
+        self.report(results)
+        return results
+
+    def report(self, results=None):
+        """
+        Log and return a summary of results, by default all of them
+
+        :returns: A dict with the number of operations which succeeded and
+                  failed, the hosts which failed, and the minimum, mean and
+                  maximum latency in seconds
+        """
+        if results is None:
+            results = self.results
+        latencies = [result.latency for result in results]
+        summary = dict(
+            total=len(results),
+            succeeded=len([r for r in results if r.ok]),
+            failed=len([r for r in results if not r.ok]),
+            failed_hosts=sorted(r.hostname for r in results if not r.ok),
+            latency_min=min(latencies) if latencies else 0,
+            latency_mean=(sum(latencies) / len(latencies)
+                          if latencies else 0),
+            latency_max=max(latencies) if latencies else 0,
+        )
+        if results:
+            log.info(
+                "Console operations: {succeeded}/{total} succeeded, latency "
+                "min {latency_min:.1f}s mean {latency_mean:.1f}s "
+                "max {latency_max:.1f}s".format(**summary))
+        if summary['failed_hosts']:
+            log.warning("Console operations failed on: %s",
+                        ', '.join(summary['failed_hosts']))
+        return summary
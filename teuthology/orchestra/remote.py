@@ -2,16 +2,23 @@
 Support for paramiko remote objects.
 """
 from . import run
+from .compression import CODECS, compress_args
 from .opsys import OS
 import connection
 from teuthology import misc
+from teuthology.config import config
+import contextlib
 import time
 import re
 import logging
+import paramiko
 from cStringIO import StringIO
 from teuthology import lockstatus as ls
 import os
 import pwd
+import shutil
+import socket
+import sys
 import tempfile
 import netaddr
 
@@ -49,8 +56,11 @@ class Remote(object):
         self.keep_alive = keep_alive
         self._console = console
         self.ssh = ssh
+        # idle SFTP sessions; see _sftp_session()
+        self._sftp_sessions = []
 
     def connect(self, timeout=None):
+        self.close_sftp()
         args = dict(user_at_host=self.name, host_key=self._host_key,
                     keep_alive=self.keep_alive)
         if timeout:
@@ -64,6 +74,7 @@ class Remote(object):
         Attempts to re-establish connection. Returns True for success; False
         for failure.
         """
+        self.close_sftp()
         if self.ssh is not None:
             self.ssh.close()
         if not timeout:
@@ -248,33 +259,159 @@ class Remote(object):
         self.run(args="sudo chcon {con} {path}".format(
             con=context, path=file_path))
 
+    def _open_sftp(self):
+        """
+        Open a new SFTP session. The 'sftp_window_size' and
+        'sftp_max_packet_size' config options, if set, override paramiko's
+        defaults.
+        """
+        return paramiko.SFTPClient.from_transport(
+            self.ssh.get_transport(),
+            window_size=config.sftp_window_size,
+            max_packet_size=config.sftp_max_packet_size,
+        )
+
+    @contextlib.contextmanager
+    def _sftp_session(self):
+        """
+        Check an SFTP session out of this remote's pool, opening a new one if
+        none is idle. It goes back to the pool afterwards unless the session
+        itself failed, in which case it is closed.
+        """
+        if self._sftp_sessions:
+            sftp = self._sftp_sessions.pop()
+        else:
+            sftp = self._open_sftp()
+        try:
+            yield sftp
+        except (socket.error, paramiko.SSHException, EOFError):
+            # the channel failed; socket.error is an IOError, so this comes
+            # first
+            sftp.close()
+            raise
+        except (IOError, OSError):
+            # e.g. a missing remote file; the session is still usable
+            self._sftp_sessions.append(sftp)
+            raise
+        except Exception:
+            sftp.close()
+            raise
+        self._sftp_sessions.append(sftp)
+
+    def close_sftp(self):
+        """
+        Close every idle SFTP session. Called whenever the SSH connection is
+        replaced.
+        """
+        while self._sftp_sessions:
+            sftp = self._sftp_sessions.pop()
+            try:
+                sftp.close()
+            except Exception:
+                log.debug("Failed to close SFTP session to %s", self.name)
+
+    def _log_transfer(self, verb, path, size, elapsed):
+        rate = size / elapsed / 1024.0 ** 2 if elapsed else 0.0
+        log.debug("{verb} {host}:{path} ({size}) in {elapsed:.2f}s "
+                  "({rate:.1f} MB/s)".format(
+                      verb=verb, host=self.shortname, path=path,
+                      size=self._format_size(size).strip(),
+                      elapsed=elapsed, rate=rate))
+
+    def _sftp_put(self, sftp, local_path, remote_path):
+        """
+        Write a local file to the remote using pipelined writes
+        """
+        start = time.time()
+        size = os.path.getsize(local_path)
+        buffer_size = config.sftp_buffer_size
+        with open(local_path, 'rb') as local_file:
+            with sftp.open(remote_path, 'wb') as remote_file:
+                # don't wait for each write to be acknowledged; errors are
+                # reported when the file is closed
+                remote_file.set_pipelined(True)
+                while True:
+                    data = local_file.read(buffer_size)
+                    if not data:
+                        break
+                    remote_file.write(data)
+        self._log_transfer('Put', remote_path, size, time.time() - start)
+
+    def _sftp_get(self, sftp, remote_path, local_path):
+        """
+        Read a remote file into a local one. Files of at least
+        'sftp_buffer_size' bytes are prefetched, so that many read requests
+        are in flight at once.
+        """
+        start = time.time()
+        size = sftp.stat(remote_path).st_size
+        log.debug("{}:{} is {}".format(self.shortname, remote_path,
+                                       self._format_size(size).strip()))
+        buffer_size = config.sftp_buffer_size
+        with sftp.open(remote_path, 'rb') as remote_file:
+            if size >= buffer_size:
+                remote_file.prefetch(size)
+            with open(local_path, 'wb') as local_file:
+                while True:
+                    data = remote_file.read(buffer_size)
+                    if not data:
+                        break
+                    local_file.write(data)
+        self._log_transfer('Got', remote_path, size, time.time() - start)
+
     def _sftp_put_file(self, local_path, remote_path):
         """
-        Use the paramiko.SFTPClient to put a file. Returns the remote filename.
+        Use the paramiko.SFTPClient to put a file.
         """
-        sftp = self.ssh.open_sftp()
-        sftp.put(local_path, remote_path)
-        return
+        self._sftp_put_files([(local_path, remote_path)])
+
+    def _sftp_put_files(self, paths):
+        """
+        Put several files using a single SFTP session
+
+        :param paths: A list of (local_path, remote_path) tuples
+        """
+        with self._sftp_session() as sftp:
+            for local_path, remote_path in paths:
+                self._sftp_put(sftp, local_path, remote_path)
 
     def _sftp_get_file(self, remote_path, local_path):
         """
         Use the paramiko.SFTPClient to get a file. Returns the local filename.
         """
-        file_size = self._format_size(
-            self._sftp_get_size(remote_path)
-        ).strip()
-        log.debug("{}:{} is {}".format(self.shortname, remote_path, file_size))
-        sftp = self.ssh.open_sftp()
-        sftp.get(remote_path, local_path)
+        self._sftp_get_files([(remote_path, local_path)])
         return local_path
 
+    def _sftp_get_files(self, paths):
+        """
+        Get several files using a single SFTP session
+
+        :param paths: A list of (remote_path, local_path) tuples
+        """
+        with self._sftp_session() as sftp:
+            for remote_path, local_path in paths:
+                self._sftp_get(sftp, remote_path, local_path)
+
     def _sftp_open_file(self, remote_path):
         """
         Use the paramiko.SFTPClient to open a file. Returns a
-        paramiko.SFTPFile object.
+        paramiko.SFTPFile object; its session returns to the pool once it is
+        closed.
         """
-        sftp = self.ssh.open_sftp()
-        return sftp.open(remote_path)
+        sessions = self._sftp_session()
+        sftp = sessions.__enter__()
+        try:
+            f = sftp.open(remote_path)
+        except Exception:
+            sessions.__exit__(*sys.exc_info())
+            raise
+        _close = f.close
+
+        def close():
+            _close()
+            sessions.__exit__(None, None, None)
+        f.close = close
+        return f
 
     def _sftp_get_size(self, remote_path):
         """
@@ -347,46 +484,77 @@ class Remote(object):
             self.remove(path)
         return local_path
 
-    def get_tar(self, path, to_path, sudo=False):
+    def get_tar(self, path, to_path, sudo=False, codec=None):
         """
         Tar a remote directory and copy it locally
+
+        :param codec: The compression.Codec to compress with; gzip by default
         """
         remote_temp_path = self.mktemp()
         args = []
         if sudo:
             args.append('sudo')
+        if codec is None:
+            args.extend(['tar', 'cz', '-f', remote_temp_path])
+        else:
+            args.extend(['tar', 'c', '-f', '-'])
         args.extend([
-            'tar',
-            'cz',
-            '-f', remote_temp_path,
             '-C', path,
             '--',
             '.',
             ])
+        if codec is not None:
+            args.extend(compress_args(codec))
+            args.extend([run.Raw('>'), remote_temp_path])
         self.run(args=args)
         if sudo:
             self.chmod(remote_temp_path, '0666')
         self._sftp_get_file(remote_temp_path, to_path)
         self.remove(remote_temp_path)
 
-    def get_tar_stream(self, path, sudo=False):
+    def get_tar_stream(self, path, sudo=False, codec=None):
         """
         Tar-compress a remote directory and return the RemoteProcess
         for streaming
+
+        :param codec: The compression.Codec to compress with; gzip by default
         """
         args = []
         if sudo:
             args.append('sudo')
         args.extend([
             'tar',
-            'cz',
+            'cz' if codec is None else 'c',
             '-f', '-',
             '-C', path,
             '--',
             '.',
             ])
+        if codec is not None:
+            args.extend(compress_args(codec))
         return self.run(args=args, wait=False, stdout=run.PIPE)
 
+    @property
+    def compressors(self):
+        """
+        The names of the codecs in compression.CODECS which this remote can
+        compress with
+        """
+        if not hasattr(self, '_compressors'):
+            programs = [codec.compress[0] for codec in CODECS.values()
+                        if codec.compress is not None]
+            proc = self.run(
+                args='for p in {0}; do command -v $p; done; true'.format(
+                    ' '.join(programs)),
+                stdout=StringIO(), stderr=StringIO(), check_status=False)
+            found = set(os.path.basename(line.strip())
+                        for line in proc.stdout.getvalue().splitlines())
+            self._compressors = [
+                codec.name for codec in CODECS.values()
+                if codec.compress is None or codec.compress[0] in found
+            ]
+        return self._compressors
+
     @property
     def os(self):
         if not hasattr(self, '_os'):
@@ -445,10 +613,109 @@ class Remote(object):
         return self._console
 
     def __del__(self):
+        self.close_sftp()
         if self.ssh is not None:
             self.ssh.close()
 
 
+class LocalRemote(Remote):
+    """
+    A Remote which runs commands and transfers files on the local host, using
+    subprocess pipes and the local filesystem instead of SSH and SFTP.
+
+    Each LocalRemote has its own root directory; commands run with it as their
+    working directory and relative paths given to file transfer methods are
+    resolved against it. A job that uses a relative 'test_path' therefore
+    gets a separate test directory per fake node, which lets a multi-node job
+    run on one machine without SSH.
+    """
+    _runner = staticmethod(run.run_local)
+
+    def __init__(self, name, root=None, shortname=None, **kwargs):
+        super(LocalRemote, self).__init__(name, shortname=shortname)
+        self._hostname = name.split('@')[-1]
+        self.root = root or os.getcwd()
+        if not os.path.isdir(self.root):
+            os.makedirs(self.root)
+
+    def connect(self, timeout=None):
+        return None
+
+    def reconnect(self, timeout=None):
+        return True
+
+    @property
+    def is_online(self):
+        return True
+
+    @property
+    def ip_address(self):
+        return '127.0.0.1'
+
+    @property
+    def machine_type(self):
+        return 'local'
+
+    @property
+    def host_key(self):
+        return None
+
+    @property
+    def console(self):
+        return None
+
+    def run(self, **kwargs):
+        """
+        This calls `orchestra.run.run_local` in our root directory.
+        """
+        r = self._runner(name=self.shortname, cwd=self.root, **kwargs)
+        r.remote = self
+        return r
+
+    def _local_path(self, path):
+        return os.path.join(self.root, path)
+
+    def _sftp_put_file(self, local_path, remote_path):
+        """
+        Copy a local file into place
+        """
+        shutil.copyfile(local_path, self._local_path(remote_path))
+
+    def _sftp_put_files(self, paths):
+        """
+        Copy several local files into place
+
+        :param paths: A list of (local_path, remote_path) tuples
+        """
+        for local_path, remote_path in paths:
+            self._sftp_put_file(local_path, remote_path)
+
+    def _sftp_get_file(self, remote_path, local_path):
+        """
+        Copy a file out of our root directory. Returns the local filename.
+        """
+        shutil.copyfile(self._local_path(remote_path), local_path)
+        return local_path
+
+    def _sftp_get_files(self, paths):
+        """
+        Copy several files out of our root directory
+
+        :param paths: A list of (remote_path, local_path) tuples
+        """
+        for remote_path, local_path in paths:
+            self._sftp_get_file(remote_path, local_path)
+
+    def _sftp_open_file(self, remote_path):
+        """
+        Open a file for reading. Returns a file object.
+        """
+        return open(self._local_path(remote_path), 'rb')
+
+    def _sftp_get_size(self, remote_path):
+        return os.path.getsize(self._local_path(remote_path))
+
+
 def getShortName(name):
     """
     Extract the name portion from remote name strings.
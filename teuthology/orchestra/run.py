@@ -10,10 +10,15 @@ import socket
 import pipes
 import logging
 import shutil
+import subprocess
+import time
+
+from gevent.fileobject import FileObject
 
 from ..contextutil import safe_while
 from ..exceptions import (CommandCrashedError, CommandFailedError,
                           ConnectionLostError)
+from .trace import tracer
 
 log = logging.getLogger(__name__)
 
@@ -27,8 +32,10 @@ class RemoteProcess(object):
         'stdin', 'stdout', 'stderr',
         '_stdin_buf', '_stdout_buf', '_stderr_buf',
         'returncode', 'exitstatus', 'timeout',
-        'greenlets',
+        'greenlets', '_stream_greenlets',
         '_wait', 'logger',
+        # telemetry; see orchestra.trace
+        'start_time', 'end_time', 'stdout_bytes', 'stderr_bytes',
         # for orchestra.remote.Remote to place a backreference
         'remote',
         'label',
@@ -72,6 +79,9 @@ class RemoteProcess(object):
             (self.hostname, port) = client.get_transport().getpeername()
 
         self.greenlets = []
+        self._stream_greenlets = {}
+        self.start_time = self.end_time = None
+        self.stdout_bytes = self.stderr_bytes = None
         self.stdin, self.stdout, self.stderr = (None, None, None)
         self.returncode = self.exitstatus = None
         self._wait = wait
@@ -87,6 +97,7 @@ class RemoteProcess(object):
         log.getChild(self.hostname).info(u"{prefix} {cmd!r}".format(
             cmd=self.command, prefix=prefix))
 
+        self.start_time = time.time()
         if hasattr(self, 'timeout'):
             (self._stdin_buf, self._stdout_buf, self._stderr_buf) = \
                 self.client.exec_command(self.command, timeout=self.timeout)
@@ -114,14 +125,14 @@ class RemoteProcess(object):
             # Log the stream
             host_log = self.logger.getChild(self.hostname)
             stream_log = host_log.getChild(stream_name)
-            self.add_greenlet(
-                gevent.spawn(
-                    copy_file_to,
-                    getattr(self, stream_name),
-                    stream_log,
-                    stream_obj,
-                )
+            greenlet = gevent.spawn(
+                copy_file_to,
+                getattr(self, stream_name),
+                stream_log,
+                stream_obj,
             )
+            self.add_greenlet(greenlet)
+            self._stream_greenlets[stream_name] = greenlet
             setattr(self, stream_name, stream_obj)
         elif self._wait:
             # FIXME: Is this actually true?
@@ -138,22 +149,26 @@ class RemoteProcess(object):
 
         status = self._get_exitstatus()
         self.exitstatus = self.returncode = status
+        if self.end_time is None:
+            self.end_time = time.time()
+            for stream_name, greenlet in self._stream_greenlets.items():
+                setattr(self, stream_name + '_bytes', greenlet.value)
+            tracer.record(self)
         for stream in ('stdout', 'stderr'):
             if hasattr(self, stream):
                 stream_obj = getattr(self, stream)
                 # Despite ChannelFile having a seek() method, it raises
                 # "IOError: File does not support seeking."
                 if hasattr(stream_obj, 'seek') and \
-                        not isinstance(stream_obj, ChannelFile):
+                        not isinstance(stream_obj, ChannelFile) and \
+                        stream_obj is not getattr(self, '_%s_buf' % stream):
                     stream_obj.seek(0)
 
         if self.check_status:
             if status is None:
                 # command either died due to a signal, or the connection
                 # was lost
-                transport = self.client.get_transport()
-                if transport is None or not transport.is_active():
-                    # look like we lost the connection
+                if self._connection_lost():
                     raise ConnectionLostError(command=self.command,
                                               node=self.hostname)
 
@@ -166,6 +181,10 @@ class RemoteProcess(object):
                                          label=self.label)
         return status
 
+    def _connection_lost(self):
+        transport = self.client.get_transport()
+        return transport is None or not transport.is_active()
+
     def _get_exitstatus(self):
         """
         :returns: the remote command's exit status (return code). Note that
@@ -199,6 +218,93 @@ class RemoteProcess(object):
             )
 
 
+class LocalProcess(RemoteProcess):
+    """
+    A RemoteProcess lookalike that runs its command on the local host using
+    subprocess pipes instead of an SSH channel
+    """
+    __slots__ = ['cwd', '_proc']
+
+    def __init__(self, args, check_status=True, hostname=None, label=None,
+                 timeout=None, wait=True, logger=None, cwd=None):
+        """
+        See RemoteProcess; ``client`` is not used.
+
+        :param cwd: The directory to run the command in (optional)
+        """
+        super(LocalProcess, self).__init__(
+            None, args, check_status=check_status,
+            hostname=hostname or 'localhost', label=label, timeout=timeout,
+            wait=wait, logger=logger)
+        self.cwd = cwd
+
+    def execute(self):
+        """
+        Execute local command
+        """
+        prefix = "Running:"
+        if self.label:
+            prefix = "Running ({label}):".format(label=self.label)
+        log.getChild(self.hostname).info(u"{prefix} {cmd!r}".format(
+            cmd=self.command, prefix=prefix))
+
+        self.start_time = time.time()
+        # sshd runs commands through the user's shell; bash is the closest
+        # local equivalent. subprocess is deliberately not gevent's (see
+        # teuthology/__init__.py): its child watcher would reap the children
+        # of other, unpatched subprocess users. The pipes are wrapped so that
+        # reading and writing them only blocks the calling greenlet.
+        self._proc = subprocess.Popen(
+            self.command,
+            shell=True,
+            executable='/bin/bash',
+            cwd=self.cwd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        (self._stdin_buf, self._stdout_buf, self._stderr_buf) = [
+            FileObject(f, f.mode, 0)
+            for f in (self._proc.stdin, self._proc.stdout, self._proc.stderr)
+        ]
+        (self.stdin, self.stdout, self.stderr) = \
+            (self._stdin_buf, self._stdout_buf, self._stderr_buf)
+
+    def setup_stdin(self, stream_obj):
+        if stream_obj is not PIPE:
+            greenlet = gevent.spawn(copy_and_close, stream_obj, self.stdin)
+            self.add_greenlet(greenlet)
+            self.stdin = None
+        elif self._wait:
+            raise RuntimeError(self.deadlock_warning % 'stdin')
+
+    def _connection_lost(self):
+        return False
+
+    def _get_exitstatus(self):
+        """
+        :returns: the local command's exit status, or None if it was killed by
+                  a signal
+        """
+        status = gevent.get_hub().threadpool.apply(self._proc.wait)
+        if status < 0:
+            status = None
+        return status
+
+    @property
+    def finished(self):
+        return self._proc.poll() is not None
+
+    def __repr__(self):
+        return '{classname}(args={args!r}, check_status={check}, hostname={name!r}, cwd={cwd!r})'.format(  # noqa
+            classname=self.__class__.__name__,
+            args=self.args,
+            check=self.check_status,
+            name=self.hostname,
+            cwd=self.cwd,
+            )
+
+
 class Raw(object):
 
     """
@@ -237,11 +343,18 @@ def quote(args):
 
 
 def copy_to_log(f, logger, loglevel=logging.INFO):
+    """
+    Log each line read from f
+
+    :returns: The number of bytes read
+    """
     # Work-around for http://tracker.ceph.com/issues/8313
     if isinstance(f, ChannelFile):
         f._flags += ChannelFile.FLAG_BINARY
 
+    nbytes = 0
     for line in f:
+        nbytes += len(line)
         line = line.rstrip()
         # Second part of work-around for http://tracker.ceph.com/issues/8313
         try:
@@ -249,6 +362,7 @@ def copy_to_log(f, logger, loglevel=logging.INFO):
             logger.log(loglevel, line.decode('utf-8'))
         except (UnicodeDecodeError, UnicodeEncodeError):
             logger.exception("Encountered unprintable line in command output")
+    return nbytes
 
 
 def copy_and_close(src, fdst):
@@ -269,12 +383,13 @@ def copy_file_to(src, logger, stream=None):
     :param logger: the logger object
     :param stream: an optional file-like object which will receive a copy of
                    src.
+    :returns: The number of bytes copied
     """
     if stream is not None:
         shutil.copyfileobj(src, stream)
         stream.seek(0)
         src = stream
-    copy_to_log(src, logger)
+    return copy_to_log(src, logger)
 
 
 def spawn_asyncresult(fn, *args, **kwargs):
@@ -404,6 +519,35 @@ def run(
     return r
 
 
+def run_local(
+    args,
+    stdin=None, stdout=None, stderr=None,
+    logger=None,
+    check_status=True,
+    wait=True,
+    name=None,
+    label=None,
+    timeout=None,
+    cwd=None,
+):
+    """
+    Run a command on the local host, with the same semantics as run().
+
+    :param cwd: The directory to run the command in
+    See run() for the remaining parameters; ``timeout`` is ignored.
+    """
+    r = LocalProcess(args, check_status=check_status, hostname=name,
+                     label=label, timeout=timeout, wait=wait, logger=logger,
+                     cwd=cwd)
+    r.execute()
+    r.setup_stdin(stdin)
+    r.setup_output_stream(stderr, 'stderr')
+    r.setup_output_stream(stdout, 'stdout')
+    if wait:
+        r.wait()
+    return r
+
+
 def wait(processes, timeout=None):
     """
     Wait for all given processes to exit.
@@ -1,8 +1,13 @@
 import fudge
+import os
 import pytest
+import shutil
+import tempfile
 
+from cStringIO import StringIO
 from mock import patch, Mock
 
+from teuthology.exceptions import CommandFailedError
 from .. import cluster, remote
 
 
@@ -209,6 +214,45 @@ class TestCluster(object):
         assert c_foo.remotes == {r2: ['bar'], r3: ['foo']}
 
 
+class TestRoleIndex(object):
+    def setup(self):
+        self.r1 = remote.Remote('r1', ssh=Mock())
+        self.r2 = remote.Remote('r2', ssh=Mock())
+        self.c = cluster.Cluster(
+            remotes=[
+                (self.r1, ['mon.a', 'osd.0', 'client.0']),
+                (self.r2, ['mon.b', 'osd.1', 'backup.osd.0', 'plain']),
+            ],
+        )
+
+    def test_find_roles(self):
+        assert sorted(self.c.find_roles('osd', 'ceph')) == ['osd.0', 'osd.1']
+        assert sorted(self.c.find_roles('osd')) == \
+            ['backup.osd.0', 'osd.0', 'osd.1']
+        assert self.c.find_roles('osd', 'backup') == ['backup.osd.0']
+        assert self.c.find_roles('mds') == []
+
+    def test_only_uses_index(self):
+        assert self.c.only('osd.1').remotes.keys() == [self.r2]
+        assert self.c.only('mon.a', 'osd.0').remotes.keys() == [self.r1]
+        assert self.c.only('mon.a', 'osd.1').remotes == {}
+        assert self.c.only('nonexistent').remotes == {}
+        assert self.c.only('plain').remotes.keys() == [self.r2]
+
+    def test_invalidated_on_add(self):
+        assert self.c.find_roles('mds') == []
+        r3 = remote.Remote('r3', ssh=Mock())
+        self.c.add(r3, ['mds.a'])
+        assert self.c.find_roles('mds') == ['mds.a']
+        assert self.c.only('mds.a').remotes.keys() == [r3]
+
+    def test_invalidated_on_replace(self):
+        assert self.c.find_roles('mds') == []
+        self.c.remotes = {self.r1: ['mds.a']}
+        assert self.c.find_roles('mds') == ['mds.a']
+        assert self.c.only('osd.0').remotes == {}
+
+
 class TestWriteFile(object):
     """ Tests for cluster.write_file """
     def setup(self):
@@ -238,3 +282,49 @@ class TestWriteFile(object):
     def test_with_sudo(self, m_sudo_write_file):
         self.c.write_file("filename", "content", sudo=True)
         m_sudo_write_file.assert_called_with(self.r1, "filename", "content", owner=None, perms=None)
+
+
+class TestDistributeFile(object):
+    """ Tests for cluster.distribute_file """
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.remotes = [
+            remote.LocalRemote(
+                'node%d' % i, root=os.path.join(self.root, 'node%d' % i))
+            for i in range(3)
+        ]
+        self.c = cluster.Cluster(
+            remotes=[(rem, ['osd.%d' % i])
+                     for i, rem in enumerate(self.remotes)],
+        )
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def read(self, rem, name):
+        with open(os.path.join(rem.root, name)) as f:
+            return f.read()
+
+    def test_writes_all(self):
+        written = self.c.distribute_file('keyring', StringIO('secret\n'))
+        assert written == self.remotes
+        for rem in self.remotes:
+            assert self.read(rem, 'keyring') == 'secret\n'
+
+    def test_skips_unchanged(self):
+        with open(os.path.join(self.remotes[1].root, 'keyring'), 'w') as f:
+            f.write('secret\n')
+        written = self.c.distribute_file('keyring', 'secret\n',
+                                         max_concurrent=1)
+        assert written == [self.remotes[0], self.remotes[2]]
+        assert self.c.distribute_file('keyring', 'secret\n') == []
+        assert self.c.distribute_file('keyring', 'new') == self.remotes
+        assert self.read(self.remotes[1], 'keyring') == 'new'
+
+    def test_write_failure(self):
+        with pytest.raises(CommandFailedError):
+            self.c.distribute_file('missing/keyring', 'secret')
+
+    def test_fails_with_invalid_perms(self):
+        with pytest.raises(ValueError):
+            self.c.distribute_file("filename", "content", perms="0644")
@@ -0,0 +1,115 @@
+import gzip
+import os
+import shutil
+import tarfile
+import tempfile
+
+from cStringIO import StringIO
+from mock import patch, Mock
+from pytest import raises
+
+from teuthology import misc
+from .. import compression, remote, run
+
+
+class TestChooseCodec(object):
+    def setup(self):
+        self.remote = Mock()
+        self.remote.shortname = 'node1'
+        self.remote.compressors = ['pigz', 'gzip', 'none']
+        patcher = patch.object(compression, '_local_codecs',
+                               ['zstd', 'pigz', 'gzip', 'none'])
+        patcher.start()
+        self.patcher = patcher
+
+    def teardown(self):
+        self.patcher.stop()
+
+    def test_auto(self):
+        assert compression.choose_codec(self.remote).name == 'pigz'
+        assert compression.choose_codec(self.remote, 'auto').name == 'pigz'
+
+    def test_explicit(self):
+        assert compression.choose_codec(self.remote, 'none').name == 'none'
+        assert compression.choose_codec(self.remote, 'gzip').name == 'gzip'
+
+    def test_unavailable(self):
+        assert compression.choose_codec(self.remote, 'zstd').name == 'pigz'
+        assert compression.choose_codec(self.remote, 'lz4').name == 'pigz'
+
+    def test_unknown(self):
+        with raises(ValueError):
+            compression.choose_codec(self.remote, 'bzip3')
+
+
+class TestDecompressingReader(object):
+    def test_gzip(self):
+        data = 'teuthology ' * 1000
+        compressed = StringIO()
+        with gzip.GzipFile(fileobj=compressed, mode='wb') as f:
+            f.write(data)
+        compressed.seek(0)
+        codec = compression.CODECS['gzip']
+        with compression.DecompressingReader(compressed, codec) as stream:
+            assert stream.read() == data
+        assert stream.bytes_read == len(data)
+        assert stream.compressed_bytes == len(compressed.getvalue())
+
+    def test_none(self):
+        codec = compression.CODECS['none']
+        with compression.DecompressingReader(StringIO('abc'), codec) as stream:
+            assert stream.read(2) == 'ab'
+            assert stream.read() == 'c'
+        assert stream.bytes_read == stream.compressed_bytes == 3
+
+
+class TestPullDirectory(object):
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.rem = remote.LocalRemote(
+            name='ubuntu@node1.example.com',
+            root=os.path.join(self.root, 'node1'),
+        )
+        self.rem.run(args=['mkdir', '-p', 'dir/sub', run.Raw('&&'),
+                           'echo', 'hello', run.Raw('>'), 'dir/sub/file'])
+        self.src = os.path.join(self.rem.root, 'dir')
+        # pull_directory() always uses sudo, which may not be installed
+        bindir = os.path.join(self.root, 'bin')
+        os.mkdir(bindir)
+        with open(os.path.join(bindir, 'sudo'), 'w') as f:
+            f.write('#!/bin/sh\nexec "$@"\n')
+        os.chmod(os.path.join(bindir, 'sudo'), 0755)
+        self.env = patch.dict(
+            os.environ, PATH=bindir + os.pathsep + os.environ['PATH'])
+        self.env.start()
+
+    def teardown(self):
+        self.env.stop()
+        shutil.rmtree(self.root)
+
+    def test_compressors(self):
+        assert 'gzip' in self.rem.compressors
+        assert 'none' in self.rem.compressors
+
+    def check_pull(self, codec):
+        dest = os.path.join(self.root, codec)
+        misc.pull_directory(self.rem, self.src, dest, codec=codec)
+        with open(os.path.join(dest, 'sub', 'file')) as f:
+            assert f.read() == 'hello\n'
+
+    def test_gzip(self):
+        self.check_pull('gzip')
+
+    def test_none(self):
+        self.check_pull('none')
+
+    def test_tarball(self):
+        dest = os.path.join(self.root, 'dir.tar')
+        misc.pull_directory_tarball(self.rem, self.src, dest, codec='none')
+        assert os.path.getsize(dest) > 0
+
+    def test_tarball_default_gzip(self):
+        dest = os.path.join(self.root, 'dir.tgz')
+        misc.pull_directory_tarball(self.rem, self.src, dest)
+        with tarfile.open(dest, 'r:gz') as tar:
+            assert './sub/file' in tar.getnames()
@@ -1,3 +1,8 @@
+import os
+import shutil
+import stat
+import tempfile
+
 from mock import patch
 
 from teuthology.config import config as teuth_config
@@ -215,3 +220,104 @@ class TestPhysicalConsole(TestConsole):
             teuth_config.use_conserver = False
             cons = self.klass(self.hostname)
             assert cons.has_conserver is False
+
+
+# Answers like ipmitool for every host but dead*, whose BMC does not answer;
+# each call is logged with its start and end times
+FAKE_IPMITOOL = """#!/bin/sh
+host=$2
+shift 8
+start=$(date +%s.%N)
+sleep 0.2
+echo "$host $start $(date +%s.%N) $*" >> {log}
+case $host in
+    dead*) echo "Error: Unable to establish IPMI v2 / RMCP+ session"
+           exit 1 ;;
+esac
+case "$*" in
+    "power status") echo "Chassis Power is on" ;;
+    "power on") echo "Chassis Power Control: Up/On" ;;
+esac
+"""
+
+
+class TestConsoleManager(object):
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.log = os.path.join(self.tmpdir, 'calls')
+        ipmitool = os.path.join(self.tmpdir, 'ipmitool')
+        with open(ipmitool, 'w') as f:
+            f.write(FAKE_IPMITOOL.format(log=self.log))
+        os.chmod(ipmitool, stat.S_IRWXU)
+        self.saved = dict((key, getattr(teuth_config, key)) for key in (
+            'ipmitool', 'ipmi_domain', 'ipmi_user', 'ipmi_password',
+            'use_conserver'))
+        teuth_config.ipmitool = ipmitool
+        teuth_config.ipmi_domain = 'ipmi.invalid'
+        teuth_config.ipmi_user = 'ipmi_user'
+        teuth_config.ipmi_password = 'ipmi_pass'
+        teuth_config.use_conserver = False
+
+    def teardown(self):
+        for key, value in self.saved.items():
+            setattr(teuth_config, key, value)
+        shutil.rmtree(self.tmpdir)
+
+    def calls(self):
+        with open(self.log) as f:
+            return [line.split(' ', 3) for line in f.read().splitlines()]
+
+    def most_concurrent(self):
+        events = list()
+        for _, start, end, _ in self.calls():
+            events.extend([(float(start), 1), (float(end), -1)])
+        running = most = 0
+        for _, change in sorted(events):
+            running += change
+            most = max(most, running)
+        return most
+
+    def test_run(self):
+        manager = console.ConsoleManager(concurrency=4, subnet_concurrency=2)
+        hosts = ['node%d' % i for i in range(6)]
+        results = manager.run(hosts, 'check_power', 'on')
+        assert [r.hostname for r in results] == hosts
+        assert all(r.ok and r.value is True for r in results)
+        # all BMCs are in the same (unresolvable) domain
+        assert self.most_concurrent() == 2
+        assert len(self.calls()) == 6
+        summary = manager.report()
+        assert summary['succeeded'] == 6
+        assert summary['latency_max'] >= 0.2
+
+    def test_retry(self):
+        manager = console.ConsoleManager(tries=3, backoff=0.01,
+                                         retried=['power_cycle'])
+        results = manager.run(['dead1'], 'power_cycle')
+        assert not results[0].ok and results[0].attempts == 3
+        assert results[0].error is not None
+        assert len([c for c in self.calls() if c[0].startswith('dead1')]) \
+            == 3
+        summary = manager.report()
+        assert summary['failed_hosts'] == ['dead1']
+
+    def test_no_retry(self):
+        manager = console.ConsoleManager(tries=3, backoff=0.01)
+        results = manager.run(['dead1'], 'power_cycle')
+        assert not results[0].ok and results[0].attempts == 1
+        assert len([c for c in self.calls() if c[0].startswith('dead1')]) \
+            == 1
+
+    def test_retry_function(self):
+        attempts = list()
+
+        def flaky(cons):
+            attempts.append(cons.shortname)
+            if len(attempts) == 1:
+                raise RuntimeError('BMC busy')
+            return cons.check_power('on')
+        manager = console.ConsoleManager(backoff=0.01, retried=['flaky'])
+        result = manager.run_one('node1', flaky)
+        assert result.ok and result.value is True
+        assert result.attempts == 2
+        assert result.operation == 'flaky'
@@ -1,9 +1,19 @@
 from mock import patch, Mock, MagicMock
+from pytest import raises
 
 from cStringIO import StringIO
 
+import gevent
+import os
+import shutil
+import socket
+import subprocess
+import tarfile
+import tempfile
+
 from .. import remote
 from .. import opsys
+from .. import run
 from ..run import RemoteProcess
 
 
@@ -14,6 +24,8 @@ class TestRemote(object):
 
     def teardown(self):
         self.stop_patchers()
+        for patcher in getattr(self, 'patchers', []):
+            patcher.stop()
 
     def start_patchers(self):
         self.m_ssh = MagicMock()
@@ -176,6 +188,136 @@ class TestRemote(object):
             rem = remote.Remote(name='jdoe@xyzzy.example.com', ssh=self.m_ssh)
             assert rem._sftp_get_size('/fake/file') == 42
 
+    def _sftp_remote(self, files):
+        """
+        Return a Remote whose SFTP sessions serve the given files, along with
+        the list of sessions opened
+        """
+        sessions = list()
+        self.opened = dict()
+
+        def open_sftp(*args, **kwargs):
+            sftp = MagicMock()
+
+            def stat(path):
+                if path not in files:
+                    raise IOError(2, 'No such file')
+                m_stat = Mock()
+                m_stat.st_size = len(files[path])
+                return m_stat
+
+            def sftp_open(path, mode='r'):
+                if 'w' in mode:
+                    f = MagicMock()
+                    f.__enter__.return_value = f
+                    f.write.side_effect = lambda data: files.__setitem__(
+                        path, files.get(path, '') + data)
+                    files[path] = ''
+                    return f
+                if path not in files:
+                    raise IOError(2, 'No such file')
+                f = MagicMock()
+                f.__enter__.return_value = f
+                # like paramiko's SFTPFile, leaving the block closes the file
+                f.__exit__.side_effect = lambda *args: f.close()
+                f.read.side_effect = StringIO(files[path]).read
+                f.stat.return_value.st_size = len(files[path])
+                self.opened[path] = f
+                return f
+            sftp.stat.side_effect = stat
+            sftp.open.side_effect = sftp_open
+            sessions.append(sftp)
+            return sftp
+        rem = remote.Remote(name='jdoe@xyzzy.example.com', ssh=self.m_ssh)
+        patcher = patch.object(remote.paramiko.SFTPClient, 'from_transport',
+                               side_effect=open_sftp)
+        patcher.start()
+        self.patchers = getattr(self, 'patchers', []) + [patcher]
+        return rem, sessions
+
+    def test_sftp_get_files_reuses_session(self):
+        files = {'/a': 'x' * 10, '/b': 'y' * 20}
+        rem, sessions = self._sftp_remote(files)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            paths = [(name, os.path.join(tmpdir, name[1:])) for name in files]
+            rem._sftp_get_files(paths)
+            rem._sftp_get_file('/a', os.path.join(tmpdir, 'c'))
+            for remote_path, local_path in paths:
+                with open(local_path) as f:
+                    assert f.read() == files[remote_path]
+        finally:
+            shutil.rmtree(tmpdir)
+        assert len(sessions) == 1
+        assert rem._sftp_sessions == sessions
+
+    def test_sftp_session_errors(self):
+        rem, sessions = self._sftp_remote({})
+        with raises(IOError):
+            with rem._sftp_session():
+                raise IOError(2, 'No such file')
+        assert rem._sftp_sessions == sessions
+        with raises(socket.error):
+            with rem._sftp_session():
+                raise socket.error(104, 'Connection reset by peer')
+        assert rem._sftp_sessions == []
+        sessions[0].close.assert_called_once_with()
+
+    def test_sftp_get_prefetches_large_files(self):
+        files = {'/small': 'x' * 10, '/large': 'y' * 100}
+        rem, sessions = self._sftp_remote(files)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with patch.object(remote.config, 'sftp_buffer_size', 50):
+                rem._sftp_get_files(
+                    [(name, os.path.join(tmpdir, name[1:])) for name in files])
+        finally:
+            shutil.rmtree(tmpdir)
+        opened = self.opened
+        assert not opened['/small'].prefetch.called
+        opened['/large'].prefetch.assert_called_once_with(100)
+
+    def test_sftp_put_files_pipelined(self):
+        files = dict()
+        rem, sessions = self._sftp_remote(files)
+        src = tempfile.NamedTemporaryFile()
+        src.write('z' * 100)
+        src.flush()
+        with patch.object(remote.config, 'sftp_buffer_size', 30):
+            rem._sftp_put_files([(src.name, '/dest1'), (src.name, '/dest2')])
+        assert files == {'/dest1': 'z' * 100, '/dest2': 'z' * 100}
+        assert len(sessions) == 1
+
+    def test_sftp_missing_file_keeps_session(self):
+        rem, sessions = self._sftp_remote(dict())
+        with raises(IOError):
+            rem._sftp_get_file('/missing', '/tmp/never-written')
+        assert rem._sftp_sessions == sessions
+
+    def test_sftp_session_error_closes_session(self):
+        rem, sessions = self._sftp_remote(dict())
+        with raises(RuntimeError):
+            with rem._sftp_session():
+                raise RuntimeError()
+        assert rem._sftp_sessions == []
+        sessions[0].close.assert_called_once_with()
+
+    def test_sftp_open_file_returns_session(self):
+        rem, sessions = self._sftp_remote({'/a': 'abc'})
+        f = rem._sftp_open_file('/a')
+        assert rem._sftp_sessions == []
+        f.close()
+        assert rem._sftp_sessions == sessions
+        assert rem._sftp_get_size('/a') == 3
+        assert len(sessions) == 1
+
+    def test_close_sftp(self):
+        rem, sessions = self._sftp_remote({'/a': 'abc'})
+        rem._sftp_get_size('/a')
+        rem.close_sftp()
+        assert rem._sftp_sessions == []
+        sessions[0].close.assert_called_once_with()
+
     def test_format_size(self):
         assert remote.Remote._format_size(1023).strip() == '1023B'
         assert remote.Remote._format_size(1024).strip() == '1KB'
@@ -183,3 +325,69 @@ class TestRemote(object):
         assert remote.Remote._format_size(1024**5).strip() == '1TB'
         assert remote.Remote._format_size(1021112).strip() == '997KB'
         assert remote.Remote._format_size(1021112**2).strip() == '971GB'
+
+
+class TestLocalRemote(object):
+
+    def setup(self):
+        self.root = tempfile.mkdtemp()
+        self.rem = remote.LocalRemote(
+            name='ubuntu@node1.example.com',
+            root=os.path.join(self.root, 'node1'),
+        )
+
+    def teardown(self):
+        shutil.rmtree(self.root)
+
+    def test_names(self):
+        assert self.rem.shortname == 'node1'
+        assert self.rem.hostname == 'node1.example.com'
+        assert self.rem.is_online
+
+    def test_run_in_root(self):
+        proc = self.rem.run(args=['pwd'], stdout=StringIO())
+        assert proc.stdout.getvalue().strip() == self.rem.root
+        assert proc.remote is self.rem
+
+    def test_put_and_get_file(self):
+        src = os.path.join(self.root, 'src')
+        with open(src, 'w') as f:
+            f.write('contents')
+        self.rem.put_file(src, 'dest')
+        assert os.path.exists(os.path.join(self.rem.root, 'dest'))
+        assert self.rem._sftp_get_size('dest') == len('contents')
+        dest_dir = os.path.join(self.root, 'fetched')
+        os.mkdir(dest_dir)
+        local_path = self.rem.get_file('dest', dest_dir=dest_dir)
+        assert local_path == os.path.join(dest_dir, 'dest')
+        with open(local_path) as f:
+            assert f.read() == 'contents'
+
+    def test_put_and_get_files(self):
+        src = os.path.join(self.root, 'src')
+        with open(src, 'w') as f:
+            f.write('contents')
+        self.rem._sftp_put_files([(src, 'dest1'), (src, 'dest2')])
+        fetched = [(name, os.path.join(self.root, name + '.fetched'))
+                   for name in ('dest1', 'dest2')]
+        self.rem._sftp_get_files(fetched)
+        for _, local_path in fetched:
+            with open(local_path) as f:
+                assert f.read() == 'contents'
+
+    def test_get_tar_stream(self):
+        self.rem.run(args=['mkdir', '-p', 'dir', run.Raw('&&'),
+                           'touch', 'dir/file'])
+        proc = self.rem.get_tar_stream('dir')
+        tar = tarfile.open(mode='r|gz', fileobj=proc.stdout)
+        names = [member.name for member in tar]
+        proc.wait()
+        assert './file' in names
+
+    def test_run_leaves_other_children_alone(self):
+        proc = self.rem.run(args=['sh', '-c', 'exit 3'], check_status=False)
+        assert proc.exitstatus == 3
+        child = subprocess.Popen(['sh', '-c', 'exit 4'])
+        # let the hub run once the child has exited
+        gevent.sleep(0.5)
+        assert child.wait() == 4
@@ -248,6 +248,69 @@ class TestRun(object):
         assert code == 0
         assert proc.exitstatus == 0
 
+    def test_trace_record(self):
+        output = 'foo\nbar\n'
+        set_buffer_contents(self.m_stdout_buf, output)
+        self.m_stdout_buf.channel.recv_exit_status.return_value = 0
+        with patch('teuthology.orchestra.run.tracer') as m_tracer:
+            proc = run.run(
+                client=self.m_ssh,
+                args=['foo'],
+                stderr=run.PIPE,
+                wait=False,
+            )
+            proc.wait()
+            proc.wait()
+        m_tracer.record.assert_called_once_with(proc)
+        assert proc.stdout_bytes == len(output)
+        assert proc.stderr_bytes is None
+        assert proc.start_time <= proc.end_time
+
+
+class TestRunLocal(object):
+    def test_capture_stdout(self):
+        stdout = StringIO()
+        proc = run.run_local(
+            args=['echo', 'foo bar'],
+            stdout=stdout,
+        )
+        assert proc.exitstatus == 0
+        assert proc.stdout.getvalue() == 'foo bar\n'
+        assert proc.stdout_bytes == len('foo bar\n')
+
+    def test_stdin(self):
+        proc = run.run_local(
+            args=['cat'],
+            stdin='input',
+            stdout=StringIO(),
+        )
+        assert proc.stdout.getvalue() == 'input'
+
+    def test_stdout_pipe(self):
+        proc = run.run_local(
+            args=['echo', 'one', run.Raw('&&'), 'echo', 'two'],
+            stdout=run.PIPE,
+            wait=False,
+        )
+        assert proc.stdout.readline() == 'one\n'
+        assert proc.stdout.readline() == 'two\n'
+        assert proc.wait() == 0
+        assert proc.finished
+
+    def test_cwd(self):
+        proc = run.run_local(args=['pwd'], stdout=StringIO(), cwd='/')
+        assert proc.stdout.getvalue() == '/\n'
+
+    def test_status_bad(self):
+        with raises(CommandFailedError) as exc:
+            run.run_local(args=['exit', '42'], name='local')
+        assert str(exc.value) == \
+            "Command failed on local with status 42: 'exit 42'"
+
+    def test_status_crash(self):
+        with raises(CommandCrashedError):
+            run.run_local(args=['kill', '-9', run.Raw('$$')])
+
 
 class TestQuote(object):
     def test_quote_simple(self):
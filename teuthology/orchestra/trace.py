@@ -0,0 +1,87 @@
+"""
+Opt-in per-command telemetry for orchestra.run
+
+When enabled, every RemoteProcess appends one JSON record to a trace file once
+it has been waited on. Each record looks like::
+
+    {"host": "smithi001", "label": null, "task": "ceph",
+     "command": "sudo ceph health", "start": 1476818399.1,
+     "end": 1476818399.6, "exitstatus": 0,
+     "stdout_bytes": 24, "stderr_bytes": 0}
+
+stdout_bytes and stderr_bytes are null when the caller used PIPE for that
+stream, since the bytes are consumed outside of orchestra.
+
+Use teuthology-trace to aggregate the records found in a run's archive.
+"""
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+# The name of the trace file inside a job's archive directory
+TRACE_FILENAME = 'trace.jsonl'
+
+
+class CommandTracer(object):
+    """
+    Appends one JSON record per command to a file. Disabled until enable() is
+    called.
+    """
+    def __init__(self):
+        self.path = None
+        self.task = None
+        self._file = None
+
+    @property
+    def enabled(self):
+        return self._file is not None
+
+    def enable(self, path):
+        """
+        Start recording commands to path. Existing records are kept.
+        """
+        self.disable()
+        self.path = path
+        self._file = open(path, 'a')
+        log.debug("Recording command telemetry to %s", path)
+
+    def disable(self):
+        if self._file is not None:
+            self._file.close()
+        self._file = None
+        self.path = None
+        self.task = None
+
+    def set_task(self, name):
+        """
+        Set the name of the task that subsequent records are attributed to
+        """
+        self.task = name
+
+    def record(self, proc):
+        """
+        Write a record for a finished RemoteProcess
+        """
+        if not self.enabled:
+            return
+        data = dict(
+            host=proc.hostname,
+            label=proc.label,
+            task=self.task,
+            command=proc.command,
+            start=proc.start_time,
+            end=proc.end_time,
+            exitstatus=proc.exitstatus,
+            stdout_bytes=proc.stdout_bytes,
+            stderr_bytes=proc.stderr_bytes,
+        )
+        try:
+            self._file.write(json.dumps(data) + '\n')
+            self._file.flush()
+        except (IOError, ValueError):
+            log.exception("Failed to write command telemetry to %s",
+                          self.path)
+
+
+tracer = CommandTracer()
@@ -1,25 +1,46 @@
 import logging
 import ast
+import random
 import re
 import requests
+import threading
+import time
 import urllib
 import urlparse
 
 from collections import OrderedDict
 from cStringIO import StringIO
+from gevent.event import AsyncResult
+from requests.adapters import HTTPAdapter
 
 from . import repo_utils
 
 from .config import config
-from .contextutil import safe_while
 from .exceptions import (VersionNotFoundError, CommitNotFoundError,
                          NoRemoteError)
 from .misc import sudo_write_file
 from .orchestra.opsys import OS, DEFAULT_OS_VERSION
 from .orchestra.run import Raw
+from .parallel import parallel
 
 log = logging.getLogger(__name__)
 
+# The number of connections kept open to each of gitbuilder, shaman and
+# chacra
+HTTP_POOL_SIZE = 16
+
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE,
+                       pool_maxsize=HTTP_POOL_SIZE)
+_session.mount('http://', _adapter)
+_session.mount('https://', _adapter)
+
+# How long _get_response(wait=True) waits for a package to appear, and the
+# bounds of the backoff between its probes
+PACKAGE_WAIT_TIMEOUT = 300
+PACKAGE_POLL_MIN = 2
+PACKAGE_POLL_MAX = 30
+
 '''
 Map 'generic' package name to 'flavor-specific' package name.
 If entry is None, either the package isn't known here, or
@@ -411,30 +432,163 @@ def _get_config_value_for_remote(ctx, remote, config, key):
     return config.get(key)
 
 
-def _get_response(url, wait=False, sleep=15, tries=10):
-    with safe_while(sleep=sleep, tries=tries, _raise=False) as proceed:
-        while proceed():
-            resp = requests.get(url)
-            if resp.ok:
-                log.info('Package found...')
-                break
+class AvailabilityWaiter(object):
+    """
+    Waits for URLs, e.g. of freshly built packages, to become available.
 
-            if not wait:
-                log.info(
-                    'Package is not found at: %s (got HTTP code %s)...',
-                    url,
-                    resp.status_code,
-                )
-                break
+    Probes are HEAD requests, made conditional with the ETag and
+    Last-Modified of the last successful probe, and are spaced out by an
+    exponential backoff with jitter. Every waiter for a URL in the process
+    shares the probe in flight for it, if there is one.
+    """
+    available_codes = (200, 304)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._probes = dict()
+        self._validators = dict()
+
+    def probe(self, url):
+        """
+        :returns: The HTTP status code of url
+        """
+        with self._lock:
+            pending = self._probes.get(url)
+            owner = pending is None
+            if owner:
+                pending = self._probes[url] = AsyncResult()
+        if not owner:
+            return pending.get()
+        try:
+            status = self._probe(url)
+        except Exception as e:
+            pending.set_exception(e)
+            raise
+        else:
+            pending.set(status)
+            return status
+        finally:
+            with self._lock:
+                del self._probes[url]
+
+    def _probe(self, url):
+        etag, last_modified = self._validators.get(url, (None, None))
+        headers = dict()
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        resp = _session.head(url, headers=headers, allow_redirects=True)
+        if resp.status_code in (405, 501):
+            # HEAD is not supported; don't download the body either way
+            resp = _session.get(url, headers=headers, stream=True)
+            resp.close()
+        if resp.status_code == 200:
+            self._validators[url] = (resp.headers.get('ETag'),
+                                     resp.headers.get('Last-Modified'))
+        return resp.status_code
+
+    def wait(self, url, timeout=PACKAGE_WAIT_TIMEOUT):
+        """
+        Probe url until it is available, or for at most timeout seconds
 
+        :returns: True if url is available, False otherwise
+        """
+        deadline = time.time() + timeout
+        delay = PACKAGE_POLL_MIN
+        while True:
+            status = self.probe(url)
+            if status in self.available_codes:
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                log.info('Gave up waiting for %s after %ss (got HTTP code '
+                         '%s)', url, timeout, status)
+                return False
             log.info(
                 'Package not there yet (got HTTP code %s), waiting...',
-                resp.status_code,
+                status,
             )
+            time.sleep(min(remaining, random.uniform(delay / 2.0, delay)))
+            delay = min(delay * 2, PACKAGE_POLL_MAX)
 
+_waiter = AvailabilityWaiter()
+
+
+def _get_response(url, wait=False, timeout=PACKAGE_WAIT_TIMEOUT):
+    """
+    :param wait: Wait for up to timeout seconds for url to become available
+                 first
+    :returns: The response to a GET of url
+    """
+    if wait:
+        _waiter.wait(url, timeout)
+    resp = _session.get(url)
+    if resp.ok:
+        log.info('Package found...')
+    else:
+        log.info(
+            'Package is not found at: %s (got HTTP code %s)...',
+            url,
+            resp.status_code,
+        )
     return resp
 
 
+class BuildCache(object):
+    """
+    What gitbuilder and shaman said about builds, shared by every builder
+    project object in the process. Entries are keyed by the question asked
+    and the (project, reference, distro, arch, flavor) of the build, and
+    expire after config.build_metadata_ttl seconds.
+
+    Concurrent lookups of the same key wait for a single request; the locks
+    are greenlet-safe once gevent has patched threading.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._key_locks = dict()
+        self._entries = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, fetch, cacheable=None):
+        """
+        :param fetch:     Called to look the value up on a miss
+        :param cacheable: Called with a fetched value to decide whether to
+                          cache it, e.g. not when a build was not found. By
+                          default, everything but None is cached.
+        :returns: The cached or fetched value
+        """
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self._entries.get(key)
+            if entry is not None and \
+                    time.time() - entry[0] < config.build_metadata_ttl:
+                self.hits += 1
+                log.debug("Build cache hit for %s (%d hits, %d misses)",
+                          key, self.hits, self.misses)
+                return entry[1]
+            self.misses += 1
+            log.debug("Build cache miss for %s (%d hits, %d misses)",
+                      key, self.hits, self.misses)
+            value = fetch()
+            if cacheable is None:
+                cacheable = lambda value: value is not None
+            if cacheable(value):
+                self._entries[key] = (time.time(), value)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+            self.hits = self.misses = 0
+
+_build_cache = BuildCache()
+
+
 class GitbuilderProject(object):
     """
     Represents a project that is built by gitbuilder.
@@ -522,7 +676,8 @@ class GitbuilderProject(object):
         if not hasattr(self, "_sha1"):
             self._sha1 = self.job_config.get('sha1')
             if not self._sha1:
-                self._sha1 = self._get_package_sha1()
+                self._sha1 = _build_cache.get(self._cache_key('sha1'),
+                                              self._get_package_sha1)
         return self._sha1
 
     @property
@@ -535,9 +690,25 @@ class GitbuilderProject(object):
         :returns: The version number of the project as a string.
         """
         if not hasattr(self, '_version'):
-            self._version = self._get_package_version()
+            self._version = _build_cache.get(self._cache_key('version'),
+                                             self._get_package_version)
         return self._version
 
+    def _cache_key(self, question):
+        """
+        :returns: The key of the answer to question about this build in the
+                  build cache
+        """
+        return (
+            self.__class__.__name__,
+            question,
+            self.project,
+            self._choose_reference().items()[0],
+            self.distro,
+            self.arch,
+            self.flavor,
+        )
+
     @property
     def base_url(self):
         """
@@ -750,7 +921,7 @@ class GitbuilderProject(object):
         """
         url = "{0}/sha1".format(self.base_url)
         log.info("Looking for package sha1: {0}".format(url))
-        resp = requests.get(url)
+        resp = _session.get(url)
         sha1 = None
         if not resp.ok:
             # TODO: maybe we should have this retry a few times?
@@ -848,13 +1019,17 @@ class ShamanProject(GitbuilderProject):
     @property
     def _result(self):
         if getattr(self, '_result_obj', None) is None:
-            self._result_obj = self._search()
+            # "not built yet" may change at any moment, so only found
+            # builds are cached
+            self._result_obj = _build_cache.get(
+                self._cache_key('search'), self._search,
+                cacheable=lambda resp: bool(resp.json()))
         return self._result_obj
 
     def _search(self):
         uri = self._search_uri
         log.debug("Querying %s", uri)
-        resp = requests.get(
+        resp = _session.get(
             uri,
             headers={'content-type': 'application/json'},
         )
@@ -959,7 +1134,7 @@ class ShamanProject(GitbuilderProject):
         )
 
     def _get_repo(self):
-        resp = requests.get(self.repo_url)
+        resp = _session.get(self.repo_url)
         resp.raise_for_status()
         return resp.text
 
@@ -1000,3 +1175,32 @@ def get_builder_project():
     else:
         builder_class = GitbuilderProject
     return builder_class
+
+
+def warm_build_cache(project, job_config, ctx, remotes):
+    """
+    Look up the sha1 and version of project's build for each of remotes at
+    once, so that later lookups for any of them are answered from the build
+    cache. Remotes with the same distro and arch share one lookup.
+
+    Failures are only logged; the lookups which need the answers report
+    them.
+    """
+    builder_class = get_builder_project()
+
+    def lookup(remote):
+        try:
+            builder = builder_class(project, job_config, ctx=ctx,
+                                    remote=remote)
+            builder.sha1
+            builder.version
+        except Exception:
+            log.debug("Could not look up the %s build for %s",
+                      project, remote.shortname, exc_info=True)
+
+    start = time.time()
+    with parallel() as p:
+        for remote in remotes:
+            p.spawn(lookup, remote)
+    log.debug("Looked up the %s build for %d remotes in %.1fs",
+              project, len(remotes), time.time() - start)
@@ -1,4 +1,5 @@
 import logging
+import multiprocessing
 import sys
 
 import gevent.pool
@@ -54,10 +55,16 @@ class parallel(object):
     At the end of the with block, the main thread waits until all
     spawned functions have completed, or, if one exited with an exception,
     kills the rest and raises the exception.
+
+    If size is given, at most that many functions run at once; spawn()
+    blocks until there is room.
     """
 
-    def __init__(self):
-        self.group = gevent.pool.Group()
+    def __init__(self, size=None):
+        if size:
+            self.group = gevent.pool.Pool(size)
+        else:
+            self.group = gevent.pool.Group()
         self.results = gevent.queue.Queue()
         self.count = 0
         self.any_spawned = False
@@ -114,3 +121,56 @@ class parallel(object):
         self.count -= 1
         if self.count <= 0:
             self.results.put(StopIteration())
+
+
+def _process_map_worker(conn, func, items):
+    try:
+        conn.send([func(item) for item in items])
+    except Exception as e:
+        conn.send(e)
+    finally:
+        conn.close()
+
+
+def process_map(func, items, processes=None):
+    """
+    Like map(func, items), but spread over a number of processes; for
+    CPU-bound work, which greenlets cannot spread over cores.
+
+    multiprocessing.Pool relies on threads, which hang once gevent has
+    patched them; so each worker is a forked Process reporting through a
+    Pipe. func and items are inherited rather than pickled, but results must
+    be picklable.
+
+    :param processes: The number of workers; by default, one per CPU
+    :returns:         A list of results, in the order of items
+    """
+    items = list(items)
+    processes = min(processes or multiprocessing.cpu_count(), len(items))
+    if processes <= 1:
+        return map(func, items)
+    workers = list()
+    for i in range(processes):
+        recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+        worker = multiprocessing.Process(
+            target=_process_map_worker,
+            args=(send_conn, func, items[i::processes]),
+        )
+        worker.start()
+        send_conn.close()
+        workers.append((worker, recv_conn))
+    results = [None] * len(items)
+    error = None
+    for i, (worker, recv_conn) in enumerate(workers):
+        try:
+            result = recv_conn.recv()
+        except EOFError:
+            result = RuntimeError("process_map worker exited early")
+        worker.join()
+        if isinstance(result, Exception):
+            error = error or result
+        else:
+            results[i::processes] = result
+    if error is not None:
+        raise error
+    return results
@@ -1,6 +1,15 @@
 import logging
-from ..misc import decanonicalize_hostname, get_distro, get_distro_version
+import socket
+import time
+
+import gevent
+import gevent.lock
+
+from ..config import config
+from ..misc import (canonicalize_hostname, decanonicalize_hostname,
+                    get_distro, get_distro_version, ssh_keyscan)
 from ..lockstatus import get_status
+from ..parallel import parallel
 
 from .downburst import Downburst
 from .openstack import ProvisionOpenStack
@@ -8,6 +17,26 @@ from .openstack import ProvisionOpenStack
 
 log = logging.getLogger(__name__)
 
+# A virtual machine which does not answer ssh after this many seconds is
+# destroyed and created again by wait_for_vms()
+VM_UP_TIMEOUT = 400
+# wait_for_vms() tries to reach each virtual machine after 1s, then twice
+# as long each time, up to this many seconds
+VM_POLL_INTERVAL = 10
+
+# One semaphore per hypervisor, limiting how many of its guests are being
+# created at once
+_vm_host_semaphores = dict()
+
+
+def _vm_host_semaphore(status_info):
+    host = (status_info.get('vm_host') or dict()).get('name')
+    semaphore = _vm_host_semaphores.get(host)
+    if semaphore is None:
+        semaphore = _vm_host_semaphores[host] = gevent.lock.BoundedSemaphore(
+            config.vm_host_concurrency)
+    return semaphore
+
 
 def create_if_vm(ctx, machine_name, _downburst=None):
     """
@@ -32,7 +61,74 @@ def create_if_vm(ctx, machine_name, _downburst=None):
 
     dbrst = _downburst or Downburst(name=machine_name, os_type=os_type,
                                     os_version=os_version, status=status_info)
-    return dbrst.create()
+    with _vm_host_semaphore(status_info):
+        return dbrst.create()
+
+
+def create_many_if_vm(ctx, machine_names):
+    """
+    Call create_if_vm() for each of machine_names concurrently; at most
+    vm_host_concurrency guests are created on the same hypervisor at once
+
+    :returns: A dict mapping each machine name to what create_if_vm()
+              returned for it
+    """
+    def create(machine_name):
+        return machine_name, create_if_vm(ctx, machine_name)
+
+    with parallel() as p:
+        for machine_name in machine_names:
+            p.spawn(create, machine_name)
+        return dict(p)
+
+
+def _ssh_port_open(hostname, timeout):
+    try:
+        socket.create_connection((hostname, 22), timeout).close()
+    except (socket.error, socket.timeout):
+        return False
+    return True
+
+
+def wait_for_vm(ctx, machine_name, timeout=VM_UP_TIMEOUT):
+    """
+    Wait until a virtual machine answers ssh, destroying and creating it
+    again each time it does not within timeout seconds
+
+    :returns: A dict mapping its hostname to its ssh public key, as
+              misc.ssh_keyscan() does
+    """
+    hostname = canonicalize_hostname(machine_name, user=None)
+    while True:
+        deadline = time.time() + timeout
+        interval = 1
+        while time.time() < deadline:
+            if _ssh_port_open(hostname, max(deadline - time.time(), 1)):
+                keys = ssh_keyscan([machine_name])
+                if keys:
+                    return keys
+            gevent.sleep(interval)
+            interval = min(interval * 2, VM_POLL_INTERVAL)
+        log.info('%s still not up after %ds, recreating it', machine_name,
+                 timeout)
+        full_name = canonicalize_hostname(machine_name)
+        destroy_if_vm(ctx, full_name)
+        create_if_vm(ctx, full_name)
+
+
+def wait_for_vms(ctx, machine_names, timeout=VM_UP_TIMEOUT):
+    """
+    Call wait_for_vm() for each of machine_names concurrently
+
+    :returns: A dict mapping their hostnames to their ssh public keys
+    """
+    keys = dict()
+    with parallel() as p:
+        for machine_name in machine_names:
+            p.spawn(wait_for_vm, ctx, machine_name, timeout)
+        for result in p:
+            keys.update(result)
+    return keys
 
 
 def destroy_if_vm(ctx, machine_name, user=None, description=None,
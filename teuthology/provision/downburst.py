@@ -4,6 +4,8 @@ import subprocess
 import tempfile
 import yaml
 
+import gevent
+
 from ..config import config
 from ..contextutil import safe_while
 from ..misc import decanonicalize_hostname
@@ -13,6 +15,32 @@ from ..lockstatus import get_status
 log = logging.getLogger(__name__)
 
 
+def _communicate(args):
+    """
+    Run a command to completion, waiting for it in the hub's threadpool so
+    that other greenlets, e.g. creating other guests, run meanwhile.
+
+    subprocess is deliberately not monkey-patched (see teuthology/__init__.py);
+    gevent.subprocess's child watcher could reap children that other callers
+    of the stdlib subprocess module are still waiting for.
+
+    :returns: A (returncode, stdout, stderr) tuple
+    """
+    # communicate() would select() on the pipes, which gevent has patched
+    # and which cannot block in a threadpool thread; so stderr goes to a
+    # file and only the read of stdout, which ends when downburst exits,
+    # happens in the threadpool
+    with tempfile.TemporaryFile() as err_file:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
+                                stderr=err_file)
+        out = gevent.get_hub().threadpool.apply(proc.stdout.read)
+        proc.stdout.close()
+        proc.wait()
+        err_file.seek(0)
+        err = err_file.read()
+    return (proc.returncode, out, err)
+
+
 def downburst_executable():
     """
     First check for downburst in the user's path.
@@ -113,10 +141,7 @@ class Downburst(object):
             distro=self.os_type,
             distroversion=self.os_version
         ))
-        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE)
-        out, err = proc.communicate()
-        return (proc.returncode, out, err)
+        return _communicate(args)
 
     def destroy(self):
         """
@@ -128,14 +153,12 @@ class Downburst(object):
             return False
         shortname = decanonicalize_hostname(self.name)
         args = [executable, '-c', self.host, 'destroy', shortname]
-        proc = subprocess.Popen(args, stdout=subprocess.PIPE,
-                                stderr=subprocess.PIPE,)
-        out, err = proc.communicate()
+        returncode, out, err = _communicate(args)
         if err:
             log.error("Error destroying {machine}: {msg}".format(
                 machine=self.name, msg=err))
             return False
-        elif proc.returncode == 0:
+        elif returncode == 0:
             out_str = ': %s' % out if out else ''
             log.info("Destroyed %s%s" % (self.name, out_str))
             return True
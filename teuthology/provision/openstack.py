@@ -1,9 +1,7 @@
-import json
 import logging
 import os
 import random
 import re
-import subprocess
 import time
 import tempfile
 
@@ -11,14 +9,21 @@ from subprocess import CalledProcessError
 
 from .. import misc
 
-from ..openstack import OpenStack, OpenStackInstance
+from ..openstack import Inventory, OpenStack, OpenStackInstance
 from ..config import config
 from ..contextutil import safe_while
 from ..exceptions import QuotaExceededError
+from ..parallel import parallel
 
 
 log = logging.getLogger(__name__)
 
+# How many instances ProvisionOpenStack.create() brings up at once, unless
+# openstack: bring-up-concurrency is set
+BRING_UP_CONCURRENCY = 8
+# The stages of bringing up an instance, in order
+BRING_UP_STAGES = ('rename', 'ssh', 'cloud-init', 'volumes')
+
 
 class ProvisionOpenStack(OpenStack):
     """
@@ -61,11 +66,7 @@ class ProvisionOpenStack(OpenStack):
         """
         for i in range(volumes['count']):
             volume_name = name + '-' + str(i)
-            try:
-                self.run("volume show -f json " + volume_name)
-            except subprocess.CalledProcessError as e:
-                if 'No volume with a name or ID' not in e.output:
-                    raise e
+            if self.volume_show(volume_name) is None:
                 # do not use OpenStack().run because its
                 # bugous for volume create as of openstackclient 3.2.0
                 # https://bugs.launchpad.net/python-openstackclient/+bug/1619726
@@ -78,21 +79,16 @@ class ProvisionOpenStack(OpenStack):
             with safe_while(sleep=2, tries=100,
                             action="volume " + volume_name) as proceed:
                 while proceed():
-                    try:
-                        r = OpenStack().run("volume show  -f json " +
-                                            volume_name)
-                        status = self.get_value(json.loads(r), 'status')
-                        if status == 'available':
-                            break
-                        else:
-                            log.info("volume " + volume_name +
-                                     " not available yet")
-                    except subprocess.CalledProcessError:
-                            log.info("volume " + volume_name +
-                                     " not information available yet")
-            # do not use OpenStack().run because its
-            # bugous for volume
-            misc.sh("openstack server add volume " + name + " " + volume_name)
+                    volume = self.volume_show(volume_name)
+                    if volume is None:
+                        log.info("volume " + volume_name +
+                                 " not information available yet")
+                    elif self.get_value(volume, 'status') == 'available':
+                        break
+                    else:
+                        log.info("volume " + volume_name +
+                                 " not available yet")
+            self.server_add_volume(name, volume_name)
 
     @staticmethod
     def ip2name(prefix, ip):
@@ -143,33 +139,85 @@ class ProvisionOpenStack(OpenStack):
             if "quota exceeded" in exc.output.lower():
                 raise QuotaExceededError(message=exc.output)
             raise
+        Inventory.invalidate()
         instances = filter(
             lambda instance: self.property in instance['Properties'],
             self.list_instances())
         instances = [OpenStackInstance(i['ID']) for i in instances]
-        fqdns = []
+        concurrency = config['openstack'].get('bring-up-concurrency',
+                                              BRING_UP_CONCURRENCY)
+        timings = dict()
         try:
-            network = config['openstack'].get('network', '')
-            for instance in instances:
-                ip = instance.get_ip(network)
-                name = self.ip2name(self.basename, ip)
-                self.run("server set " +
-                         "--name " + name + " " +
-                         instance['ID'])
-                fqdn = name + '.' + config.lab_domain
-                if not misc.ssh_keyscan_wait(fqdn):
-                    raise ValueError('ssh_keyscan_wait failed for ' + fqdn)
-                time.sleep(15)
-                if not self.cloud_init_wait(instance):
-                    raise ValueError('cloud_init_wait failed for ' + fqdn)
-                self.attach_volumes(name, resources_hint['volumes'])
-                fqdns.append(fqdn)
+            with parallel(size=concurrency) as p:
+                for instance in instances:
+                    p.spawn(self.bring_up, instance,
+                            resources_hint['volumes'], timings)
+                try:
+                    fqdns = dict(p)
+                except Exception:
+                    # do not wait for the other instances, they are all
+                    # going to be destroyed
+                    p.group.kill()
+                    raise
         except Exception as e:
             log.exception(str(e))
             for id in [instance['ID'] for instance in instances]:
                 self.destroy(id)
             raise e
-        return fqdns
+        finally:
+            # the instances were renamed
+            Inventory.invalidate()
+            self.log_timings(timings)
+        return [fqdns[instance['ID']] for instance in instances]
+
+    def bring_up(self, instance, volumes, timings):
+        """
+        Name the instance after its IP, wait until it can be reached with
+        ssh and cloud-init is done with it, then attach its volumes. The time
+        each stage takes is recorded in timings[fqdn][stage].
+
+        :returns: A (instance ID, fqdn) tuple
+        """
+        network = config['openstack'].get('network', '')
+        start = time.time()
+        ip = instance.get_ip(network)
+        name = self.ip2name(self.basename, ip)
+        fqdn = name + '.' + config.lab_domain
+        stages = timings.setdefault(fqdn, dict())
+
+        def done(stage):
+            now = time.time()
+            stages[stage] = now - done.last
+            log.debug("%s: %s took %.1fs", fqdn, stage, stages[stage])
+            done.last = now
+        done.last = start
+
+        self.server_set_name(instance['ID'], name)
+        done('rename')
+        if not misc.ssh_keyscan_wait(fqdn):
+            raise ValueError('ssh_keyscan_wait failed for ' + fqdn)
+        done('ssh')
+        if not self.cloud_init_wait(instance):
+            raise ValueError('cloud_init_wait failed for ' + fqdn)
+        done('cloud-init')
+        self.attach_volumes(name, volumes)
+        done('volumes')
+        log.info("%s is up after %.1fs", fqdn, time.time() - start)
+        return instance['ID'], fqdn
+
+    @staticmethod
+    def log_timings(timings):
+        """
+        Log how long each stage of bring_up() took, for the slowest instance
+        """
+        for stage in BRING_UP_STAGES:
+            durations = [(stages[stage], fqdn)
+                         for fqdn, stages in timings.items()
+                         if stage in stages]
+            if durations:
+                log.info("bring up: %s took %.1fs at most (%s) for %d "
+                         "instances", stage, max(durations)[0],
+                         max(durations)[1], len(durations))
 
     def destroy(self, name_or_id):
         log.debug('ProvisionOpenStack:destroy ' + name_or_id)
@@ -1,6 +1,12 @@
+import time
 from mock import Mock, MagicMock, patch
 
+# teuthology has to be imported before gevent, so that gevent leaves
+# os.waitpid() alone; see teuthology/__init__.py
 from teuthology import provision
+from teuthology.provision import downburst
+
+import gevent
 
 
 class TestDownburst(object):
@@ -96,3 +102,101 @@ class TestDownburst(object):
         dbrst = provision.Downburst(name, ctx.os_type, ctx.os_version, status)
         result = dbrst.destroy()
         assert result is False
+
+
+class TestCommunicate(object):
+    def test_output(self):
+        assert downburst._communicate(
+            ['sh', '-c', 'echo out; echo err >&2; exit 3']) == \
+            (3, 'out\n', 'err\n')
+
+    def test_concurrent(self):
+        start = time.time()
+        greenlets = [gevent.spawn(downburst._communicate, ['sleep', '0.5'])
+                     for i in range(3)]
+        gevent.joinall(greenlets, raise_error=True)
+        assert time.time() - start < 1.2
+        assert [g.value[0] for g in greenlets] == [0, 0, 0]
+
+
+class TestConcurrentVMs(object):
+    def setup(self):
+        self.ctx = Mock()
+        self.ctx.os_type = 'ubuntu'
+        self.ctx.os_version = '16.04'
+        self.ctx.config = dict()
+        # vpm001 and vpm002 are on host1, vpm003 on host2
+        self.hosts = dict(vpm001='host1', vpm002='host1', vpm003='host2')
+        self.creating = dict(host1=0, host2=0)
+        self.most_creating = dict(host1=0, host2=0)
+        self.created = list()
+        self.destroyed = list()
+        provision._vm_host_semaphores.clear()
+
+    def teardown(self):
+        provision._vm_host_semaphores.clear()
+
+    def get_status(self, name):
+        short = name.split('.')[0].split('@')[-1]
+        return dict(is_vm=True, vm_host=dict(name=self.hosts[short]),
+                    locked_by=None, description=None)
+
+    def make_downburst(self, name, os_type, os_version, status):
+        test = self
+        host = status['vm_host']['name']
+
+        class FakeDownburst(object):
+            def create(self):
+                test.creating[host] += 1
+                test.most_creating[host] = max(test.most_creating[host],
+                                               test.creating[host])
+                gevent.sleep(0.01)
+                test.creating[host] -= 1
+                test.created.append(name)
+                return True
+
+            def destroy(self):
+                test.destroyed.append(name)
+                return True
+        return FakeDownburst()
+
+    def test_create_many_if_vm(self):
+        with patch.multiple(
+                provision,
+                get_status=self.get_status,
+                Downburst=self.make_downburst,
+        ):
+            with patch.object(provision.config, 'vm_host_concurrency', 1):
+                result = provision.create_many_if_vm(
+                    self.ctx, ['vpm001', 'vpm002', 'vpm003'])
+        assert result == dict(vpm001=True, vpm002=True, vpm003=True)
+        assert self.most_creating == dict(host1=1, host2=1)
+
+    def test_wait_for_vms(self):
+        up = set(['vpm001'])
+
+        def ssh_port_open(hostname, timeout):
+            return hostname in up
+
+        def ssh_keyscan(names):
+            return dict((name, 'key-' + name) for name in names
+                        if name in up)
+
+        def create(ctx, name):
+            up.add(name.split('@')[-1])
+            self.created.append(name)
+        with patch.multiple(
+                provision,
+                get_status=self.get_status,
+                Downburst=self.make_downburst,
+                _ssh_port_open=ssh_port_open,
+                ssh_keyscan=ssh_keyscan,
+                create_if_vm=create,
+                canonicalize_hostname=lambda name, user='ubuntu':
+                    (user + '@' if user else '') + name,
+        ):
+            keys = provision.wait_for_vms(self.ctx, ['vpm001', 'vpm002'],
+                                          timeout=0.5)
+        assert keys == dict(vpm001='key-vpm001', vpm002='key-vpm002')
+        assert self.destroyed == ['ubuntu@vpm002']
+        assert self.created == ['ubuntu@vpm002']
@@ -0,0 +1,88 @@
+from mock import patch, MagicMock
+from pytest import raises
+
+# teuthology has to be imported before gevent, so that gevent leaves
+# os.waitpid() alone; see teuthology/__init__.py
+from teuthology.config import config
+from teuthology.provision.openstack import ProvisionOpenStack
+
+import gevent
+
+
+class FakeInstance(dict):
+    def __init__(self, id_, ip):
+        super(FakeInstance, self).__init__(ID=id_)
+        self.ip = ip
+
+    def get_ip(self, network):
+        return self.ip
+
+
+class TestProvisionOpenStackCreate(object):
+    def setup(self):
+        self.saved_openstack = config.openstack
+        config.openstack = dict(self.saved_openstack,
+                                **{'bring-up-concurrency': 2})
+        self.instances = [FakeInstance('id%d' % i, '10.0.%d.%d' % (i, i))
+                          for i in range(4)]
+        self.running = 0
+        self.most_running = 0
+        self.destroyed = []
+        self.patchers = [
+            patch.multiple(
+                ProvisionOpenStack,
+                init_user_data=MagicMock(),
+                image=MagicMock(),
+                flavor=MagicMock(),
+                run=MagicMock(),
+                server_set_name=MagicMock(),
+                attach_volumes=MagicMock(),
+                cloud_init_wait=self.cloud_init_wait,
+                destroy=lambda _, id_: self.destroyed.append(id_),
+                list_instances=MagicMock(return_value=[
+                    dict(ID=i['ID'], Properties='')
+                    for i in self.instances]),
+            ),
+            patch('teuthology.provision.openstack.OpenStackInstance',
+                  lambda id_: dict((i['ID'], i)
+                                   for i in self.instances)[id_]),
+            patch('teuthology.provision.openstack.misc.ssh_keyscan_wait',
+                  return_value=True),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.failing = None
+
+    def teardown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        config.openstack = self.saved_openstack
+
+    def cloud_init_wait(self, instance):
+        self.running += 1
+        self.most_running = max(self.running, self.most_running)
+        # the first instance is the slowest, the others finish before it
+        gevent.sleep(0.1 if instance['ID'] == 'id0' else 0.01)
+        self.running -= 1
+        if instance['ID'] == self.failing:
+            raise ValueError('cloud-init failed')
+        return True
+
+    def create(self):
+        o = ProvisionOpenStack()
+        o.property = ''
+        return o.create(4, 'ubuntu', '16.04', 'x86_64', dict())
+
+    def test_create(self):
+        fqdns = self.create()
+        domain = '.' + config.lab_domain
+        assert fqdns == ['target000000' + domain, 'target001001' + domain,
+                         'target002002' + domain, 'target003003' + domain]
+        assert self.most_running == 2
+        assert self.destroyed == []
+
+    def test_create_destroys_all_on_failure(self):
+        self.failing = 'id2'
+        with raises(ValueError):
+            self.create()
+        assert self.destroyed == ['id0', 'id1', 'id2', 'id3']
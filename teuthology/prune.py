@@ -5,6 +5,7 @@ import shutil
 import time
 
 import teuthology
+from teuthology import bgzf
 from teuthology.contextutil import safe_while
 
 log = logging.getLogger(__name__)
@@ -26,9 +27,11 @@ def main(args):
     pass_days = int(args['--pass'])
     remotes_days = int(args['--remotes'])
     compress_days = int(args['--compress'])
+    seekable = args['--seekable']
 
     prune_archive(
-        archive_dir, pass_days, remotes_days, compress_days, dry_run
+        archive_dir, pass_days, remotes_days, compress_days, dry_run,
+        seekable=seekable,
     )
 
 
@@ -38,10 +41,13 @@ def prune_archive(
         remotes_days,
         compress_days,
         dry_run=False,
+        seekable=False,
 ):
     """
     Walk through the archive_dir, calling the cleanup functions to process
     directories that might be old enough
+
+    :param seekable: Compress logs in the seekable format of teuthology.bgzf
     """
     max_days = max(pass_days, remotes_days)
     log.debug("Archive {archive} has {count} children".format(
@@ -63,7 +69,7 @@ def prune_archive(
         log.debug("Processing %s ..." % run_dir)
         maybe_remove_passes(run_dir, pass_days, dry_run)
         maybe_remove_remotes(run_dir, remotes_days, dry_run)
-        maybe_compress_logs(run_dir, compress_days, dry_run)
+        maybe_compress_logs(run_dir, compress_days, dry_run, seekable)
 
 
 def listdir(path):
@@ -181,7 +187,7 @@ def _maybe_remove_subdir(job_dir, subdir, days, description, dry_run=False):
         remove(subdir_path)
 
 
-def maybe_compress_logs(run_dir, days, dry_run=False):
+def maybe_compress_logs(run_dir, days, dry_run=False, seekable=False):
     if days < 0:
         return
     contents = listdir(run_dir)
@@ -207,10 +213,15 @@ def maybe_compress_logs(run_dir, days, dry_run=False):
             continue
         zlog_path = log_path + '.gz'
         try:
-            _compress(log_path, zlog_path)
+            if seekable:
+                bgzf.compress(log_path, zlog_path)
+            else:
+                _compress(log_path, zlog_path)
         except Exception:
             log.exception("Failed to compress %s", log_path)
-            os.remove(zlog_path)
+            for path in (zlog_path, bgzf.index_path(zlog_path)):
+                if os.path.exists(path):
+                    os.remove(path)
         else:
             os.remove(log_path)
 
@@ -10,12 +10,18 @@ from textwrap import fill
 import teuthology
 from teuthology.config import config
 from teuthology import misc
+from .dirwatch import DirectoryWatcher
 from .report import ResultsReporter
 
 log = logging.getLogger(__name__)
 
 UNFINISHED_STATUSES = ('queued', 'running', 'waiting')
 
+# Bounds on how long to wait between queries to the results server. The
+# interval grows with the number of jobs which have not written a summary.
+MIN_POLL_INTERVAL = 15
+MAX_POLL_INTERVAL = 300
+
 
 def main(args):
 
@@ -36,24 +42,13 @@ def main(args):
 
 
 def results(archive_dir, name, email, timeout, dry_run):
-    starttime = time.time()
-
     if timeout:
         log.info('Waiting up to %d seconds for tests to finish...', timeout)
-
-    reporter = ResultsReporter()
-    while timeout > 0:
-        if time.time() - starttime > timeout:
+        if wait_for_jobs(archive_dir, name, timeout):
+            log.info('Tests finished! gathering results...')
+        else:
             log.warn('test(s) did not finish before timeout of %d seconds',
                      timeout)
-            break
-        jobs = reporter.get_jobs(name, fields=['job_id', 'status'])
-        unfinished_jobs = [job for job in jobs if job['status'] in
-                           UNFINISHED_STATUSES]
-        if not unfinished_jobs:
-            log.info('Tests finished! gathering results...')
-            break
-        time.sleep(60)
 
     (subject, body) = build_email_body(name)
 
@@ -74,6 +69,68 @@ def results(archive_dir, name, email, timeout, dry_run):
         generate_coverage(archive_dir, name)
 
 
+def get_unfinished_jobs(reporter, name):
+    """
+    :returns: The IDs of the jobs in the run which the results server does
+              not consider finished
+    """
+    jobs = reporter.get_jobs(name, fields=['job_id', 'status'])
+    return [str(job['job_id']) for job in jobs
+            if job['status'] in UNFINISHED_STATUSES]
+
+
+def poll_interval(pending):
+    """
+    :param pending: The number of jobs which have not written a summary
+    :returns: How long to wait before querying the results server again
+    """
+    return min(MAX_POLL_INTERVAL, MIN_POLL_INTERVAL * max(pending, 1))
+
+
+def wait_for_jobs(archive_dir, name, timeout, reporter=None):
+    """
+    Wait for every job in a run to finish.
+
+    Each job writes summary.yaml into its archive directory when it is done,
+    so the archive directory is watched for those; the results server is
+    only asked to confirm once every job it knows of has one. It is also
+    queried now and then regardless, since jobs that are killed before they
+    start never write a summary; the fewer jobs remain, the more often.
+
+    :returns: True if all jobs finished, False if timeout seconds passed
+              first
+    """
+    reporter = reporter or ResultsReporter()
+    deadline = time.time() + timeout
+    unfinished = get_unfinished_jobs(reporter, name)
+    next_poll = time.time() + poll_interval(len(unfinished))
+    last_pending = len(unfinished)
+    with DirectoryWatcher() as watcher:
+        watcher.watch(archive_dir)
+        while unfinished:
+            pending = list()
+            for job_id in unfinished:
+                job_dir = os.path.join(archive_dir, job_id)
+                if os.path.exists(os.path.join(job_dir, 'summary.yaml')):
+                    continue
+                pending.append(job_id)
+                if os.path.isdir(job_dir):
+                    watcher.watch(job_dir)
+            now = time.time()
+            if (not pending and last_pending) or now >= next_poll:
+                log.debug('%d job(s) have no summary yet; asking the '
+                          'results server', len(pending))
+                unfinished = get_unfinished_jobs(reporter, name)
+                next_poll = now + poll_interval(len(pending))
+                last_pending = len(pending)
+                continue
+            last_pending = len(pending)
+            if now >= deadline:
+                return False
+            watcher.wait(min(deadline, next_poll) - now)
+    return True
+
+
 def generate_coverage(archive_dir, name):
     coverage_config_keys = ('coverage_output_dir', 'coverage_html_dir',
                             'coverage_tools_dir')
@@ -16,6 +16,7 @@ from .repo_utils import fetch_qa_suite
 from .results import email_results
 from .config import FakeNamespace
 from .config import config as teuth_config
+from .orchestra.trace import tracer, TRACE_FILENAME
 
 log = logging.getLogger(__name__)
 
@@ -69,6 +70,16 @@ def write_initial_metadata(archive, config, name, description, owner):
             yaml.safe_dump(info, f, default_flow_style=False)
 
 
+def set_up_command_trace(archive, config):
+    """
+    Record per-command telemetry into the archive if either the job config or
+    the site config sets 'command_trace'
+    """
+    enabled = config.get('command_trace', teuth_config.command_trace)
+    if archive is not None and enabled:
+        tracer.enable(os.path.join(archive, TRACE_FILENAME))
+
+
 def fetch_tasks_if_needed(job_config):
     """
     Fetch the suite repo (and include it in sys.path) so that we can use its
@@ -327,6 +338,7 @@ def main(args):
         config['archive_path'] = archive
 
     write_initial_metadata(archive, config, name, description, owner)
+    set_up_command_trace(archive, config)
     report.try_push_job_info(config, dict(status='running'))
 
     machine_type = get_machine_type(machine_type, config)
@@ -387,5 +399,6 @@ def main(args):
     try:
         run_tasks(tasks=config['tasks'], ctx=fake_ctx)
     finally:
+        tracer.disable()
         # print to stdout the results and possibly send an email on any errors
         report_outcome(config, archive, fake_ctx.summary, fake_ctx)
@@ -9,6 +9,7 @@ from .config import config as teuth_config
 from .exceptions import ConnectionLostError
 from .job_status import set_status
 from .misc import get_http_log_path
+from .orchestra.trace import tracer
 from .sentry import get_client as get_sentry_client
 from .timer import Timer
 
@@ -83,6 +84,7 @@ def run_tasks(tasks, ctx):
                 raise RuntimeError('Invalid task definition: %s' % taskdict)
             log.info('Running task %s...', taskname)
             timer.mark('%s enter' % taskname)
+            tracer.set_task(taskname)
             manager = run_one_task(taskname, ctx=ctx, config=config)
             if hasattr(manager, '__enter__'):
                 stack.append((taskname, manager))
@@ -155,6 +157,7 @@ def run_tasks(tasks, ctx):
                 taskname, manager = stack.pop()
                 log.debug('Unwinding manager %s', taskname)
                 timer.mark('%s exit' % taskname)
+                tracer.set_task(taskname)
                 try:
                     suppress = manager.__exit__(*exc_info)
                 except Exception as e:
@@ -190,3 +193,4 @@ def run_tasks(tasks, ctx):
             # be careful about cyclic references
             del exc_info
         timer.mark("tasks complete")
+        tracer.set_task(None)
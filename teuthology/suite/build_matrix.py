@@ -5,8 +5,12 @@ from . import matrix
 
 log = logging.getLogger(__name__)
 
+# Compiled matrices by (path, mincyclicity), with the signature of the tree
+# they were built from; see _get_compiled_matrix()
+_matrix_cache = dict()
 
-def build_matrix(path, subset=None):
+
+def build_matrix(path, subset=None, fragment_filter=None):
     """
     Return a list of items descibed by path such that if the list of
     items is chunked into mincyclicity pieces, each piece is still a
@@ -41,6 +45,10 @@ def build_matrix(path, subset=None):
 
     :param path:        The path to search for yaml fragments
     :param subset:	(index, outof)
+    :param fragment_filter: A suite.util.FragmentFilter. If its can_prune is
+                        set, items it would reject are left out of the list
+                        before being generated, and counted in its pruned
+                        attribute.
     """
     if subset:
         log.info(
@@ -48,6 +56,9 @@ def build_matrix(path, subset=None):
             (str(subset[0]), str(subset[1]))
         )
     mat, first, matlimit = _get_matrix(path, subset)
+    if fragment_filter is not None and fragment_filter.can_prune:
+        return generate_filtered_combinations(path, mat, first, matlimit,
+                                              fragment_filter)
     return generate_combinations(path, mat, first, matlimit)
 
 
@@ -57,7 +68,7 @@ def _get_matrix(path, subset=None):
     matlimit = None
     if subset:
         (index, outof) = subset
-        mat = _build_matrix(path, mincyclicity=outof)
+        mat = _get_compiled_matrix(path, mincyclicity=outof)
         first = (mat.size() / outof) * index
         if index == outof or index == outof - 1:
             matlimit = mat.size()
@@ -65,11 +76,50 @@ def _get_matrix(path, subset=None):
             matlimit = (mat.size() / outof) * (index + 1)
     else:
         first = 0
-        mat = _build_matrix(path)
+        mat = _get_compiled_matrix(path)
         matlimit = mat.size()
     return mat, first, matlimit
 
 
+def _tree_signature(path):
+    """
+    Return the mtime of path and of each directory below it, which change
+    whenever a fragment or directory is added, removed or renamed; editing
+    a fragment does not change the matrix. Returns None if the tree can't
+    be examined.
+    """
+    try:
+        signature = [(path, os.path.getmtime(path))]
+        for root, dirs, _ in os.walk(path, followlinks=True):
+            for name in dirs:
+                dir_path = os.path.join(root, name)
+                signature.append((dir_path, os.path.getmtime(dir_path)))
+    except OSError:
+        return None
+    return signature
+
+
+def _get_compiled_matrix(path, mincyclicity=0):
+    """
+    Return the compiled matrix for path, reusing the one built by an
+    earlier call if the tree has not changed since
+    """
+    key = (os.path.abspath(path), mincyclicity)
+    signature = _tree_signature(path)
+    cached = _matrix_cache.get(key)
+    if signature is not None and cached is not None and \
+            cached[0] == signature:
+        return cached[1]
+    mat = matrix.compile_matrix(_build_matrix(path, mincyclicity))
+    if signature is not None:
+        _matrix_cache[key] = (signature, mat)
+    return mat
+
+
+def clear_matrix_cache():
+    _matrix_cache.clear()
+
+
 def _build_matrix(path, mincyclicity=0, item=''):
     if not os.path.exists(path):
         raise IOError('%s does not exist (abs %s)' % (path, os.path.abspath(path)))
@@ -157,15 +207,51 @@ def generate_combinations(path, mat, generate_from, generate_to):
     component will appear as a file with braces listing the selection
     of chosen subitems.
     """
+    if isinstance(mat, matrix.CompiledMatrix):
+        outputs = mat.index_range(generate_from, generate_to)
+    else:
+        outputs = [mat.index(i) for i in range(generate_from, generate_to)]
     ret = []
-    for i in range(generate_from, generate_to):
-        output = mat.index(i)
+    for output in outputs:
         ret.append((
             matrix.generate_desc(combine_path, output),
             matrix.generate_paths(path, output, combine_path)))
     return ret
 
 
+def generate_filtered_combinations(path, mat, generate_from, generate_to,
+                                   fragment_filter):
+    """
+    Like generate_combinations(), leaving out the items fragment_filter
+    rejects. Whether each fragment (or concatenated directory) matches the
+    filters is worked out once; then, for each index, only the nodes it
+    chooses are looked up, and descriptions and paths are only generated
+    for the items that are kept.
+    """
+    verdicts = dict(
+        (node, fragment_filter.check_fragments(paths))
+        for node, paths in mat.leaf_paths(path, combine_path).items())
+    filter_in = fragment_filter.filter_in is not None
+    wanted = []
+    for i in xrange(generate_from, generate_to):
+        matched_in = not filter_in
+        for node in mat.leaves(i):
+            node_in, node_out = verdicts[node]
+            if node_out:
+                break
+            matched_in = matched_in or node_in
+        else:
+            if matched_in:
+                wanted.append(i)
+                continue
+        fragment_filter.pruned += 1
+    log.debug("Filters pruned %d of %d items",
+              fragment_filter.pruned, generate_to - generate_from)
+    return [(matrix.generate_desc(combine_path, output),
+             matrix.generate_paths(path, output, combine_path))
+            for output in mat.index_many(wanted)]
+
+
 def combine_path(left, right):
     """
     os.path.join(a, b) doesn't like it when b is None
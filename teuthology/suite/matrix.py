@@ -1,3 +1,4 @@
+import array
 import os
 import heapq
 from fractions import gcd
@@ -326,3 +327,196 @@ def generate_desc(joinf, result):
         return joinf(str(item), cdesc)
     else:
         return str(result)
+
+
+# Node kinds in a CompiledMatrix
+_BASE, _CYCLE, _PRODUCT, _SUM = range(4)
+
+
+class CompiledMatrix(Matrix):
+    """
+    A Matrix flattened into arrays, giving the same results from index().
+
+    Each node of the original tree is numbered, and its kind, item, size
+    and the range of its children in a flat child table are kept in
+    parallel arrays. The strides Product._index() works out on each call
+    (the lcm/gcd of adjacent dimensions) are computed once per child slot,
+    and each Sum's mapping from index to child is kept as two arrays rather
+    than a dict of tuples. Concat nodes always give the same result, so
+    they are evaluated once and stored as Base items.
+
+    index() is then a walk down the tree costing O(depth) per chosen
+    fragment, and index_range() shares the results of subtrees between
+    the indexes of a range.
+    """
+    def __init__(self, mat):
+        self.kinds = array.array('B')
+        self.items = []
+        self.sizes = []
+        self.child_start = array.array('l')
+        self.child_count = array.array('l')
+        # the child table, and for each slot of a Product's children the
+        # size of that child, the number of cycles and the cycle length
+        self.children = array.array('l')
+        self.lsizes = []
+        self.cycles = []
+        self.clens = []
+        # for each Sum, where its part of the tables below starts; they map
+        # an index into the Sum to a child slot and the index into it
+        self.sum_start = array.array('l')
+        self.sum_slot = array.array('l')
+        self.sum_index = array.array('l')
+        self._minscanlen = mat.minscanlen()
+        self._add(mat)
+
+    def _add(self, mat):
+        n = len(self.kinds)
+        self.items.append(getattr(mat, 'item', None))
+        self.sizes.append(mat.size())
+        self.child_start.append(0)
+        self.child_count.append(0)
+        self.sum_start.append(0)
+        if isinstance(mat, Cycle):
+            self.kinds.append(_CYCLE)
+            submats = [(None, mat.mat)]
+        elif isinstance(mat, Product):
+            self.kinds.append(_PRODUCT)
+            submats = mat.submats
+        elif isinstance(mat, Sum):
+            self.kinds.append(_SUM)
+            submats = mat._submats
+            slots = dict((id(submat), j)
+                         for j, (_, submat) in enumerate(submats))
+            self.sum_start[n] = len(self.sum_slot)
+            for i in range(mat.size()):
+                si, submat = mat._i_to_sis[i]
+                self.sum_slot.append(slots[id(submat)])
+                self.sum_index.append(si)
+        elif isinstance(mat, Concat):
+            self.kinds.append(_BASE)
+            self.items[n] = mat.index(0)
+            return n
+        else:
+            self.kinds.append(_BASE)
+            return n
+
+        child_ids = [self._add(child_mat) for _, child_mat in submats]
+        self.child_start[n] = len(self.children)
+        self.child_count[n] = len(child_ids)
+        for j, child in enumerate(child_ids):
+            self.children.append(child)
+            lsize = cycles = clen = 0
+            if isinstance(mat, Product) and j < len(child_ids) - 1:
+                lsize = submats[j][1].size()
+                rsize = submats[j][0]
+                cycles = gcd(rsize, lsize)
+                clen = (rsize * lsize) // cycles
+            self.lsizes.append(lsize)
+            self.cycles.append(cycles)
+            self.clens.append(clen)
+        return n
+
+    def size(self):
+        return self.sizes[0]
+
+    def minscanlen(self):
+        return self._minscanlen
+
+    def tostr(self, depth):
+        return '\t'*depth + "Compiled({nodes} nodes, size {size})\n".format(
+            nodes=len(self.kinds), size=self.size())
+
+    def _choose(self, n, i):
+        """
+        Return a list of (child, index into child) pairs for index i of the
+        Cycle, Sum or Product node n
+        """
+        start = self.child_start[n]
+        kind = self.kinds[n]
+        if kind == _CYCLE:
+            child = self.children[start]
+            return [(child, i % self.sizes[child])]
+        if kind == _SUM:
+            pos = self.sum_start[n] + i % self.sizes[n]
+            return [(self.children[start + self.sum_slot[pos]],
+                     self.sum_index[pos])]
+        last = start + self.child_count[n] - 1
+        chosen = []
+        for j in xrange(start, last):
+            off = (i // self.clens[j]) % self.cycles[j]
+            chosen.append((self.children[j], (i - off) % self.lsizes[j]))
+        chosen.append((self.children[last], i))
+        return chosen
+
+    def _index(self, n, i, memo):
+        kind = self.kinds[n]
+        if kind == _BASE:
+            return self.items[n]
+        if memo is not None:
+            key = (n, i % self.sizes[n])
+            if key in memo:
+                return memo[key]
+        chosen = [self._index(child, child_i, memo)
+                  for child, child_i in self._choose(n, i)]
+        if kind == _CYCLE:
+            result = chosen[0]
+        elif kind == _SUM:
+            result = (self.items[n], chosen[0])
+        else:
+            result = (self.items[n], frozenset(chosen))
+        if memo is not None:
+            memo[key] = result
+        return result
+
+    def index(self, i):
+        return self._index(0, i, None)
+
+    def index_many(self, indexes):
+        """
+        Return [self.index(i) for i in indexes], computing the result for
+        each subtree and index into it only once
+        """
+        memo = dict()
+        return [self._index(0, i, memo) for i in indexes]
+
+    def index_range(self, start, stop):
+        return self.index_many(xrange(start, stop))
+
+    def leaves(self, i, n=0):
+        """
+        Return the nodes whose items index i includes as is: the Base and
+        Concat nodes it chooses
+        """
+        if self.kinds[n] == _BASE:
+            return [n]
+        found = []
+        for child, child_i in self._choose(n, i):
+            found.extend(self.leaves(child_i, child))
+        return found
+
+    def leaf_paths(self, path, joinf=os.path.join):
+        """
+        Return a dict mapping each Base and Concat node to the paths of the
+        fragments it stands for, as generate_paths() would give them
+        """
+        paths = dict()
+        pending = [(0, path)]
+        while pending:
+            n, prefix = pending.pop()
+            kind = self.kinds[n]
+            if kind == _BASE:
+                paths[n] = generate_paths(prefix, self.items[n], joinf)
+                continue
+            if kind != _CYCLE:
+                prefix = joinf(prefix, self.items[n])
+            start = self.child_start[n]
+            for j in xrange(start, start + self.child_count[n]):
+                pending.append((self.children[j], prefix))
+        return paths
+
+
+def compile_matrix(mat):
+    """
+    Return a CompiledMatrix for mat
+    """
+    return CompiledMatrix(mat)
@@ -327,40 +327,17 @@ class Run(object):
     def collect_jobs(self, arch, configs, newest=False):
         jobs_to_schedule = []
         jobs_missing_packages = []
+        fragment_filter = util.FragmentFilter(self.args.filter_in,
+                                              self.args.filter_out)
         for description, fragment_paths in configs:
-            base_frag_paths = [
-                util.strip_fragment_path(x) for x in fragment_paths
-            ]
             limit = self.args.limit
             if limit > 0 and len(jobs_to_schedule) >= limit:
                 log.info(
                     'Stopped after {limit} jobs due to --limit={limit}'.format(
                         limit=limit))
                 break
-            # Break apart the filter parameter (one string) into comma
-            # separated components to be used in searches.
-            filter_in = self.args.filter_in
-            if filter_in:
-                if not any([x in description for x in filter_in]):
-                    all_filt = []
-                    for filt_samp in filter_in:
-                        all_filt.extend(
-                            [x.find(filt_samp) < 0 for x in base_frag_paths]
-                        )
-                    if all(all_filt):
-                        continue
-            filter_out = self.args.filter_out
-            if filter_out:
-                if any([x in description for x in filter_out]):
-                    continue
-                all_filt_val = False
-                for filt_samp in filter_out:
-                    flist = [filt_samp in x for x in base_frag_paths]
-                    if any(flist):
-                        all_filt_val = True
-                        continue
-                if all_filt_val:
-                    continue
+            if not fragment_filter.wants(description, fragment_paths):
+                continue
 
             raw_yaml = '\n'.join([file(a, 'r').read() for a in fragment_paths])
 
@@ -471,12 +448,21 @@ class Run(object):
             self.base_config.suite.replace(':', '/'),
         ))
         log.debug('Suite %s in %s' % (suite_name, suite_path))
+        fragment_filter = util.FragmentFilter(self.args.filter_in,
+                                              self.args.filter_out)
         configs = [
             (combine_path(suite_name, item[0]), item[1]) for item in
-            build_matrix(suite_path, subset=self.args.subset)
+            build_matrix(suite_path, subset=self.args.subset,
+                         fragment_filter=fragment_filter)
         ]
-        log.info('Suite %s in %s generated %d jobs (not yet filtered)' % (
-            suite_name, suite_path, len(configs)))
+        pruned = fragment_filter.pruned
+        if pruned:
+            log.info('Suite %s in %s generated %d jobs; filters pruned %d '
+                     'more without generating them' % (
+                         suite_name, suite_path, len(configs), pruned))
+        else:
+            log.info('Suite %s in %s generated %d jobs (not yet filtered)' % (
+                suite_name, suite_path, len(configs)))
 
         if self.args.dry_run:
             log.debug("Base job config:\n%s" % self.base_config)
@@ -533,8 +519,8 @@ class Run(object):
             (suite_name, suite_path, count)
         )
         log.info('%d/%d jobs were filtered out.',
-                 (len(configs) - count),
-                 len(configs))
+                 (len(configs) + pruned - count),
+                 len(configs) + pruned)
         if missing_count:
             log.warn('Scheduled %d/%d jobs that are missing packages!',
                      missing_count, count)
@@ -1,8 +1,13 @@
+import os
 import random
+import shutil
+import tempfile
 
 from mock import patch, MagicMock
 
-from teuthology.suite import build_matrix
+from teuthology.benchmark import fixtures
+from teuthology.suite import build_matrix, matrix
+from teuthology.suite.util import FragmentFilter
 from teuthology.test.fake_fs import make_fake_fstools
 
 
@@ -505,3 +510,71 @@ class TestSubset(object):
             dlist, mat, first, matlimit = self.generate_description_list(tree, subset)
             self.verify_facets(tree, dlist, subset, mat, first, matlimit)
             self.stop_patchers()
+
+
+class TestMatrixCache(object):
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.suite = os.path.join(self.tmpdir, 'suite')
+        os.makedirs(os.path.join(self.suite, 'a'))
+        for path in ('%', 'a/x.yaml', 'a/y.yaml', 'b.yaml'):
+            open(os.path.join(self.suite, path), 'w').close()
+        build_matrix.clear_matrix_cache()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+        build_matrix.clear_matrix_cache()
+
+    def test_reused(self):
+        mat = build_matrix._get_matrix(self.suite)[0]
+        assert isinstance(mat, matrix.CompiledMatrix)
+        assert build_matrix._get_matrix(self.suite)[0] is mat
+        assert build_matrix._get_matrix(self.suite, (0, 2))[0] is not mat
+
+    def test_invalidated(self):
+        mat = build_matrix._get_matrix(self.suite)[0]
+        assert mat.size() == 2
+        open(os.path.join(self.suite, 'a', 'z.yaml'), 'w').close()
+        # directory mtimes may not have moved on yet
+        past = os.path.getmtime(self.suite) - 10
+        os.utime(os.path.join(self.suite, 'a'), (past, past))
+        mat = build_matrix._get_matrix(self.suite)[0]
+        assert mat.size() == 3
+        assert [desc for desc, _ in build_matrix.build_matrix(self.suite)] \
+            == ['{a/x.yaml b.yaml}', '{a/y.yaml b.yaml}',
+                '{a/z.yaml b.yaml}']
+
+
+class TestFilterPushdown(object):
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.suite = fixtures.make_suite_tree(self.tmpdir, 1)
+        build_matrix.clear_matrix_cache()
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+        build_matrix.clear_matrix_cache()
+
+    def check(self, filter_in=None, filter_out=None, subset=None):
+        fragment_filter = FragmentFilter(filter_in, filter_out)
+        assert fragment_filter.can_prune
+        everything = build_matrix.build_matrix(self.suite, subset)
+        expected = [(desc, paths) for desc, paths in everything
+                    if fragment_filter.wants(desc, paths)]
+        assert 0 < len(expected) < len(everything)
+        result = build_matrix.build_matrix(self.suite, subset,
+                                           fragment_filter)
+        assert result == expected
+        assert fragment_filter.pruned == len(everything) - len(expected)
+
+    def test_filter_in(self):
+        self.check(['facet0/choice1', 'part2'])
+
+    def test_filter_out(self):
+        self.check(None, ['facet2/choice0', 'concat'])
+
+    def test_both(self):
+        self.check(['choice1'], ['facet3/choice1'])
+
+    def test_subset(self):
+        self.check(['facet1/choice2'], ['part0'], subset=(2, 5))
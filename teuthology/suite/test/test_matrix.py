@@ -72,3 +72,52 @@ class TestMatrix(object):
                             mbs(5, range(4))])
                     ]
                 ))
+
+
+def verify_compiled_matrix(mat):
+    """
+    Verifies that compiling mat gives the same results from index() and
+    index_range() as mat itself
+    """
+    compiled = matrix.compile_matrix(mat)
+    assert compiled.size() == mat.size()
+    assert compiled.minscanlen() == mat.minscanlen()
+    expected = [mat.index(i) for i in range(mat.size() * 2)]
+    assert [compiled.index(i) for i in range(mat.size() * 2)] == expected
+    assert compiled.index_range(0, mat.size() * 2) == expected
+    assert compiled.index_range(3, 5) == expected[3:5]
+
+
+class TestCompiledMatrix(object):
+    def test_sum(self):
+        verify_compiled_matrix(mbs(1, range(6)))
+
+    def test_product(self):
+        verify_compiled_matrix(matrix.Product(1, [
+            mbs(1, range(2)),
+            mbs(2, range(5)),
+            mbs(4, range(4)),
+            ]))
+
+    def test_product_single(self):
+        verify_compiled_matrix(matrix.Product(1, [mbs(1, range(3))]))
+
+    def test_product_with_sum(self):
+        verify_compiled_matrix(matrix.Sum(9, [
+            mbs(10, range(6)),
+            matrix.Product(1, [
+                mbs(1, range(2)),
+                mbs(2, range(6)),
+                mbs(4, range(4))]),
+            matrix.Product(8, [
+                mbs(7, range(2)),
+                matrix.Product(6, [mbs(6, range(3)), mbs(5, range(4))])]),
+            ]))
+
+    def test_cycle_and_concat(self):
+        concat = matrix.Concat(3, [mbs(3, range(2)), matrix.Base(301)])
+        verify_compiled_matrix(matrix.Cycle(3, matrix.Product(1, [
+            mbs(1, range(3)),
+            mbs(2, range(2)),
+            concat,
+            ])))
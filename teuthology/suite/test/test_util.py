@@ -5,6 +5,7 @@ import tempfile
 from copy import deepcopy
 from mock import Mock, patch
 
+from teuthology import packaging
 from teuthology.config import config
 from teuthology.orchestra.opsys import OS
 from teuthology.suite import util
@@ -48,8 +49,9 @@ def git_repository(request):
 class TestUtil(object):
     def setup(self):
         config.use_shaman = False
+        packaging._build_cache.clear()
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_hash_success(self, m_get):
         mock_resp = Mock()
         mock_resp.ok = True
@@ -58,7 +60,7 @@ class TestUtil(object):
         result = util.get_gitbuilder_hash()
         assert result == "the_hash"
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_get_hash_fail(self, m_get):
         mock_resp = Mock()
         mock_resp.ok = False
@@ -66,7 +68,7 @@ class TestUtil(object):
         result = util.get_gitbuilder_hash()
         assert result is None
 
-    @patch('requests.get')
+    @patch('requests.Session.get')
     def test_package_version_for_hash(self, m_get):
         mock_resp = Mock()
         mock_resp.ok = True
@@ -140,6 +142,33 @@ class TestUtil(object):
         assert parent_sha1 == 'sha1_p'
 
 
+class TestFragmentFilter(object):
+    paths = ['/qa/suites/rados/basic/clusters/fixed-2.yaml',
+             '/qa/suites/rados/basic/tasks/rados_api.yaml']
+    description = 'rados/basic/{clusters/fixed-2.yaml tasks/rados_api.yaml}'
+
+    def test_wants(self):
+        f = util.FragmentFilter(['fixed-2', 'nothing'], ['ec-pool'])
+        assert f.can_prune
+        assert f.wants(self.description, self.paths)
+        assert not util.FragmentFilter(['qa']).wants(self.description,
+                                                     self.paths)
+        assert not util.FragmentFilter(None, ['api']).wants(
+            self.description, self.paths)
+        assert util.FragmentFilter().wants(self.description, self.paths)
+
+    def test_description_only(self):
+        f = util.FragmentFilter(['yaml tasks'])
+        assert not f.can_prune
+        assert f.wants(self.description, self.paths)
+        assert f.check_fragments(self.paths) == (False, False)
+
+    def test_check_fragments(self):
+        f = util.FragmentFilter(['basic/tasks'], ['fixed'])
+        assert f.check_fragments(self.paths[:1]) == (False, True)
+        assert f.check_fragments(self.paths[1:]) == (True, False)
+
+
 class TestFlavor(object):
 
     def test_get_install_task_flavor_bare(self):
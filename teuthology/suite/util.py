@@ -1,6 +1,7 @@
 import copy
 import logging
 import os
+import re
 import requests
 import smtplib
 import socket
@@ -295,6 +296,67 @@ def strip_fragment_path(original_path):
     return original_path
 
 
+def _keyword_regex(keywords):
+    if not keywords:
+        return None
+    return re.compile('|'.join(re.escape(k) for k in keywords))
+
+
+class FragmentFilter(object):
+    """
+    Decides which jobs --filter and --filter-out leave in a suite run
+
+    A job is kept if its description or one of its fragment paths (with the
+    text up to '/suites/' removed) contains a --filter keyword, and none of
+    them contains a --filter-out keyword. Each list of keywords is compiled
+    into a single regular expression.
+
+    Every run of text in a description which has no braces or spaces in it
+    also appears in one of the job's fragment paths, so as long as no
+    keyword has any of those (or a colon, which suite names use in place of
+    a slash) the fragments alone decide whether a job is kept. build_matrix
+    uses that to drop jobs before generating them, counting them in
+    self.pruned.
+    """
+    _UNPRUNABLE = frozenset('{} :')
+
+    def __init__(self, filter_in=None, filter_out=None):
+        self.filter_in = _keyword_regex(filter_in)
+        self.filter_out = _keyword_regex(filter_out)
+        keywords = list(filter_in or []) + list(filter_out or [])
+        self.can_prune = bool(keywords) and not any(
+            self._UNPRUNABLE.intersection(k) for k in keywords)
+        self.pruned = 0
+
+    def _search(self, regex, description, fragment_paths):
+        if regex.search(description):
+            return True
+        return any(regex.search(strip_fragment_path(path))
+                   for path in fragment_paths)
+
+    def wants(self, description, fragment_paths):
+        """
+        :returns: True if the job should be kept
+        """
+        if self.filter_in is not None and not self._search(
+                self.filter_in, description, fragment_paths):
+            return False
+        if self.filter_out is not None and self._search(
+                self.filter_out, description, fragment_paths):
+            return False
+        return True
+
+    def check_fragments(self, fragment_paths):
+        """
+        :returns: A tuple of whether any of fragment_paths matches --filter,
+                  and whether any matches --filter-out
+        """
+        return (self.filter_in is not None and
+                self._search(self.filter_in, '', fragment_paths),
+                self.filter_out is not None and
+                self._search(self.filter_out, '', fragment_paths))
+
+
 def get_install_task_flavor(job_config):
     """
     Pokes through the install task's configuration (including its overrides) to
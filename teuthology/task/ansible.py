@@ -3,15 +3,19 @@ import logging
 import requests
 import os
 import pexpect
+import pipes
 import yaml
 import shutil
+import subprocess
 
 from cStringIO import StringIO
-from tempfile import NamedTemporaryFile
+from tempfile import NamedTemporaryFile, mkdtemp
 
 from teuthology.config import config as teuth_config
 from teuthology.exceptions import CommandFailedError, AnsibleFailedError
 from teuthology.job_status import set_status
+from teuthology.misc import sh
+from teuthology.parallel import parallel
 from teuthology.repo_utils import fetch_repo
 
 from . import Task
@@ -72,6 +76,10 @@ class Ansible(Task):
                     ansible-playbook completes. This is in case the playbook
                     makes changes to the SSH configuration, or user accounts -
                     we would want to reflect those changes immediately.
+        fact_cache_ttl: How long, in seconds, the facts gathered about a host
+                    are reused for, by this and later jobs; defaults to
+                    ansible_fact_cache_ttl in the teuthology config. 0
+                    disables the fact cache.
 
     Examples:
 
@@ -109,6 +117,7 @@ class Ansible(Task):
         self.log = log
         self.generated_inventory = False
         self.generated_playbook = False
+        self.control_path_dir = None
 
     def setup(self):
         super(Ansible, self).setup()
@@ -248,6 +257,9 @@ class Ansible(Task):
         environ['ANSIBLE_FAILURE_LOG'] = self.failure_log.name
         environ['ANSIBLE_ROLES_PATH'] = "%s/roles" % self.repo_path
         environ['ANSIBLE_NOCOLOR'] = "1"
+        environ.update(self._ssh_environ())
+        environ.update(self._fact_cache_environ())
+        environ.update(self._timing_environ())
         args = self._build_args()
         command = ' '.join(args)
         log.debug("Running %s", command)
@@ -266,8 +278,64 @@ class Ansible(Task):
         if self.config.get('reconnect', True) is True:
             remotes = self.cluster.remotes.keys()
             log.debug("Reconnecting to %s", remotes)
-            for remote in remotes:
-                remote.reconnect()
+            with parallel() as p:
+                for remote in remotes:
+                    p.spawn(remote.reconnect)
+
+    def _ssh_environ(self):
+        """
+        Share one SSH connection per host between the tasks of the playbook,
+        and between the playbook and its cleanup, through master sockets
+        that belong to this job only.
+
+        ControlMaster and ControlPersist are left to ssh_args, so that
+        whatever the playbook repo's ansible.cfg sets still applies;
+        ansible's default ssh_args enable both.
+        """
+        if self.control_path_dir is None:
+            self.control_path_dir = mkdtemp(prefix='teuth_ansible_cp_')
+        return {
+            'ANSIBLE_SSH_CONTROL_PATH_DIR': self.control_path_dir,
+            # %(directory)s is ANSIBLE_SSH_CONTROL_PATH_DIR; keep the path
+            # short, as sockets paths are limited to about 100 characters
+            'ANSIBLE_SSH_CONTROL_PATH': '%(directory)s/%%h-%%r',
+        }
+
+    def _fact_cache_environ(self):
+        """
+        Keep the facts gathered about each host in a JSON file, and gather
+        them again only once they are older than fact_cache_ttl. Facts are
+        kept apart per OS, since nodes are reimaged between jobs.
+        """
+        ttl = self.config.get('fact_cache_ttl',
+                              teuth_config.ansible_fact_cache_ttl)
+        if not ttl:
+            return {'ANSIBLE_GATHERING': 'implicit'}
+        os_type = self.ctx.config.get('os_type')
+        os_version = self.ctx.config.get('os_version')
+        if os_type and os_version:
+            subdir = '{0}-{1}'.format(os_type, os_version)
+        else:
+            subdir = 'default'
+        return {
+            'ANSIBLE_GATHERING': 'smart',
+            'ANSIBLE_CACHE_PLUGIN': 'jsonfile',
+            'ANSIBLE_CACHE_PLUGIN_CONNECTION': os.path.join(
+                os.path.expanduser(teuth_config.ansible_fact_cache),
+                subdir),
+            'ANSIBLE_CACHE_PLUGIN_TIMEOUT': str(ttl),
+        }
+
+    def _timing_environ(self):
+        """
+        Have ansible report how long each task took, and log everything it
+        shows to ansible.log in the archive
+        """
+        environ = {'ANSIBLE_CALLBACK_WHITELIST': 'profile_tasks'}
+        archive = getattr(self.ctx, 'archive', None)
+        if archive:
+            environ['ANSIBLE_LOG_PATH'] = os.path.join(archive, 'ansible.log')
+        return environ
 
     def _handle_failure(self, command, status):
         self._set_status('dead')
@@ -333,8 +401,27 @@ class Ansible(Task):
             os.remove(self.inventory)
         if self.generated_playbook:
             os.remove(self.playbook_file.name)
+        if self.control_path_dir is not None:
+            self._stop_ssh_masters()
+            shutil.rmtree(self.control_path_dir, ignore_errors=True)
         super(Ansible, self).teardown()
 
+    def _stop_ssh_masters(self):
+        """
+        Ask the SSH master connections still persisting after the playbook
+        to exit, rather than leave them behind without their sockets
+        """
+        for name in os.listdir(self.control_path_dir):
+            socket_path = os.path.join(self.control_path_dir, name)
+            # the socket names are <host>-<user>; ssh wants some host name
+            host = name.rsplit('-', 1)[0]
+            try:
+                sh('ssh -O exit -o ControlPath=%s %s' % (
+                    pipes.quote(socket_path), pipes.quote(host)))
+            except subprocess.CalledProcessError:
+                log.debug("Could not stop the SSH master connection to %s",
+                          host)
+
     def _cleanup(self):
         """
         If the ``cleanup`` key exists in config the same playbook will be
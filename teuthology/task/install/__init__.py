@@ -106,6 +106,8 @@ def install_packages(ctx, pkgs, config):
         "deb": deb._update_package_list_and_install,
         "rpm": rpm._update_package_list_and_install,
     }
+    packaging.warm_build_cache(config.get('project', 'ceph'), config, ctx,
+                               ctx.cluster.remotes.keys())
     with parallel() as p:
         for remote in ctx.cluster.remotes.iterkeys():
             system_type = teuthology.get_system_type(remote)
@@ -5,11 +5,13 @@ the calls are made from other modules, most notably teuthology/run.py
 """
 from cStringIO import StringIO
 import contextlib
+import gevent.event
 import logging
 import os
+import shutil
+import tempfile
 import time
 import yaml
-import subprocess
 
 from teuthology import lock
 from teuthology import misc
@@ -19,6 +21,9 @@ from teuthology.config import config as teuth_config
 from teuthology.exceptions import VersionNotFoundError
 from teuthology.job_status import get_status, set_status
 from teuthology.orchestra import cluster, remote, run
+from teuthology.parallel import parallel
+from teuthology.task.internal import elfcore
+from teuthology.task.internal.syslog import check_archived_logs
 
 log = logging.getLogger(__name__)
 
@@ -130,9 +135,26 @@ def timer(ctx, config):
         ctx.summary['duration'] = duration
 
 
+def get_local_root(ctx):
+    """
+    The directory under which each LocalRemote of a job using the 'local'
+    transport gets its own root directory
+    """
+    local_root = ctx.config.get('local_root')
+    if local_root:
+        return local_root
+    if ctx.archive is not None:
+        return os.path.join(ctx.archive, 'local')
+    return tempfile.mkdtemp(prefix='teuthology-local-')
+
+
 def add_remotes(ctx, config):
     """
     Create a ctx.cluster object populated with remotes mapped to roles
+
+    If the job config sets 'transport: local', every target is a LocalRemote
+    running commands on this host, each with its own directory below
+    'local_root'.
     """
     ctx.cluster = cluster.Cluster()
     # Allow jobs to run without using nodes, for self-testing
@@ -142,6 +164,12 @@ def add_remotes(ctx, config):
     machs = []
     for name in ctx.config['targets'].iterkeys():
         machs.append(name)
+    transport = ctx.config.get('transport', 'ssh')
+    if transport == 'local':
+        local_root = get_local_root(ctx)
+        log.info('Using the local transport under %s', local_root)
+    elif transport != 'ssh':
+        raise ValueError("Unknown transport: {0}".format(transport))
     for t, key in ctx.config['targets'].iteritems():
         t = misc.canonicalize_hostname(t)
         try:
@@ -149,7 +177,14 @@ def add_remotes(ctx, config):
                 key = None
         except (AttributeError, KeyError):
             pass
-        rem = remote.Remote(name=t, host_key=key, keep_alive=True)
+        if transport == 'local':
+            rem = remote.LocalRemote(
+                name=t,
+                root=os.path.join(local_root,
+                                  misc.decanonicalize_hostname(t)),
+            )
+        else:
+            rem = remote.Remote(name=t, host_key=key, keep_alive=True)
         remotes.append(rem)
     if 'roles' in ctx.config:
         for rem, roles in zip(remotes, ctx.config['roles']):
@@ -178,6 +213,8 @@ def push_inventory(ctx, config):
 
     def push():
         for rem in ctx.cluster.remotes.keys():
+            if isinstance(rem, remote.LocalRemote):
+                continue
             info = rem.inventory_info
             lock.update_inventory(info)
     try:
@@ -290,43 +327,108 @@ def check_conflict(ctx, config):
         raise RuntimeError('Stale jobs detected, aborting.')
 
 
-def fetch_binaries_for_coredumps(path, remote):
+def _fetch_shared(remote, remote_path, local_path, sha1, shared):
     """
-    Pul ELFs (debug and stripped) for each coredump found
+    Fetch a file unless a file with the same checksum was already fetched,
+    possibly from another remote; in that case hardlink to it instead.
     """
-    # Check for Coredumps:
-    coredump_path = os.path.join(path, 'coredump')
-    if os.path.isdir(coredump_path):
-        log.info('Transferring binaries for coredumps...')
-        for dump in os.listdir(coredump_path):
-            # Pull program from core file
-            dump_path = os.path.join(coredump_path, dump)
-            dump_info = subprocess.Popen(['file', dump_path],
-                                         stdout=subprocess.PIPE)
-            dump_out = dump_info.communicate()
-
-            # Parse file output to get program, Example output:
-            # 1422917770.7450.core: ELF 64-bit LSB core file x86-64, version 1 (SYSV), SVR4-style, \
-            # from 'radosgw --rgw-socket-path /home/ubuntu/cephtest/apache/tmp.client.0/fastcgi_soc'
-            dump_program = dump_out.split("from '")[1].split(' ')[0]
+    if sha1 in shared:
+        existing = shared[sha1].get()
+        if existing:
+            log.debug('%s:%s is identical to %s; linking',
+                      remote.shortname, remote_path, existing)
+            try:
+                os.link(existing, local_path)
+            except OSError:
+                shutil.copyfile(existing, local_path)
+            return
+    result = shared[sha1] = gevent.event.AsyncResult()
+    try:
+        remote._sftp_get_file(remote_path, local_path)
+    except Exception:
+        result.set(None)
+        raise
+    result.set(local_path)
 
-            # Find path on remote server:
-            r = remote.run(args=['which', dump_program], stdout=StringIO())
-            remote_path = r.stdout.getvalue()
 
-            # Pull remote program into coredump folder:
-            remote._sftp_get_file(remote_path, os.path.join(coredump_path,
-                                                            dump_program))
+def fetch_binaries_for_coredumps(path, remote, shared=None):
+    """
+    Pull ELFs (debug and stripped) for each program that dumped core
 
-            # Pull Debug symbols:
-            debug_path = os.path.join('/usr/lib/debug', remote_path)
+    Each program is fetched once per remote no matter how many cores it
+    dumped, and the files are transferred concurrently.
 
-            # RPM distro's append their non-stripped ELF's with .debug
-            # When deb based distro's do not.
-            if remote.system_type == 'rpm':
-                debug_path = '{debug_path}.debug'.format(debug_path=debug_path)
+    :param path:   The local archive directory of the remote
+    :param remote: The remote the cores came from
+    :param shared: A dict shared between calls for different remotes, used to
+                   hardlink files which are identical across remotes instead
+                   of transferring them again
+    """
+    if shared is None:
+        shared = dict()
+    # Check for Coredumps:
+    coredump_path = os.path.join(path, 'coredump')
+    if not os.path.isdir(coredump_path):
+        return
+    programs = set()
+    for dump in os.listdir(coredump_path):
+        dump_path = os.path.join(coredump_path, dump)
+        if not os.path.isfile(dump_path):
+            continue
+        try:
+            programs.add(elfcore.get_core_program(dump_path))
+        except (elfcore.NotACoreError, IOError):
+            log.warning('Could not find the program that dumped %s',
+                        dump_path)
+    if not programs:
+        return
+    log.info('Transferring binaries for coredumps of %s...',
+             ', '.join(sorted(programs)))
+
+    # RPM distro's append their non-stripped ELF's with .debug
+    # When deb based distro's do not.
+    debug_suffix = '.debug' if remote.system_type == 'rpm' else ''
+    # (remote path, local path) for each binary and debug file
+    files = list()
+    for program in sorted(programs):
+        remote_path = program
+        if not remote_path.startswith('/'):
+            # Find path on remote server:
+            r = remote.run(args=['which', program], stdout=StringIO(),
+                           check_status=False)
+            remote_path = r.stdout.getvalue().strip()
+            if not remote_path:
+                log.warning('Could not find %s on %s', program,
+                            remote.shortname)
+                continue
+        name = os.path.basename(remote_path)
+        files.append((remote_path, os.path.join(coredump_path, name)))
+        files.append((
+            '/usr/lib/debug' + remote_path + debug_suffix,
+            os.path.join(coredump_path, name + '.debug'),
+        ))
+
+    # Checksum everything in one go; missing files, e.g. when no debug
+    # package is installed, are left out of the output
+    r = remote.run(
+        args=['sha1sum', '--'] + [src for src, _ in files],
+        stdout=StringIO(),
+        stderr=StringIO(),
+        check_status=False,
+    )
+    sums = dict()
+    for line in r.stdout.getvalue().splitlines():
+        sha1, remote_path = line.split(None, 1)
+        sums[remote_path] = sha1
 
-            remote.get_file(debug_path, coredump_path)
+    with parallel() as p:
+        for remote_path, local_path in files:
+            if remote_path not in sums:
+                log.warning('%s not found on %s', remote_path,
+                            remote.shortname)
+                continue
+            p.spawn(_fetch_shared, remote, remote_path, local_path,
+                    sums[remote_path], shared)
 
 
 @contextlib.contextmanager
@@ -357,11 +459,15 @@ def archive(ctx, config):
             logdir = os.path.join(ctx.archive, 'remote')
             if (not os.path.exists(logdir)):
                 os.mkdir(logdir)
-            for rem in ctx.cluster.remotes.iterkeys():
-                path = os.path.join(logdir, rem.shortname)
-                misc.pull_directory(rem, archive_dir, path)
-                # Check for coredumps and pull binaries
-                fetch_binaries_for_coredumps(path, rem)
+            shared = dict()
+            with parallel() as p:
+                for rem in ctx.cluster.remotes.iterkeys():
+                    path = os.path.join(logdir, rem.shortname)
+                    misc.pull_directory(rem, archive_dir, path,
+                                        codec=ctx.config.get('archive_codec'))
+                    # Check for coredumps and pull binaries
+                    p.spawn(fetch_binaries_for_coredumps, path, rem, shared)
+            check_archived_logs(ctx)
 
         log.info('Removing archive directory...')
         run.wait(
@@ -0,0 +1,119 @@
+"""
+Minimal parsing of ELF core files, so that coredump collection does not need
+to run file(1) on every core.
+"""
+import struct
+
+ELFMAG = '\x7fELF'
+ELFCLASS32 = 1
+ELFCLASS64 = 2
+ELFDATA2LSB = 1
+ELFDATA2MSB = 2
+ET_CORE = 4
+PT_NOTE = 4
+NT_PRPSINFO = 3
+
+# Offsets and lengths of pr_fname and pr_psargs within struct elf_prpsinfo
+PRPSINFO_LAYOUT = {
+    ELFCLASS32: dict(fname=28, psargs=44),
+    ELFCLASS64: dict(fname=40, psargs=56),
+}
+FNAME_LEN = 16
+PSARGS_LEN = 80
+
+
+class NotACoreError(ValueError):
+    pass
+
+
+def _read_at(f, offset, size):
+    f.seek(offset)
+    data = f.read(size)
+    if len(data) != size:
+        raise NotACoreError("Truncated ELF file")
+    return data
+
+
+def _align4(n):
+    return (n + 3) & ~3
+
+
+def read_prpsinfo(f):
+    """
+    Find the NT_PRPSINFO note of an ELF core file
+
+    :param f: A file object opened in binary mode
+    :returns: A dict with the keys 'fname' (the executable's name, truncated
+              to 15 characters by the kernel) and 'psargs' (the start of its
+              command line)
+    """
+    ident = _read_at(f, 0, 16)
+    if ident[:4] != ELFMAG:
+        raise NotACoreError("Not an ELF file")
+    elf_class = ord(ident[4])
+    if elf_class not in PRPSINFO_LAYOUT:
+        raise NotACoreError("Unknown ELF class %d" % elf_class)
+    endian = {ELFDATA2LSB: '<', ELFDATA2MSB: '>'}.get(ord(ident[5]))
+    if endian is None:
+        raise NotACoreError("Unknown ELF data encoding")
+
+    if elf_class == ELFCLASS64:
+        (e_type, e_phoff, e_phentsize, e_phnum) = (
+            struct.unpack(endian + 'H', _read_at(f, 16, 2))[0],
+            struct.unpack(endian + 'Q', _read_at(f, 32, 8))[0],
+            struct.unpack(endian + 'H', _read_at(f, 54, 2))[0],
+            struct.unpack(endian + 'H', _read_at(f, 56, 2))[0],
+        )
+        phdr_fmt = endian + 'IIQQQQQQ'
+    else:
+        (e_type, e_phoff, e_phentsize, e_phnum) = (
+            struct.unpack(endian + 'H', _read_at(f, 16, 2))[0],
+            struct.unpack(endian + 'I', _read_at(f, 28, 4))[0],
+            struct.unpack(endian + 'H', _read_at(f, 42, 2))[0],
+            struct.unpack(endian + 'H', _read_at(f, 44, 2))[0],
+        )
+        phdr_fmt = endian + 'IIIIIIII'
+    if e_type != ET_CORE:
+        raise NotACoreError("Not a core file")
+
+    phdr_size = struct.calcsize(phdr_fmt)
+    for i in range(e_phnum):
+        phdr = struct.unpack(
+            phdr_fmt, _read_at(f, e_phoff + i * e_phentsize, phdr_size))
+        if elf_class == ELFCLASS64:
+            (p_type, _, p_offset, _, _, p_filesz, _, _) = phdr
+        else:
+            (p_type, p_offset, _, _, p_filesz, _, _, _) = phdr
+        if p_type != PT_NOTE:
+            continue
+        notes = _read_at(f, p_offset, p_filesz)
+        pos = 0
+        while pos + 12 <= len(notes):
+            namesz, descsz, n_type = struct.unpack(
+                endian + 'III', notes[pos:pos + 12])
+            pos += 12
+            name = notes[pos:pos + namesz].rstrip('\0')
+            pos += _align4(namesz)
+            desc = notes[pos:pos + descsz]
+            pos += _align4(descsz)
+            if n_type == NT_PRPSINFO and name == 'CORE':
+                layout = PRPSINFO_LAYOUT[elf_class]
+                fname = desc[layout['fname']:layout['fname'] + FNAME_LEN]
+                psargs = desc[layout['psargs']:layout['psargs'] + PSARGS_LEN]
+                return dict(
+                    fname=fname.split('\0')[0],
+                    psargs=psargs.split('\0')[0].strip(),
+                )
+    raise NotACoreError("No NT_PRPSINFO note found")
+
+
+def get_core_program(path):
+    """
+    :returns: The program that dumped the core at path, as it was invoked;
+              e.g. 'radosgw' or '/usr/bin/ceph-osd'
+    """
+    with open(path, 'rb') as f:
+        info = read_prpsinfo(f)
+    if info['psargs']:
+        return info['psargs'].split(' ')[0]
+    return info['fname']
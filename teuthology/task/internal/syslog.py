@@ -1,15 +1,197 @@
 import contextlib
+import functools
+import gzip
 import logging
+import os
+import re
 
 from cStringIO import StringIO
 
 from teuthology import misc
 from teuthology.job_status import set_status
 from teuthology.orchestra import run
+from teuthology.parallel import parallel, process_map
 
 
 log = logging.getLogger(__name__)
 
+# Lines in the kernel and misc logs matching this are errors...
+ERROR_PATTERN = r'\bBUG\b|\bINFO\b|\bDEADLOCK\b'
+
+# ...unless they also match one of these. These are extended regular
+# expressions, used both by 'egrep -v' on the remotes and by the re module
+# when scanning archived logs locally. Jobs may add to this list with:
+#
+#   syslog:
+#     ignorelist:
+#       - 'some pattern'
+DEFAULT_IGNORELIST = [
+    'task .* blocked for more than .* seconds',
+    'lockdep is turned off',
+    'trying to register non-static key',
+    'DEBUG: fsize',  # xfs_fsr
+    'CRON',  # ignore cron noise
+    'BUG: bad unlock balance detected',  # #6097
+    'inconsistent lock state',  # FIXME see #2523
+    r'\*\*\* DEADLOCK \*\*\*',  # part of lockdep output
+    # FIXME see #2590 and #147
+    'INFO: possible irq lock inversion dependency detected',
+    r'INFO: NMI handler \(perf_event_nmi_handler\) took too long to run',
+    'INFO: recovery required on readonly',
+    'ceph-create-keys: INFO',
+]
+
+
+def get_syslog_config(ctx):
+    """
+    :returns: The job's 'syslog' config dict, which may contain:
+              ignorelist: patterns to ignore in addition to DEFAULT_IGNORELIST
+              scan:       'remote' (the default) to scan the logs on each
+                          remote before they are archived, or 'local' to
+                          scan the archived copies on the teuthology host
+              processes:  how many processes to use when scanning locally
+    """
+    return ctx.config.get('syslog') or dict()
+
+
+def get_ignorelist(ctx):
+    return DEFAULT_IGNORELIST + \
+        list(get_syslog_config(ctx).get('ignorelist', []))
+
+
+def scan_locally(ctx):
+    """
+    Whether the logs are to be checked after they have been archived. With
+    'archive-on-error', passing jobs' logs are never transferred, so those
+    are always checked on the remotes.
+    """
+    return (get_syslog_config(ctx).get('scan') == 'local' and
+            not ctx.config.get('archive-on-error'))
+
+
+def _record_error(ctx, name, error):
+    log.error('Error in syslog on %s: %s', name, error)
+    set_status(ctx.summary, 'fail')
+    if 'failure_reason' not in ctx.summary:
+        ctx.summary['failure_reason'] = \
+            "'{error}' in syslog".format(error=error)
+
+
+def _check_remote(rem, archive_dir, ignorelist):
+    """
+    :returns: A tuple of the remote's name and the first unexpected error in
+              its logs, or an empty string
+    """
+    log.debug('Checking %s', rem.name)
+    args = [
+        'egrep', '--binary-files=text', ERROR_PATTERN,
+        run.Raw('{adir}/syslog/*.log'.format(adir=archive_dir)),
+    ]
+    if ignorelist:
+        args.extend([run.Raw('|'), 'egrep', '-v'])
+        for pattern in ignorelist:
+            args.extend(['-e', pattern])
+    args.extend([
+        run.Raw('|'),
+        'head', '-n', '1',
+    ])
+    r = rem.run(args=args, stdout=StringIO())
+    return rem.name, r.stdout.getvalue()
+
+
+def check_remote_logs(ctx, archive_dir):
+    """
+    Check every remote's logs, concurrently, on the remotes themselves
+    """
+    ignorelist = get_ignorelist(ctx)
+    with parallel() as p:
+        for rem in ctx.cluster.remotes.iterkeys():
+            p.spawn(_check_remote, rem, archive_dir, ignorelist)
+        results = sorted(p)
+    for name, error in results:
+        if error != '':
+            _record_error(ctx, name, error)
+
+
+def check_archived_logs(ctx):
+    """
+    If the job asked for it, check the archived copies of every remote's logs
+    using a pool of local processes. Called by the archive task once it has
+    transferred the logs.
+    """
+    if ctx.archive is None or not scan_locally(ctx):
+        return
+    log.info('Checking archived syslogs for errors...')
+    paths = dict()
+    for rem in ctx.cluster.remotes.iterkeys():
+        log_dir = os.path.join(ctx.archive, 'remote', rem.shortname, 'syslog')
+        if not os.path.isdir(log_dir):
+            continue
+        for name in sorted(os.listdir(log_dir)):
+            if name.endswith('.log') or name.endswith('.log.gz'):
+                paths[os.path.join(log_dir, name)] = rem.name
+    results = scan_files(
+        sorted(paths.keys()),
+        get_ignorelist(ctx),
+        processes=get_syslog_config(ctx).get('processes'),
+    )
+    reported = set()
+    for path in sorted(results.keys()):
+        name = paths[path]
+        if results[path] and name not in reported:
+            reported.add(name)
+            _record_error(ctx, name, results[path])
+
+
+def compile_patterns(ignorelist):
+    """
+    :returns: A tuple of the compiled error pattern and a single compiled
+              pattern matching any entry of ignorelist, or None
+    """
+    error_re = re.compile(ERROR_PATTERN)
+    ignore_re = None
+    if ignorelist:
+        ignore_re = re.compile(
+            '|'.join('(?:{0})'.format(p) for p in ignorelist))
+    return error_re, ignore_re
+
+
+def scan_file(path, error_re, ignore_re):
+    """
+    :returns: The first line in path, which may be gzipped, matching error_re
+              and not ignore_re, prefixed by the file name like grep does, or
+              an empty string
+    """
+    if path.endswith('.gz'):
+        opener = gzip.open
+    else:
+        opener = open
+    with contextlib.closing(opener(path, 'rb')) as f:
+        for line in f:
+            if not error_re.search(line):
+                continue
+            if ignore_re is not None and ignore_re.search(line):
+                continue
+            name = os.path.basename(path)
+            if name.endswith('.gz'):
+                name = name[:-len('.gz')]
+            return '{0}:{1}'.format(name, line)
+    return ''
+
+
+def scan_files(paths, ignorelist, processes=None):
+    """
+    Scan files for errors, spreading them over a number of processes. The
+    patterns are compiled once, before the workers are forked.
+
+    :returns: A dict mapping each path to the result of scan_file()
+    """
+    error_re, ignore_re = compile_patterns(ignorelist)
+    results = process_map(
+        functools.partial(scan_file, error_re=error_re, ignore_re=ignore_re),
+        paths, processes)
+    return dict(zip(paths, results))
+
 
 @contextlib.contextmanager
 def syslog(ctx, config):
@@ -92,53 +274,9 @@ def syslog(ctx, config):
         # race condition: nothing actually says rsyslog had time to
         # flush the file fully. oh well.
 
-        log.info('Checking logs for errors...')
-        for rem in ctx.cluster.remotes.iterkeys():
-            log.debug('Checking %s', rem.name)
-            r = rem.run(
-                args=[
-                    'egrep', '--binary-files=text',
-                    '\\bBUG\\b|\\bINFO\\b|\\bDEADLOCK\\b',
-                    run.Raw('{adir}/syslog/*.log'.format(adir=archive_dir)),
-                    run.Raw('|'),
-                    'grep', '-v', 'task .* blocked for more than .* seconds',
-                    run.Raw('|'),
-                    'grep', '-v', 'lockdep is turned off',
-                    run.Raw('|'),
-                    'grep', '-v', 'trying to register non-static key',
-                    run.Raw('|'),
-                    'grep', '-v', 'DEBUG: fsize',  # xfs_fsr
-                    run.Raw('|'),
-                    'grep', '-v', 'CRON',  # ignore cron noise
-                    run.Raw('|'),
-                    'grep', '-v', 'BUG: bad unlock balance detected',  # #6097
-                    run.Raw('|'),
-                    'grep', '-v', 'inconsistent lock state',  # FIXME see #2523
-                    run.Raw('|'),
-                    'grep', '-v', '*** DEADLOCK ***',  # part of lockdep output
-                    run.Raw('|'),
-                    'grep', '-v',
-                    # FIXME see #2590 and #147
-                    'INFO: possible irq lock inversion dependency detected',
-                    run.Raw('|'),
-                    'grep', '-v',
-                    'INFO: NMI handler (perf_event_nmi_handler) took too long to run',  # noqa
-                    run.Raw('|'),
-                    'grep', '-v', 'INFO: recovery required on readonly',
-                    run.Raw('|'),
-                    'grep', '-v', 'ceph-create-keys: INFO',
-                    run.Raw('|'),
-                    'head', '-n', '1',
-                ],
-                stdout=StringIO(),
-            )
-            stdout = r.stdout.getvalue()
-            if stdout != '':
-                log.error('Error in syslog on %s: %s', rem.name, stdout)
-                set_status(ctx.summary, 'fail')
-                if 'failure_reason' not in ctx.summary:
-                    ctx.summary['failure_reason'] = \
-                        "'{error}' in syslog".format(error=stdout)
+        if not scan_locally(ctx):
+            log.info('Checking logs for errors...')
+            check_remote_logs(ctx, archive_dir)
 
         log.info('Compressing syslogs...')
         run.wait(
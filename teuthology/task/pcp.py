@@ -1,6 +1,9 @@
 # maybe run pcp role?
+import csv
 import datetime
 import dateutil.tz
+import gevent
+import gevent.pool
 import jinja2
 import logging
 import os
@@ -9,8 +12,13 @@ import time
 import urllib
 import urlparse
 
+from cStringIO import StringIO
+from requests.adapters import HTTPAdapter
+from xml.sax.saxutils import escape
+
 from teuthology.config import config as teuth_config
 from teuthology.orchestra import run
+from teuthology.parallel import parallel
 
 from teuthology import misc
 
@@ -22,6 +30,10 @@ log = logging.getLogger(__name__)
 # Because PCP output is nonessential, set a timeout to avoid stalling
 # tests if the server does not respond promptly.
 GRAPHITE_DOWNLOAD_TIMEOUT = 60
+# How long downloading all the graphs may take, and how many are downloaded
+# at once
+GRAPHITE_BATCH_TIMEOUT = 120
+GRAPHITE_CONCURRENCY = 8
 
 
 class PCPDataSource(object):
@@ -153,26 +165,66 @@ class GraphiteGrapher(PCPGrapher):
         return data
 
     def download_graphs(self):
+        """
+        Download the graph of each metric, GRAPHITE_CONCURRENCY at a time
+        over one pool of connections. Graphs not downloaded within
+        GRAPHITE_BATCH_TIMEOUT seconds are given up on; the static HTML
+        links to Graphite for them instead.
+
+        :raises: requests.ConnectionError if no graph could be downloaded
+        """
         self._check_dest_dir()
         self.build_graph_urls()
-        for metric in self.graphs.keys():
-            url = self.graphs[metric]['url']
-            filename = self._sanitize_metric_name(metric) + '.png'
-            self.graphs[metric]['file'] = graph_path = os.path.join(
-                self.dest_dir,
-                filename,
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1,
+                              pool_maxsize=GRAPHITE_CONCURRENCY)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        start = time.time()
+        pool = gevent.pool.Pool(GRAPHITE_CONCURRENCY)
+        with gevent.Timeout(GRAPHITE_BATCH_TIMEOUT, False):
+            for metric in self.graphs.keys():
+                self.graphs[metric].pop('file', None)
+                pool.spawn(self._download_graph, session, metric)
+            pool.join()
+        if len(pool):
+            log.warn("Giving up on %d graphs after %ss", len(pool),
+                     GRAPHITE_BATCH_TIMEOUT)
+            pool.kill()
+        session.close()
+        downloaded = [graph for graph in self.graphs.values()
+                      if graph.get('file')]
+        log.info("Downloaded %d of %d graphs in %.1fs", len(downloaded),
+                 len(self.graphs), time.time() - start)
+        if self.graphs and not downloaded:
+            raise requests.ConnectionError(
+                "Could not download any graph from %s" % self.base_url)
+
+    def _download_graph(self, session, metric):
+        graph = self.graphs[metric]
+        url = graph['url']
+        start = time.time()
+        try:
+            resp = session.get(url, timeout=GRAPHITE_DOWNLOAD_TIMEOUT)
+        except requests.RequestException as e:
+            log.warn("Graph download failed: %s: %s", e, url)
+            return
+        finally:
+            graph['time'] = time.time() - start
+        log.debug("Graph of %s took %.1fs", metric, graph['time'])
+        if not resp.ok:
+            log.warn(
+                "Graph download failed with error %s %s: %s",
+                resp.status_code,
+                resp.reason,
+                url,
             )
-            resp = requests.get(url, timeout=GRAPHITE_DOWNLOAD_TIMEOUT)
-            if not resp.ok:
-                log.warn(
-                    "Graph download failed with error %s %s: %s",
-                    resp.status_code,
-                    resp.reason,
-                    url,
-                )
-                continue
-            with open(graph_path, 'wb') as f:
-                f.write(resp.content)
+            return
+        filename = self._sanitize_metric_name(metric) + '.png'
+        path = os.path.join(self.dest_dir, filename)
+        with open(path, 'wb') as f:
+            f.write(resp.content)
+        graph['file'] = path
 
     def get_graph_url(self, metric):
         config = dict(self.graph_defaults)
@@ -205,6 +257,131 @@ class GraphiteGrapher(PCPGrapher):
         return result
 
 
+class LocalGrapher(PCPDataSource):
+    """
+    Renders SVG graphs from the PCP archives fetched from each host, without
+    a Graphite server
+    """
+    metrics = [
+        'kernel.all.load',
+        'mem.util.free',
+        'mem.util.used',
+        'network.interface.in.bytes',
+        'network.interface.out.bytes',
+        'disk.all.read_bytes',
+        'disk.all.write_bytes',
+    ]
+    interval = '10s'
+    width = 1200
+    height = 300
+    colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd',
+              '#8c564b', '#e377c2', '#7f7f7f']
+
+    def __init__(self, hosts, time_from, time_until='now', dest_dir=None,
+                 job_id=None):
+        super(LocalGrapher, self).__init__(hosts, time_from, time_until)
+        self.dest_dir = dest_dir
+        self.job_id = job_id
+        self.graphs = dict()
+
+    def get_pmrep_cmd(self, archive_path):
+        return [
+            'pmrep',
+            '-a', archive_path,
+            '-t', self.interval,
+            '-o', 'csv',
+        ] + self.metrics
+
+    def add_host(self, host, pmrep_csv):
+        """
+        Render the graphs of one host from the CSV output of get_pmrep_cmd()
+        """
+        start = time.time()
+        series = self.parse_csv(pmrep_csv)
+        for metric in self.metrics:
+            lines = [(instance, values)
+                     for (metric_, instance), values in series
+                     if metric_ == metric]
+            if not lines:
+                continue
+            title = '{0} {1}'.format(host, metric)
+            filename = GraphiteGrapher._sanitize_metric_name(title) + '.svg'
+            path = os.path.join(self.dest_dir, filename)
+            with open(path, 'w') as f:
+                f.write(self.render_svg(title, lines))
+            self.graphs[title] = dict(url=filename, file=path)
+        log.debug("Rendered the graphs of %s in %.1fs", host,
+                  time.time() - start)
+
+    @staticmethod
+    def parse_csv(pmrep_csv):
+        """
+        :returns: A list of ((metric, instance), values) tuples, one per
+                  column. Samples without a value are None.
+        """
+        rows = list(csv.reader(StringIO(pmrep_csv)))
+        if not rows:
+            return []
+        columns = list()
+        for index, name in enumerate(rows[0][1:], 1):
+            metric, _, instance = name.partition('-')
+            values = list()
+            for row in rows[1:]:
+                try:
+                    values.append(float(row[index]))
+                except (IndexError, ValueError):
+                    values.append(None)
+            columns.append(((metric, instance), values))
+        return columns
+
+    def render_svg(self, title, lines):
+        """
+        Draw lines, a list of (label, values) tuples, on one chart
+        """
+        margin = 40
+        width = self.width - 2 * margin
+        height = self.height - 2 * margin
+        top = max([v for _, values in lines for v in values
+                   if v is not None] or [0]) or 1
+        samples = max(len(values) for _, values in lines)
+        step = float(width) / max(samples - 1, 1)
+        parts = [
+            '<svg xmlns="http://www.w3.org/2000/svg" width="{0}" '
+            'height="{1}">'.format(self.width, self.height),
+            '<text x="{0}" y="20">{1}</text>'.format(margin, escape(title)),
+            '<text x="0" y="{0}" font-size="10">{1:g}</text>'.format(
+                margin, top),
+            '<rect x="{0}" y="{0}" width="{1}" height="{2}" fill="none" '
+            'stroke="#ccc"/>'.format(margin, width, height),
+        ]
+        for i, (label, values) in enumerate(lines):
+            color = self.colors[i % len(self.colors)]
+            points = ' '.join(
+                '{0:.1f},{1:.1f}'.format(margin + n * step,
+                                         margin + height * (1 - v / top))
+                for n, v in enumerate(values) if v is not None)
+            parts.append('<polyline fill="none" stroke="{0}" '
+                         'points="{1}"/>'.format(color, points))
+            parts.append('<text x="{0}" y="{1}" font-size="10" '
+                         'fill="{2}">{3}</text>'.format(
+                             margin + 150 * i, self.height - 10, color,
+                             escape(label or title.split()[-1])))
+        parts.append('</svg>')
+        return '\n'.join(parts)
+
+    def write_html(self):
+        cwd = os.path.dirname(__file__)
+        loader = jinja2.loaders.FileSystemLoader(cwd)
+        env = jinja2.Environment(loader=loader)
+        template = env.get_template('pcp.j2')
+        with open(os.path.join(self.dest_dir, 'pcp.html'), 'w') as f:
+            f.write(template.render(
+                job_id=self.job_id,
+                graphs=self.graphs,
+                mode='static',
+            ))
+
+
 class PCP(Task):
     """
     Collects performance data using PCP during a job.
@@ -218,13 +395,14 @@ class PCP(Task):
         ``fetch_archives``: Whether to assemble and ship a raw PCP archive
         containing performance data to the job's output archive (default:
             False)
+        ``local_graphs``: Whether to render SVG graphs from the fetched PCP
+            archives with pmrep, which needs neither Graphite nor a
+            pcp_host; implies fetch_archives (default: False)
     """
     enabled = True
 
     def __init__(self, ctx, config):
         super(PCP, self).__init__(ctx, config)
-        if teuth_config.get('pcp_host') is None:
-            self.enabled = False
         self.log = log
         self.job_id = self.ctx.config.get('job_id')
         # until the job stops, we may want to render graphs reflecting the most
@@ -232,9 +410,16 @@ class PCP(Task):
         self.stop_time = 'now'
         self.use_graphite = self.config.get('graphite', True)
         self.use_grafana = self.config.get('grafana', True)
+        self.use_local_graphs = self.config.get('local_graphs', False)
         # fetch_archives defaults to False for now because of various bugs in
         # pmlogextract
-        self.fetch_archives = self.config.get('fetch_archives', False)
+        self.fetch_archives = self.config.get('fetch_archives',
+                                              self.use_local_graphs)
+        if teuth_config.get('pcp_host') is None:
+            self.use_graphite = False
+            self.use_grafana = False
+            if not self.use_local_graphs:
+                self.enabled = False
 
     def setup(self):
         if not self.enabled:
@@ -250,6 +435,7 @@ class PCP(Task):
         self.setup_grafana(hosts)
         self.setup_graphite(hosts)
         self.setup_archive(hosts)
+        self.setup_local_graphs(hosts)
 
     def setup_grafana(self, hosts):
         if self.use_grafana:
@@ -289,6 +475,25 @@ class PCP(Task):
                 time_until=self.stop_time,
             )
 
+    def setup_local_graphs(self, hosts):
+        if not self.fetch_archives:
+            self.use_local_graphs = False
+        if self.use_local_graphs:
+            out_dir = os.path.join(
+                self.ctx.archive,
+                'pcp',
+                'local',
+            )
+            if not os.path.exists(out_dir):
+                os.makedirs(out_dir)
+            self.local_grapher = LocalGrapher(
+                hosts=hosts,
+                time_from=self.start_time,
+                time_until=self.stop_time,
+                dest_dir=out_dir,
+                job_id=self.job_id,
+            )
+
     def begin(self):
         if not self.enabled:
             return
@@ -322,15 +527,36 @@ class PCP(Task):
                 log.exception("Downloading graphs failed!")
                 self.graphite.write_html()
         if self.fetch_archives:
-            for remote in self.cluster.remotes.keys():
-                log.info("Copying PCP data into archive...")
-                cmd = self.archiver.get_pmlogextract_cmd(remote.shortname)
-                archive_out_path = os.path.join(
-                    misc.get_testdir(),
-                    'pcp_archive_%s' % remote.shortname,
-                )
-                cmd.append(archive_out_path)
-                remote.run(args=cmd)
-
+            with parallel() as p:
+                for remote in self.cluster.remotes.keys():
+                    p.spawn(self.fetch_archive, remote)
+            if self.use_local_graphs:
+                self.local_grapher.write_html()
+
+    def fetch_archive(self, remote):
+        log.info("Copying PCP data of %s into archive...", remote.shortname)
+        cmd = self.archiver.get_pmlogextract_cmd(remote.shortname)
+        archive_out_path = os.path.join(
+            misc.get_testdir(),
+            'pcp_archive_%s' % remote.shortname,
+        )
+        cmd.append(archive_out_path)
+        remote.run(args=cmd)
+        if not self.use_local_graphs:
+            return
+        start = time.time()
+        proc = remote.run(
+            args=self.local_grapher.get_pmrep_cmd(archive_out_path),
+            stdout=StringIO(),
+            check_status=False,
+        )
+        log.debug("pmrep on %s took %.1fs", remote.shortname,
+                  time.time() - start)
+        if proc.exitstatus != 0:
+            log.warn("pmrep failed on %s; not rendering its graphs",
+                     remote.shortname)
+            return
+        self.local_grapher.add_host(remote.shortname,
+                                    proc.stdout.getvalue())
 
 task = PCP
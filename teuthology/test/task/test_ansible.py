@@ -292,6 +292,48 @@ class TestAnsibleTask(TestTask):
                 timeout=None,
             )
 
+    def test_execute_playbook_environ(self):
+        self.task_config.update(dict(
+            playbook=[],
+            fact_cache_ttl=60,
+        ))
+        self.ctx.config.update(os_type='ubuntu', os_version='16.04')
+        self.ctx.archive = '/archive/job'
+        task = self.klass(self.ctx, self.task_config)
+        task.setup()
+        with patch.object(ansible.pexpect, 'run') as m_run:
+            m_run.return_value = ('', 0)
+            with patch.object(Remote, 'reconnect') as m_reconnect:
+                with patch.dict(os.environ):
+                    task.execute_playbook()
+                    environ = dict(os.environ)
+            assert m_reconnect.call_count == 2
+        assert environ['ANSIBLE_GATHERING'] == 'smart'
+        assert environ['ANSIBLE_CACHE_PLUGIN_TIMEOUT'] == '60'
+        assert environ['ANSIBLE_CACHE_PLUGIN_CONNECTION'].endswith(
+            '/ubuntu-16.04')
+        assert 'ANSIBLE_SSH_ARGS' not in environ
+        control_path_dir = environ['ANSIBLE_SSH_CONTROL_PATH_DIR']
+        assert os.path.isdir(control_path_dir)
+        assert environ['ANSIBLE_LOG_PATH'] == '/archive/job/ansible.log'
+        socket_path = os.path.join(control_path_dir, 'remote1-ubuntu')
+        open(socket_path, 'w').close()
+        with patch.object(ansible, 'sh') as m_sh:
+            # the master removes its socket as it exits
+            m_sh.side_effect = lambda command: os.unlink(socket_path)
+            task.teardown()
+        m_sh.assert_called_once_with(
+            'ssh -O exit -o ControlPath=%s remote1' % socket_path)
+        assert not os.path.exists(control_path_dir)
+
+    def test_fact_cache_disabled(self):
+        self.task_config.update(dict(
+            playbook=[],
+            fact_cache_ttl=0,
+        ))
+        task = self.klass(self.ctx, self.task_config)
+        assert 'ANSIBLE_CACHE_PLUGIN' not in task._fact_cache_environ()
+
     def test_execute_playbook_fail(self):
         self.task_config.update(dict(
             playbook=[],
@@ -0,0 +1,67 @@
+import struct
+
+from cStringIO import StringIO
+from pytest import raises
+
+from teuthology.task.internal import elfcore
+
+
+def make_core(psargs, fname=None, elf_class=elfcore.ELFCLASS64,
+              endian='<'):
+    """
+    Build a minimal ELF core file with a single PT_NOTE segment holding an
+    NT_PRPSINFO note
+    """
+    fname = fname or psargs.split(' ')[0].split('/')[-1][:15]
+    layout = elfcore.PRPSINFO_LAYOUT[elf_class]
+    desc_size = layout['psargs'] + elfcore.PSARGS_LEN
+    desc = bytearray(desc_size)
+    desc[layout['fname']:layout['fname'] + len(fname)] = fname
+    desc[layout['psargs']:layout['psargs'] + len(psargs)] = psargs
+    note = struct.pack(endian + 'III', 5, desc_size, elfcore.NT_PRPSINFO)
+    note += 'CORE\0\0\0\0' + str(desc)
+
+    data = elfcore.ELFMAG + chr(elf_class)
+    data += chr(elfcore.ELFDATA2LSB if endian == '<' else elfcore.ELFDATA2MSB)
+    data += '\x01' + '\0' * 9
+    if elf_class == elfcore.ELFCLASS64:
+        ehsize, phentsize = 64, 56
+        data += struct.pack(endian + 'HHIQQQIHHHHHH', elfcore.ET_CORE, 62, 1,
+                            0, ehsize, 0, 0, ehsize, phentsize, 1, 0, 0, 0)
+        data += struct.pack(endian + 'IIQQQQQQ', elfcore.PT_NOTE, 0,
+                            ehsize + phentsize, 0, 0, len(note), 0, 0)
+    else:
+        ehsize, phentsize = 52, 32
+        data += struct.pack(endian + 'HHIIIIIHHHHHH', elfcore.ET_CORE, 3, 1,
+                            0, ehsize, 0, 0, ehsize, phentsize, 1, 0, 0, 0)
+        data += struct.pack(endian + 'IIIIIIII', elfcore.PT_NOTE,
+                            ehsize + phentsize, 0, 0, len(note), 0, 0, 0)
+    return data + note
+
+
+class TestElfCore(object):
+    def test_prpsinfo_64(self):
+        core = make_core('radosgw --rgw-socket-path /tmp/sock')
+        info = elfcore.read_prpsinfo(StringIO(core))
+        assert info == dict(fname='radosgw',
+                            psargs='radosgw --rgw-socket-path /tmp/sock')
+
+    def test_prpsinfo_32_big_endian(self):
+        core = make_core('ceph-osd -f -i 0', elf_class=elfcore.ELFCLASS32,
+                         endian='>')
+        info = elfcore.read_prpsinfo(StringIO(core))
+        assert info['psargs'] == 'ceph-osd -f -i 0'
+
+    def test_get_core_program(self, tmpdir):
+        path = tmpdir.join('1.2.core')
+        path.write(make_core('/usr/bin/ceph-osd -f -i 0'), mode='wb')
+        assert elfcore.get_core_program(str(path)) == '/usr/bin/ceph-osd'
+
+    def test_not_elf(self):
+        with raises(elfcore.NotACoreError):
+            elfcore.read_prpsinfo(StringIO('#!/bin/sh\n' + '\0' * 64))
+
+    def test_truncated(self):
+        core = make_core('ceph-mon -f')
+        with raises(elfcore.NotACoreError):
+            elfcore.read_prpsinfo(StringIO(core[:40]))
@@ -1,6 +1,14 @@
+import hashlib
+import os
+
+from cStringIO import StringIO
+from mock import Mock
+
 from teuthology.config import FakeNamespace
 from teuthology.task import internal
 
+from .test_elfcore import make_core
+
 
 class TestInternal(object):
     def setup(self):
@@ -55,3 +63,67 @@ class TestInternal(object):
         assert internal.buildpackages_prep(self.ctx,
                                            self.ctx.config) == internal.BUILDPACKAGES_REMOVED
         assert self.ctx.config == {'tasks': []}
+
+
+class TestFetchBinariesForCoredumps(object):
+    def make_remote(self, shortname, contents):
+        """
+        A fake remote whose files are given by contents, a dict mapping remote
+        paths to data
+        """
+        rem = Mock()
+        rem.shortname = shortname
+        rem.system_type = 'deb'
+
+        def run(args, **kwargs):
+            proc = Mock()
+            if args[0] == 'which':
+                proc.stdout = StringIO('/usr/bin/%s\n' % args[1])
+            elif args[0] == 'sha1sum':
+                proc.stdout = StringIO(''.join(
+                    '%s  %s\n' % (hashlib.sha1(contents[path]).hexdigest(),
+                                  path)
+                    for path in args[2:] if path in contents))
+            return proc
+        rem.run.side_effect = run
+
+        def get_file(remote_path, local_path):
+            with open(local_path, 'w') as f:
+                f.write(contents[remote_path])
+        rem._sftp_get_file.side_effect = get_file
+        return rem
+
+    def make_archive(self, tmpdir, shortname, cores):
+        coredump_dir = tmpdir.mkdir(shortname).mkdir('coredump')
+        for i, psargs in enumerate(cores):
+            coredump_dir.join('%d.core' % i).write(make_core(psargs),
+                                                   mode='wb')
+        return str(tmpdir.join(shortname))
+
+    def test_dedupe_and_share(self, tmpdir):
+        contents = {
+            '/usr/bin/ceph-osd': 'osd binary',
+            '/usr/lib/debug/usr/bin/ceph-osd': 'osd debug',
+            '/usr/bin/ceph-mon': 'mon binary',
+        }
+        shared = dict()
+        rem_a = self.make_remote('a', contents)
+        path_a = self.make_archive(
+            tmpdir, 'a', ['ceph-osd -i 0', 'ceph-osd -i 1', 'ceph-mon -i a'])
+        internal.fetch_binaries_for_coredumps(path_a, rem_a, shared)
+        fetched = [c[0][0] for c in rem_a._sftp_get_file.call_args_list]
+        assert sorted(fetched) == sorted(contents.keys())
+        assert rem_a.run.call_count == 3
+
+        rem_b = self.make_remote('b', contents)
+        path_b = self.make_archive(tmpdir, 'b', ['ceph-osd -i 2'])
+        internal.fetch_binaries_for_coredumps(path_b, rem_b, shared)
+        assert not rem_b._sftp_get_file.called
+        linked = os.path.join(path_b, 'coredump', 'ceph-osd.debug')
+        original = os.path.join(path_a, 'coredump', 'ceph-osd.debug')
+        assert os.path.samefile(linked, original)
+
+    def test_no_coredumps(self, tmpdir):
+        rem = self.make_remote('a', dict())
+        internal.fetch_binaries_for_coredumps(str(tmpdir), rem)
+        assert not rem.run.called
@@ -1,5 +1,9 @@
+import gevent
 import os
 import requests
+import shutil
+import tempfile
+import time
 import urlparse
 
 from mock import patch, DEFAULT, Mock, MagicMock, call
@@ -9,8 +13,10 @@ from teuthology.config import config, FakeNamespace
 from teuthology.orchestra.cluster import Cluster
 from teuthology.orchestra.remote import Remote
 from teuthology.orchestra.run import Raw
+from teuthology.task import pcp
 from teuthology.task.pcp import (PCPDataSource, PCPArchive, PCPGrapher,
-                                 GrafanaGrapher, GraphiteGrapher, PCP)
+                                 GrafanaGrapher, GraphiteGrapher,
+                                 LocalGrapher, PCP)
 
 from . import TestTask
 
@@ -166,10 +172,10 @@ class TestGraphiteGrapher(TestPCPGrapher):
             dest_dir=dest_dir,
         )
         _format = obj.graph_defaults.get('format')
-        with patch('teuthology.task.pcp.requests.get', create=True) as m_get:
+        with patch('teuthology.task.pcp.requests.Session') as m_session:
             m_resp = Mock()
             m_resp.ok = True
-            m_get.return_value = m_resp
+            m_session.return_value.get.return_value = m_resp
             with patch('teuthology.task.pcp.open', create=True) as m_open:
                 m_open.return_value = MagicMock(spec=file)
                 obj.download_graphs()
@@ -195,16 +201,60 @@ class TestGraphiteGrapher(TestPCPGrapher):
             time_from='now-3h',
             dest_dir='/fake/path',
         )
-        with patch('teuthology.task.pcp.requests.get', create=True) as m_get:
+        with patch('teuthology.task.pcp.requests.Session') as m_session:
             m_resp = Mock()
             m_resp.ok = True
-            m_get.return_value = m_resp
+            m_session.return_value.get.return_value = m_resp
             with patch('teuthology.task.pcp.open', create=True) as m_open:
                 m_open.return_value = MagicMock(spec=file)
                 obj.download_graphs()
         html = obj.generate_html(mode='static')
         assert config.pcp_host not in html
 
+    def test_download_graphs_concurrently(self):
+        obj = self.klass(
+            hosts=['host1'],
+            time_from='now-3h',
+            dest_dir='/fake/path',
+        )
+        obj.metrics = ['slow', 'fast', 'broken']
+
+        def get(url, timeout):
+            resp = Mock()
+            resp.ok = 'broken' not in url
+            resp.status_code = 200 if resp.ok else 500
+            if 'slow' in url:
+                gevent.sleep(5)
+            gevent.sleep(0.1)
+            return resp
+
+        with patch('teuthology.task.pcp.requests.Session') as m_session:
+            m_session.return_value.get.side_effect = get
+            with patch('teuthology.task.pcp.open', create=True) as m_open:
+                m_open.return_value = MagicMock(spec=file)
+                with patch.object(pcp, 'GRAPHITE_BATCH_TIMEOUT', 1):
+                    start = time.time()
+                    obj.download_graphs()
+        assert time.time() - start < 2
+        assert 'file' not in obj.graphs['slow']
+        assert 'file' not in obj.graphs['broken']
+        assert obj.graphs['fast']['file'] == '/fake/path/fast.png'
+        assert obj.graphs['fast']['time'] < 1
+        html = obj.generate_html(mode='static')
+        assert '"fast.png"' in html
+        assert obj.graphs['slow']['url'] in html
+
+    def test_download_graphs_none(self):
+        obj = self.klass(
+            hosts=['host1'],
+            time_from='now-3h',
+            dest_dir='/fake/path',
+        )
+        with patch('teuthology.task.pcp.requests.Session') as m_session:
+            m_session.return_value.get.side_effect = requests.ConnectionError
+            with raises(requests.ConnectionError):
+                obj.download_graphs()
+
     def test_sanitize_metric_name(self):
         sanitized_metrics = {
             'foo.bar': 'foo.bar',
@@ -228,6 +278,55 @@ class TestGraphiteGrapher(TestPCPGrapher):
             ['*host1*.a.metric', '*host2*.a.metric']
 
 
+class TestLocalGrapher(TestPCPDataSource):
+    klass = LocalGrapher
+
+    pmrep_csv = (
+        'Time,"kernel.all.load-1 minute","kernel.all.load-5 minute",'
+        '"mem.util.free"\n'
+        '2016-05-10 15:18:04,0.5,0.25,\n'
+        '2016-05-10 15:18:14,1.5,0.75,1024\n'
+    )
+
+    def setup(self):
+        super(TestLocalGrapher, self).setup()
+        self.dest_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.dest_dir)
+
+    def test_get_pmrep_cmd(self):
+        obj = self.klass(hosts=['host1'], time_from='now-3h')
+        cmd = obj.get_pmrep_cmd('/tmp/archive')
+        assert cmd[:7] == ['pmrep', '-a', '/tmp/archive', '-t', '10s', '-o',
+                           'csv']
+        assert cmd[7:] == obj.metrics
+
+    def test_parse_csv(self):
+        assert self.klass.parse_csv(self.pmrep_csv) == [
+            (('kernel.all.load', '1 minute'), [0.5, 1.5]),
+            (('kernel.all.load', '5 minute'), [0.25, 0.75]),
+            (('mem.util.free', ''), [None, 1024.0]),
+        ]
+        assert self.klass.parse_csv('') == []
+
+    def test_add_host(self):
+        obj = self.klass(hosts=['host1'], time_from='now-3h',
+                         dest_dir=self.dest_dir)
+        obj.add_host('host1', self.pmrep_csv)
+        assert sorted(obj.graphs.keys()) == ['host1 kernel.all.load',
+                                             'host1 mem.util.free']
+        with open(obj.graphs['host1 kernel.all.load']['file']) as f:
+            svg = f.read()
+        assert svg.count('<polyline') == 2
+        assert '1 minute' in svg
+        obj.write_html()
+        with open(os.path.join(self.dest_dir, 'pcp.html')) as f:
+            html = f.read()
+        assert '"host1_kernel.all.load.svg"' in html
+        assert config.pcp_host not in html
+
+
 class TestPCPTask(TestTask):
     klass = PCP
     task_name = 'pcp'
@@ -335,6 +434,29 @@ class TestPCPTask(TestTask):
             with self.klass(self.ctx, self.task_config) as task:
                 assert not hasattr(task, 'archiver')
 
+    @patch('os.makedirs')
+    @patch('teuthology.task.pcp.LocalGrapher')
+    def test_setup_local_graphs(self, m_local_grapher, m_makedirs):
+        with patch.multiple(
+            self.klass,
+            begin=DEFAULT,
+            end=DEFAULT,
+        ):
+            self.task_config['local_graphs'] = True
+            with self.klass(self.ctx, self.task_config) as task:
+                assert not hasattr(task, 'local_grapher')
+            self.ctx.archive = '/fake/path'
+            with self.klass(self.ctx, self.task_config) as task:
+                assert task.fetch_archives is True
+                assert hasattr(task, 'local_grapher')
+            # no Graphite or Grafana is needed
+            config.pcp_host = None
+            with self.klass(self.ctx, self.task_config) as task:
+                assert task.enabled is True
+                assert hasattr(task, 'local_grapher')
+                assert not hasattr(task, 'graphite')
+                assert not hasattr(task, 'grafana')
+
     @patch('os.makedirs')
     @patch('teuthology.task.pcp.GrafanaGrapher')
     @patch('teuthology.task.pcp.GraphiteGrapher')
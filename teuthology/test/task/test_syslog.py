@@ -0,0 +1,107 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from mock import Mock
+
+from teuthology.config import FakeNamespace
+from teuthology.orchestra.cluster import Cluster
+from teuthology.task.internal import syslog
+
+KERN_LOG = """\
+2016-10-18T12:00:00 smithi001 kernel: INFO: task ceph-osd:1234 blocked for more than 120 seconds.
+2016-10-18T12:00:01 smithi001 kernel: *** DEADLOCK ***
+2016-10-18T12:00:02 smithi001 kernel: all is well
+"""
+
+BAD_LINE = "2016-10-18T12:00:03 smithi001 kernel: BUG: unable to handle kernel NULL pointer dereference\n"  # noqa
+
+
+class TestSyslog(object):
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.ctx = FakeNamespace()
+        self.ctx.config = dict()
+        self.ctx.summary = dict()
+        self.ctx.archive = self.tmpdir
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write_log(self, shortname, name, contents):
+        log_dir = os.path.join(self.tmpdir, 'remote', shortname, 'syslog')
+        if not os.path.isdir(log_dir):
+            os.makedirs(log_dir)
+        path = os.path.join(log_dir, name)
+        if name.endswith('.gz'):
+            f = gzip.open(path, 'wb')
+        else:
+            f = open(path, 'wb')
+        f.write(contents)
+        f.close()
+        return path
+
+    def test_ignorelist_extends_defaults(self):
+        self.ctx.config['syslog'] = dict(ignorelist=['foo'])
+        ignorelist = syslog.get_ignorelist(self.ctx)
+        assert ignorelist[:-1] == syslog.DEFAULT_IGNORELIST
+        assert ignorelist[-1] == 'foo'
+
+    def test_scan_locally(self):
+        assert not syslog.scan_locally(self.ctx)
+        self.ctx.config['syslog'] = dict(scan='local')
+        assert syslog.scan_locally(self.ctx)
+        self.ctx.config['archive-on-error'] = True
+        assert not syslog.scan_locally(self.ctx)
+
+    def test_scan_file_default_ignorelist(self):
+        error_re, ignore_re = syslog.compile_patterns(
+            syslog.DEFAULT_IGNORELIST)
+        path = self.write_log('a', 'kern.log.gz', KERN_LOG)
+        assert syslog.scan_file(path, error_re, ignore_re) == ''
+        path = self.write_log('a', 'misc.log', KERN_LOG + BAD_LINE)
+        assert syslog.scan_file(path, error_re, ignore_re) == \
+            'misc.log:' + BAD_LINE
+
+    def test_scan_files_processes(self):
+        paths = [
+            self.write_log(str(i), 'kern.log.gz',
+                           KERN_LOG + (BAD_LINE if i % 2 else ''))
+            for i in range(5)
+        ]
+        results = syslog.scan_files(paths, syslog.DEFAULT_IGNORELIST,
+                                    processes=3)
+        assert sorted(results.keys()) == sorted(paths)
+        assert [bool(results[path]) for path in paths] == \
+            [False, True, False, True, False]
+
+    def test_check_archived_logs(self):
+        self.ctx.config['syslog'] = dict(scan='local', processes=1)
+        self.ctx.cluster = Cluster()
+        for shortname in ('a', 'b'):
+            rem = Mock()
+            rem.name = 'ubuntu@%s.example.com' % shortname
+            rem.shortname = shortname
+            self.ctx.cluster.add(rem, [])
+        self.write_log('a', 'kern.log.gz', KERN_LOG)
+        self.write_log('b', 'kern.log.gz', KERN_LOG + BAD_LINE)
+        syslog.check_archived_logs(self.ctx)
+        assert self.ctx.summary['status'] == 'fail'
+        assert self.ctx.summary['failure_reason'] == \
+            "'kern.log:{0}' in syslog".format(BAD_LINE)
+
+    def test_check_remote_logs(self):
+        self.ctx.cluster = Cluster()
+        for shortname, output in (('a', ''), ('b', 'kern.log: BUG\n')):
+            rem = Mock()
+            rem.name = shortname
+            rem.run.return_value.stdout.getvalue.return_value = output
+            self.ctx.cluster.add(rem, [])
+        syslog.check_remote_logs(self.ctx, '/archive')
+        assert self.ctx.summary['status'] == 'fail'
+        assert self.ctx.summary['failure_reason'] == \
+            "'kern.log: BUG\n' in syslog"
+        for rem in self.ctx.cluster.remotes:
+            args = rem.run.call_args[1]['args']
+            assert args.count('-e') == len(syslog.DEFAULT_IGNORELIST)
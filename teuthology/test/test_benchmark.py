@@ -0,0 +1,32 @@
+import pytest
+
+from teuthology import benchmark
+
+
+class TestBenchmark(object):
+    @pytest.mark.parametrize('name', benchmark.BENCHMARKS.keys())
+    def test_run_benchmark(self, name):
+        results = benchmark.run_benchmarks(names=[name], repeat=1, scale=0)
+        times = results['benchmarks'][name]
+        assert times['min'] <= times['mean'] <= times['max']
+
+    def test_unknown_benchmark(self):
+        with pytest.raises(ValueError):
+            benchmark.run_benchmarks(names=['nonexistent'])
+
+    def test_compare(self):
+        baseline = dict(scale=1, benchmarks=dict(
+            fast=dict(min=1.0),
+            slow=dict(min=1.0),
+            removed=dict(min=1.0),
+        ))
+        results = dict(scale=1, benchmarks=dict(
+            fast=dict(min=0.5),
+            slow=dict(min=2.0),
+            added=dict(min=1.0),
+        ))
+        comparison = benchmark.compare(results, baseline, threshold=1.5)
+        assert [item['name'] for item in comparison] == ['fast', 'slow']
+        assert comparison[0]['ratio'] == 0.5
+        assert not comparison[0]['regressed']
+        assert comparison[1]['regressed']
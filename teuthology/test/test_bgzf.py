@@ -0,0 +1,106 @@
+import gzip
+import os
+import shutil
+import tempfile
+
+from pytest import raises
+
+from teuthology import bgzf, prune
+
+
+def make_log(lines):
+    return ''.join(
+        '2016-10-18T15:{0:02d}:{1:02d}.000 INFO:teuthology.run:line {2}\n'
+        .format(i // 60 % 60, i % 60, i) for i in range(lines))
+
+
+class TestBGZF(object):
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'teuthology.log')
+        self.dest = self.src + '.gz'
+        self.data = make_log(2000)
+        with open(self.src, 'w') as f:
+            f.write(self.data)
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def compress(self, block_size=1000):
+        return bgzf.compress(self.src, self.dest, block_size=block_size)
+
+    def test_gzip_compatible(self):
+        self.compress()
+        assert gzip.open(self.dest).read() == self.data
+        assert bgzf.is_bgzf(self.dest)
+
+    def test_index(self):
+        index = self.compress()
+        assert len(index) > 50
+        for block in index:
+            assert block.usize <= 1000
+            assert block.timestamp.startswith('2016-10-18T15:')
+        assert bgzf.read_index(self.dest) == index
+        os.remove(bgzf.index_path(self.dest))
+        assert bgzf.read_index(self.dest) == index
+        assert os.path.exists(bgzf.index_path(self.dest))
+
+    def test_read(self):
+        self.compress()
+        with bgzf.Reader(self.dest) as reader:
+            assert reader.size == len(self.data)
+            assert reader.read(0, 10) == self.data[:10]
+            assert reader.read(12345, 3000) == self.data[12345:15345]
+            assert reader.read(len(self.data) - 5, 100) == self.data[-5:]
+
+    def test_lines(self):
+        self.compress()
+        lines = self.data.splitlines(True)
+        with bgzf.Reader(self.dest) as reader:
+            assert list(reader.lines()) == lines
+            assert list(reader.lines(1234)) == lines[1234:]
+            offset = self.data.index('line 777\n') + 3
+            assert next(reader.lines_at_offset(offset)) == lines[777]
+
+    def test_lines_since(self):
+        self.compress()
+        lines = self.data.splitlines(True)
+        with bgzf.Reader(self.dest) as reader:
+            assert next(reader.lines_since('2016-10-18T15:20:00')) == \
+                lines[1200]
+            assert next(reader.lines_since('2016-10-18T15:20:00.5')) == \
+                lines[1201]
+            assert list(reader.lines_since('2016')) == lines
+            assert list(reader.lines_since('2017')) == []
+
+    def test_long_lines(self):
+        self.data = 'x' * 2500 + '\n' + make_log(10) + 'y' * 2500
+        with open(self.src, 'w') as f:
+            f.write(self.data)
+        self.compress()
+        lines = self.data.splitlines(True)
+        with bgzf.Reader(self.dest) as reader:
+            assert list(reader.lines(0)) == lines
+            assert list(reader.lines(5)) == lines[5:]
+            assert list(reader.lines(11)) == lines[11:]
+            assert next(reader.lines_at_offset(len(self.data) - 1)) == \
+                lines[-1]
+
+    def test_not_bgzf(self):
+        with gzip.open(self.dest, 'wb') as f:
+            f.write(self.data)
+        assert not bgzf.is_bgzf(self.dest)
+        assert bgzf.open_log(self.dest) is None
+        with raises(ValueError):
+            bgzf.build_index(self.dest)
+
+    def test_prune(self):
+        job_dir = os.path.join(self.tmpdir, '1')
+        os.mkdir(job_dir)
+        os.rename(self.src, os.path.join(job_dir, 'teuthology.log'))
+        os.utime(job_dir, (0, 0))
+        prune.maybe_compress_logs(self.tmpdir, 1, seekable=True)
+        path = os.path.join(job_dir, 'teuthology.log.gz')
+        assert not os.path.exists(os.path.join(job_dir, 'teuthology.log'))
+        reader = bgzf.open_log(path)
+        assert reader.read(0, len(self.data)) == self.data
@@ -1,6 +1,34 @@
-from mock import patch
+import functools
+import os
+import shutil
+import stat
+import tempfile
+import textwrap
+
+from mock import call, patch
 
 from teuthology import coverage
+from teuthology.parallel import process_map
+
+# Like coverage/cov-analyze.sh, works in the shared ceph tree of -d and
+# names its intermediate tracefile after the machine
+FAKE_COV_ANALYZE = textwrap.dedent("""\
+    #!/bin/bash
+    set -e
+    while getopts "d:o:t:" flag; do
+        case $flag in
+            d) COV_DIR=$OPTARG;;
+            o) OUTPUT_BASENAME=$OPTARG;;
+            t) TEST_DIR=$OPTARG;;
+        esac
+    done
+    cp $COV_DIR/base.lcov "$COV_DIR/$OUTPUT_BASENAME.lcov"
+    cp $TEST_DIR/remote/node1/coverage/*.gcda $COV_DIR/ceph/src
+    sleep 0.5
+    cat $COV_DIR/ceph/src/*.gcda > $COV_DIR/node1.lcov
+    cat $COV_DIR/node1.lcov >> "$COV_DIR/$OUTPUT_BASENAME.lcov"
+    find $COV_DIR/ceph/src -name '*.gcda' -type f -delete
+""")
 
 
 class TestCoverage(object):
@@ -15,6 +43,7 @@ class TestCoverage(object):
             "--html-output": "html/output/dir",
             "--cov-tools-dir": "cov/tools/dir",
             "--verbose": True,
+            "--processes": "4",
             "<test_dir>": "some/test/dir",
         }
         coverage.main(args)
@@ -25,5 +54,61 @@ class TestCoverage(object):
             "cov/tools/dir",
             "some/other/dir",
             "html/output/dir",
-            False
+            False,
+            4,
         )
+
+    @patch('os.remove')
+    @patch('teuthology.coverage.merge_tracefiles')
+    def test_merge_tree(self, m_merge_tracefiles, m_remove):
+        m_merge_tracefiles.side_effect = lambda paths, out: out
+        output = coverage.merge_tree(['a', 'b', 'c', 'd', 'e'], 'total',
+                                     processes=1, fanin=2)
+        assert output == 'total'
+        assert m_merge_tracefiles.call_args_list == [
+            call(['a', 'b'], 'total.merge-0-0'),
+            call(['c', 'd'], 'total.merge-0-1'),
+            call(['e'], 'total.merge-0-2'),
+            call(['total.merge-0-0', 'total.merge-0-1'], 'total.merge-1-0'),
+            call(['total.merge-0-2'], 'total.merge-1-1'),
+            call(['total.merge-1-0', 'total.merge-1-1'], 'total'),
+        ]
+        removed = sorted(args[0] for args, _ in m_remove.call_args_list)
+        assert removed == ['total.merge-0-0', 'total.merge-0-1',
+                           'total.merge-0-2', 'total.merge-1-0',
+                           'total.merge-1-1']
+
+    def test_analyze_tests_at_once(self):
+        tmpdir = tempfile.mkdtemp()
+        try:
+            cov_tools_dir = os.path.join(tmpdir, 'tools')
+            os.mkdir(cov_tools_dir)
+            script = os.path.join(cov_tools_dir, 'cov-analyze.sh')
+            with open(script, 'w') as f:
+                f.write(FAKE_COV_ANALYZE)
+            os.chmod(script, stat.S_IRWXU)
+            lcov_output = os.path.join(tmpdir, 'lcov')
+            os.makedirs(os.path.join(lcov_output, 'ceph', 'src'))
+            with open(os.path.join(lcov_output, 'base.lcov'), 'w') as f:
+                f.write('base\n')
+            test_dir = os.path.join(tmpdir, 'tests')
+            tests = ['test1', 'test2']
+            for test in tests:
+                data_dir = os.path.join(test_dir, test, 'remote', 'node1',
+                                        'coverage')
+                os.makedirs(data_dir)
+                with open(os.path.join(data_dir, 'foo.gcda'), 'w') as f:
+                    f.write(test + '\n')
+            process_map(
+                functools.partial(coverage.analyze_test, test_dir=test_dir,
+                                  cov_tools_dir=cov_tools_dir,
+                                  lcov_output=lcov_output,
+                                  private_copy=True),
+                tests, 2)
+            for test in tests:
+                with open(os.path.join(lcov_output, test + '.lcov')) as f:
+                    assert f.read() == 'base\n' + test + '\n'
+            assert sorted(os.listdir(lcov_output)) == \
+                ['base.lcov', 'ceph', 'test1.lcov', 'test2.lcov']
+        finally:
+            shutil.rmtree(tmpdir)
@@ -1,9 +1,13 @@
 # -*- coding: utf-8 -*-
+import os
 import pytest
+import shutil
+import tempfile
 
 from fake_fs import make_fake_fstools
 from teuthology.describe_tests import (tree_with_info, extract_info,
-                                       get_combinations)
+                                       get_combinations, stream_combinations,
+                                       suite_fragments)
 from teuthology.exceptions import ParseError
 from mock import MagicMock, patch
 
@@ -220,6 +224,62 @@ class TestDescribeTests(object):
         self.assert_expected_combo_headers(headers)
         assert rows == [['basic', 'install', 'fixed-1', 'rbd_api_tests']]
 
+    def test_stream_combinations_limit(self):
+        headers, rows = stream_combinations('basic', [], None, 1, None, None,
+                                            False)
+        assert headers == []
+        assert list(rows) == [[]]
+
+
+def make_tree(path, fs):
+    for name, contents in fs.items():
+        child = os.path.join(path, name)
+        if isinstance(contents, dict):
+            os.mkdir(child)
+            make_tree(child, contents)
+        else:
+            with open(child, 'w') as f:
+                f.write(contents or '')
+
+
+class TestDescribeTestsProcesses(object):
+    """
+    Forked processes need a real filesystem, so these don't use fake_fs
+    """
+    def setup(self):
+        self.tmpdir = tempfile.mkdtemp()
+        make_tree(self.tmpdir, realistic_fs)
+        self.suite_dir = os.path.join(self.tmpdir, 'basic')
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_get_combinations(self):
+        expected = get_combinations(self.suite_dir, ['desc'], None, 0, None,
+                                    None, True)
+        assert len(expected[1]) == 2
+        assert get_combinations(self.suite_dir, ['desc'], None, 0, None,
+                                None, True, processes=2) == expected
+
+    def test_stream_combinations(self):
+        headers, rows = stream_combinations(self.suite_dir, ['rbd_features'],
+                                            None, 0, None, ['old_format'],
+                                            True, processes=2)
+        assert headers == ['subsuite depth 0', 'base', 'clusters',
+                           'workloads', 'rbd_features']
+        assert list(rows) == [['basic', 'install', 'fixed-1',
+                               'rbd_api_tests', 'default']]
+
+    def test_info_cache_filled_before_forking(self):
+        expected = get_combinations(self.suite_dir, ['desc'], None, 0, None,
+                                    None, True)
+        with patch('teuthology.describe_tests.extract_info',
+                   side_effect=extract_info) as m_extract_info:
+            assert get_combinations(self.suite_dir, ['desc'], None, 0, None,
+                                    None, True, processes=2) == expected
+        assert sorted(call[0][0] for call in m_extract_info.call_args_list) \
+            == sorted(suite_fragments(self.suite_dir))
+
 
 @patch('__builtin__.open')
 @patch('os.path.isdir')
@@ -0,0 +1,102 @@
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import time
+
+import yaml
+
+from teuthology import grep
+
+
+class TestGrep(object):
+    def setup(self):
+        self.archive = tempfile.mkdtemp()
+        self.make_job('run1', '1', 'all fine\n',
+                      dict(success=True))
+        self.make_job('run1', '2', 'FAILED assert x == 1\n',
+                      dict(success=False,
+                           failure_reason='Command failed on smithi012 with '
+                           'status 1: "sudo ceph osd 3"'))
+        self.make_job('run2', '3', 'failed ASSERT\n',
+                      dict(success=False,
+                           failure_reason='Command failed on smithi047 with '
+                           'status 1: "sudo ceph osd 17"'),
+                      compress=True)
+        self.make_job('run2', '4', 'ok\n',
+                      dict(success=False,
+                           failure_reason='timed out at 0xdeadbeef'))
+        os.utime(os.path.join(self.archive, 'run1'), (0, 0))
+
+    def teardown(self):
+        shutil.rmtree(self.archive)
+
+    def make_job(self, run, job, log_text, summary, compress=False):
+        job_dir = os.path.join(self.archive, run, job)
+        os.makedirs(os.path.join(job_dir, 'remote', 'node1', 'log'))
+        if compress:
+            with gzip.open(os.path.join(job_dir, 'teuthology.log.gz'),
+                           'wb') as f:
+                f.write(log_text)
+        else:
+            with open(os.path.join(job_dir, 'teuthology.log'), 'w') as f:
+                f.write(log_text)
+        with open(os.path.join(job_dir, 'remote', 'node1', 'log',
+                               'ceph-osd.0.log'), 'w') as f:
+            f.write('osd log\n')
+        with open(os.path.join(job_dir, 'summary.yaml'), 'w') as f:
+            yaml.safe_dump(summary, f)
+
+    def test_find_runs(self):
+        assert grep.find_runs(self.archive) == ['run2', 'run1']
+        assert grep.find_runs(self.archive, 1) == ['run2']
+
+    def test_find_logs(self):
+        run_dir = os.path.join(self.archive, 'run2')
+        assert [os.path.basename(p) for p in grep.find_logs(run_dir)] == \
+            ['teuthology.log.gz', 'teuthology.log']
+        assert len(grep.find_logs(run_dir, remote=True)) == 4
+
+    def test_grep_logs(self):
+        paths = list()
+        for run in ('run1', 'run2'):
+            paths.extend(grep.find_logs(os.path.join(self.archive, run)))
+        results = dict(grep.grep_logs(paths, 'assert', re.IGNORECASE,
+                                      processes=2))
+        matched = sorted(os.path.relpath(path, self.archive)
+                         for path, matches in results.items() if matches)
+        assert matched == ['run1/2/teuthology.log',
+                           'run2/3/teuthology.log.gz']
+        results = dict(grep.grep_logs(paths, 'assert'))
+        assert results[paths[1]] == [(1, 'FAILED assert x == 1\n')]
+
+    def test_normalize_reason(self):
+        assert grep.normalize_reason(
+            'Command failed on smithi012 with status 1: "sudo ceph osd 3"') \
+            == 'Command failed on smithiN with status N: "sudo ceph osd N"'
+        assert grep.normalize_reason(
+            'error at 0x7f00 on 10.0.0.1:6789 at 2016-10-18 15:22:33.1') == \
+            'error at <hex> on <ip> at <time>'
+
+    def test_failures(self):
+        grep.update_index(self.archive, ['run1', 'run2'], processes=1)
+        failures = grep.lookup_failures(self.archive)
+        assert failures[0] == (
+            'Command failed on smithiN with status N: "sudo ceph osd N"',
+            ['run1/2', 'run2/3'])
+        assert len(failures) == 2
+        assert grep.lookup_failures(self.archive, 'timed out') == [
+            ('timed out at <hex>', ['run2/4'])]
+
+    def test_index_skips_unchanged(self):
+        index = grep.update_index(self.archive, ['run1'])
+        mtime = index['runs']['run1']['mtime']
+        index = grep.update_index(self.archive, ['run1', 'run2'])
+        assert index['runs']['run1']['mtime'] == mtime
+        self.make_job('run1', '5', '',
+                      dict(success=False, failure_reason='new'))
+        future = time.time() + 10
+        os.utime(os.path.join(self.archive, 'run1', '5'), (future, future))
+        index = grep.update_index(self.archive, ['run1'])
+        assert index['runs']['run1']['jobs']['5'] == 'new'
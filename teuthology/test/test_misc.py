@@ -168,6 +168,22 @@ def test_all_roles_of_type():
         assert ids == expected_ids
 
 
+def test_role_helpers_with_cluster():
+    remote1, remote2 = FakeRemote(), FakeRemote()
+    cluster_ = cluster.Cluster(
+        remotes=[
+            (remote1, ['mon.a', 'osd.0', 'foo.osd.2']),
+            (remote2, ['mon.b', 'osd.1', 'client.0']),
+        ],
+    )
+    assert sorted(misc.all_roles_of_type(cluster_, 'osd')) == ['0', '1', '2']
+    assert misc.num_instances_of_type(cluster_, 'osd') == 2
+    assert misc.num_instances_of_type(cluster_, 'osd', 'foo') == 1
+    ctx = argparse.Namespace(cluster=cluster_)
+    assert sorted(misc.get_mon_names(ctx)) == ['mon.a', 'mon.b']
+    assert list(misc.get_clients(ctx, ['client.0'])) == [('0', remote2)]
+
+
 def test_get_http_log_path():
     # Fake configuration
     archive_server = "http://example.com/server_root"
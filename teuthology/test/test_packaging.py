@@ -1,3 +1,4 @@
+import gevent
 import pytest
 
 from mock import patch, Mock
@@ -277,7 +278,7 @@ class TestPackaging(object):
     def test_get_koji_task_result_package_name(self, input, expected):
         assert packaging._get_koji_task_result_package_name(input) == expected
 
-    @patch("requests.get")
+    @patch("requests.Session.get")
     def test_get_response_success(self, m_get):
         resp = Mock()
         resp.ok = True
@@ -285,21 +286,126 @@ class TestPackaging(object):
         result = packaging._get_response("google.com")
         assert result == resp
 
-    @patch("requests.get")
-    def test_get_response_failed_wait(self, m_get):
+    @patch("time.sleep")
+    @patch("requests.Session.head")
+    @patch("requests.Session.get")
+    def test_get_response_failed_wait(self, m_get, m_head, m_sleep):
         resp = Mock()
         resp.ok = False
+        resp.status_code = 404
         m_get.return_value = resp
-        packaging._get_response("google.com", wait=True, sleep=1, tries=2)
-        assert m_get.call_count == 2
+        m_head.return_value = resp
+        packaging._get_response("google.com", wait=True, timeout=0)
+        assert m_head.call_count == 1
+        assert m_get.call_count == 1
 
-    @patch("requests.get")
-    def test_get_response_failed_no_wait(self, m_get):
+    @patch("requests.Session.head")
+    @patch("requests.Session.get")
+    def test_get_response_failed_no_wait(self, m_get, m_head):
         resp = Mock()
         resp.ok = False
         m_get.return_value = resp
-        packaging._get_response("google.com", sleep=1, tries=2)
+        packaging._get_response("google.com")
         assert m_get.call_count == 1
+        assert m_head.call_count == 0
+
+
+class TestAvailabilityWaiter(object):
+    def setup(self):
+        self.waiter = packaging.AvailabilityWaiter()
+        self.p_head = patch("requests.Session.head")
+        self.m_head = self.p_head.start()
+        self.p_sleep = patch("time.sleep")
+        self.m_sleep = self.p_sleep.start()
+
+    def teardown(self):
+        self.p_head.stop()
+        self.p_sleep.stop()
+
+    def response(self, status_code, headers=None):
+        resp = Mock()
+        resp.status_code = status_code
+        resp.headers = headers or dict()
+        return resp
+
+    def test_wait_backoff(self):
+        self.m_head.side_effect = [self.response(404)] * 4 + \
+            [self.response(200)]
+        assert self.waiter.wait("http://host/version", timeout=300)
+        assert self.m_head.call_count == 5
+        delays = [args[0] for args, _ in self.m_sleep.call_args_list]
+        for delay, bound in zip(delays, [2, 4, 8, 16]):
+            assert bound / 2.0 <= delay <= bound
+
+    def test_wait_deadline(self):
+        self.m_head.return_value = self.response(404)
+        assert not self.waiter.wait("http://host/version", timeout=0)
+        assert self.m_head.call_count == 1
+
+    def test_conditional_probe(self):
+        self.m_head.side_effect = [
+            self.response(200, dict(ETag='"abc"')),
+            self.response(304),
+        ]
+        assert self.waiter.wait("http://host/version")
+        assert self.waiter.wait("http://host/version")
+        headers = self.m_head.call_args_list[1][1]['headers']
+        assert headers == {'If-None-Match': '"abc"'}
+
+    def test_shared_probe(self):
+        def head(url, **kwargs):
+            gevent.sleep(0.1)
+            return self.response(200)
+        self.m_head.side_effect = head
+        greenlets = [gevent.spawn(self.waiter.wait, "http://host/version")
+                     for i in range(5)]
+        gevent.joinall(greenlets)
+        assert all(g.value for g in greenlets)
+        assert self.m_head.call_count == 1
+
+
+class TestBuildCache(object):
+    def setup(self):
+        self.cache = packaging.BuildCache()
+        self.p_config = patch('teuthology.packaging.config')
+        self.m_config = self.p_config.start()
+        self.m_config.build_metadata_ttl = 300
+
+    def teardown(self):
+        self.p_config.stop()
+
+    def test_get(self):
+        fetch = Mock(return_value='0.90.0')
+        assert self.cache.get(('version', 'ceph'), fetch) == '0.90.0'
+        assert self.cache.get(('version', 'ceph'), fetch) == '0.90.0'
+        assert fetch.call_count == 1
+        assert (self.cache.hits, self.cache.misses) == (1, 1)
+
+    def test_none_not_cached(self):
+        fetch = Mock(return_value=None)
+        self.cache.get('key', fetch)
+        self.cache.get('key', fetch)
+        assert fetch.call_count == 2
+
+    def test_ttl(self):
+        self.m_config.build_metadata_ttl = 0
+        fetch = Mock(return_value='value')
+        self.cache.get('key', fetch)
+        self.cache.get('key', fetch)
+        assert fetch.call_count == 2
+
+    def test_concurrent_lookups(self):
+        calls = []
+
+        def fetch():
+            calls.append(1)
+            gevent.sleep(0.1)
+            return 'value'
+        greenlets = [gevent.spawn(self.cache.get, 'key', fetch)
+                     for i in range(5)]
+        gevent.joinall(greenlets)
+        assert [g.value for g in greenlets] == ['value'] * 5
+        assert len(calls) == 1
 
 
 class TestBuilderProject(object):
@@ -531,11 +637,13 @@ class TestGitbuilderProject(TestBuilderProject):
         self.m_config.baseurl_template = \
             'http://{host}/{proj}-{pkg_type}-{dist}-{arch}-{flavor}/{uri}'
         self.m_config.gitbuilder_host = "gitbuilder.ceph.com"
+        self.m_config.build_metadata_ttl = 300
+        packaging._build_cache.clear()
         self.p_get_config_value = \
             patch('teuthology.packaging._get_config_value_for_remote')
         self.m_get_config_value = self.p_get_config_value.start()
         self.m_get_config_value.return_value = None
-        self.p_get = patch('requests.get')
+        self.p_get = patch('requests.Session.get')
         self.m_get = self.p_get.start()
         self.p_get_response = patch("teuthology.packaging._get_response")
         self.m_get_response = self.p_get_response.start()
@@ -596,6 +704,45 @@ class TestGitbuilderProject(TestBuilderProject):
         super(TestGitbuilderProject, self)\
             .test_get_package_sha1_fetched_not_found()
 
+    def test_version_shared(self):
+        resp = Mock()
+        resp.ok = True
+        resp.text = "0.90.0"
+        self.m_get_response.return_value = resp
+        ctx = dict(foo="bar")
+        for i in range(3):
+            gp = self.klass("ceph", {}, ctx=ctx, remote=self._get_remote())
+            assert gp.version == "0.90.0"
+        assert self.m_get_response.call_count == 1
+        gp = self.klass("ceph", {}, ctx=ctx,
+                        remote=self._get_remote(codename="xenial"))
+        assert gp.version == "0.90.0"
+        assert self.m_get_response.call_count == 2
+
+    def test_warm_build_cache(self):
+        self.m_config.use_shaman = False
+        resp = Mock()
+        resp.ok = True
+        resp.text = "the_text"
+        self.m_get.return_value = resp
+        self.m_get_response.return_value = resp
+        remotes = [self._get_remote() for i in range(4)]
+        remotes.append(self._get_remote(arch='aarch64'))
+        ctx = dict(foo="bar")
+        packaging.warm_build_cache("ceph", {}, ctx, remotes)
+        assert self.m_get.call_count == 2
+        assert self.m_get_response.call_count == 2
+        gp = self.klass("ceph", {}, ctx=ctx, remote=remotes[-1])
+        assert (gp.sha1, gp.version) == ("the_text", "the_text")
+        assert self.m_get.call_count == 2
+        assert self.m_get_response.call_count == 2
+
+    def test_warm_build_cache_error(self):
+        self.m_config.use_shaman = False
+        self.m_get_config_value.side_effect = RuntimeError("no os")
+        remotes = [self._get_remote()]
+        packaging.warm_build_cache("ceph", {}, dict(foo="bar"), remotes)
+
     DISTRO_MATRIX = [
         ('rhel', '7.0', None, 'centos7'),
         ('centos', '6.5', None, 'centos6'),
@@ -620,11 +767,13 @@ class TestShamanProject(TestBuilderProject):
         self.m_config = self.p_config.start()
         self.m_config.use_shaman = True
         self.m_config.shaman_host = 'shaman.ceph.com'
+        self.m_config.build_metadata_ttl = 300
+        packaging._build_cache.clear()
         self.p_get_config_value = \
             patch('teuthology.packaging._get_config_value_for_remote')
         self.m_get_config_value = self.p_get_config_value.start()
         self.m_get_config_value.return_value = None
-        self.p_get = patch('requests.get')
+        self.p_get = patch('requests.Session.get')
         self.m_get = self.p_get.start()
 
     def teardown(self):
@@ -735,6 +884,16 @@ class TestShamanProject(TestBuilderProject):
         super(TestShamanProject, self)\
             .test_get_package_sha1_fetched_not_found()
 
+    def test_not_found_not_cached(self):
+        resp = Mock()
+        resp.json.return_value = []
+        self.m_get.return_value = resp
+        ctx = dict(foo="bar")
+        for i in range(2):
+            gp = self.klass("ceph", {}, ctx=ctx, remote=self._get_remote())
+            assert not gp.sha1
+        assert self.m_get.call_count == 2
+
     DISTRO_MATRIX = [
         ('rhel', '7.0', None, 'centos/7'),
         ('centos', '6.5', None, 'centos/6'),
@@ -1,4 +1,8 @@
-from ..parallel import parallel
+import gevent
+
+from pytest import raises
+
+from ..parallel import parallel, process_map
 
 
 def identity(item, input_set=None, remove=False):
@@ -26,3 +30,44 @@ class TestParallel(object):
             for result in para:
                 in_set.remove(result)
 
+
+    def test_size(self):
+        running = set()
+        peak = [0]
+
+        def track(item):
+            running.add(item)
+            peak[0] = max(peak[0], len(running))
+            gevent.sleep(0.01)
+            running.remove(item)
+            return item
+
+        with parallel(size=3) as para:
+            for i in range(10):
+                para.spawn(track, i)
+            assert sorted(para) == range(10)
+        assert peak[0] == 3
+
+
+def square(item):
+    return item * item
+
+
+def fail_on_three(item):
+    if item == 3:
+        raise ValueError(item)
+    return item
+
+
+class TestProcessMap(object):
+    def test_order(self):
+        assert process_map(square, range(10), processes=3) == \
+            [i * i for i in range(10)]
+
+    def test_single_process(self):
+        assert process_map(square, [2, 3], processes=1) == [4, 9]
+        assert process_map(square, []) == []
+
+    def test_error(self):
+        with raises(ValueError):
+            process_map(fail_on_three, range(5), processes=2)
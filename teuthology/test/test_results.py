@@ -1,6 +1,11 @@
+import gevent
+import os
+import shutil
+import tempfile
 import textwrap
+import time
 from ..config import config
-from .. import results
+from .. import dirwatch, results
 
 from teuthology import report
 
@@ -154,3 +159,73 @@ class TestResultsEmail(object):
                 run_name, _reporter=reporter)
         assert subject == self.reference['subject']
         assert body == self.reference['body']
+
+
+class FakeReporter(object):
+    """
+    Reports a job as running until its summary.yaml exists
+    """
+    def __init__(self, archive_dir, job_ids):
+        self.archive_dir = archive_dir
+        self.job_ids = job_ids
+        self.calls = 0
+
+    def get_jobs(self, name, fields=None):
+        self.calls += 1
+        return [
+            dict(job_id=job_id, status='pass' if os.path.exists(
+                os.path.join(self.archive_dir, str(job_id), 'summary.yaml'))
+                else 'running')
+            for job_id in self.job_ids
+        ]
+
+
+class TestWaitForJobs(object):
+    def setup(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.reporter = FakeReporter(self.archive_dir, [1, 2])
+
+    def teardown(self):
+        shutil.rmtree(self.archive_dir)
+
+    def finish(self, job_id, delay=0):
+        gevent.sleep(delay)
+        job_dir = os.path.join(self.archive_dir, str(job_id))
+        if not os.path.isdir(job_dir):
+            os.mkdir(job_dir)
+        open(os.path.join(job_dir, 'summary.yaml'), 'w').close()
+
+    def test_already_finished(self):
+        self.finish(1)
+        self.finish(2)
+        assert results.wait_for_jobs(self.archive_dir, 'run', 60,
+                                     self.reporter)
+        assert self.reporter.calls == 1
+
+    def test_watches_archive(self):
+        os.mkdir(os.path.join(self.archive_dir, '1'))
+        gevent.spawn(self.finish, 1, 0.1)
+        gevent.spawn(self.finish, 2, 0.2)
+        start = time.time()
+        assert results.wait_for_jobs(self.archive_dir, 'run', 60,
+                                     self.reporter)
+        assert time.time() - start < 5
+        assert self.reporter.calls == 2
+
+    def test_polling_fallback(self):
+        gevent.spawn(self.finish, 1, 0.1)
+        gevent.spawn(self.finish, 2, 0.1)
+        with patch.multiple(dirwatch, _libc=None, POLL_INTERVAL=0.05):
+            assert results.wait_for_jobs(self.archive_dir, 'run', 60,
+                                         self.reporter)
+        assert self.reporter.calls == 2
+
+    def test_timeout(self):
+        self.finish(1)
+        assert not results.wait_for_jobs(self.archive_dir, 'run', 0.2,
+                                         self.reporter)
+
+    def test_poll_interval(self):
+        assert results.poll_interval(0) == results.MIN_POLL_INTERVAL
+        assert results.poll_interval(2) == 2 * results.MIN_POLL_INTERVAL
+        assert results.poll_interval(1000) == results.MAX_POLL_INTERVAL
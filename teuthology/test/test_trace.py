@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+
+from teuthology import trace
+from teuthology.orchestra.trace import TRACE_FILENAME
+
+
+def make_record(host, task, start, end, exitstatus=0, command='true'):
+    return dict(
+        host=host,
+        label=None,
+        task=task,
+        command=command,
+        start=start,
+        end=end,
+        exitstatus=exitstatus,
+        stdout_bytes=10,
+        stderr_bytes=None,
+    )
+
+
+class TestTrace(object):
+    def setup(self):
+        self.run_dir = tempfile.mkdtemp()
+
+    def teardown(self):
+        shutil.rmtree(self.run_dir)
+
+    def write_job(self, job_id, records, extra_lines=()):
+        job_dir = os.path.join(self.run_dir, job_id)
+        os.mkdir(job_dir)
+        with open(os.path.join(job_dir, TRACE_FILENAME), 'w') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+            for line in extra_lines:
+                f.write(line)
+        return job_dir
+
+    def test_find_trace_files_run(self):
+        self.write_job('1', [])
+        self.write_job('2', [])
+        os.mkdir(os.path.join(self.run_dir, '3'))
+        found = trace.find_trace_files(self.run_dir)
+        assert [job for (job, path) in found] == ['1', '2']
+
+    def test_find_trace_files_job(self):
+        job_dir = self.write_job('7', [])
+        found = trace.find_trace_files(job_dir)
+        assert found == [('7', os.path.join(job_dir, TRACE_FILENAME))]
+
+    def test_load_records_skips_truncated(self):
+        self.write_job(
+            '1', [make_record('a', 'ceph', 0, 2)], extra_lines=['{"host": '])
+        records = list(trace.load_records(self.run_dir))
+        assert len(records) == 1
+        assert records[0]['job'] == '1'
+        assert records[0]['duration'] == 2
+
+    def test_summarize(self):
+        self.write_job('1', [
+            make_record('a', 'install', 0, 5),
+            make_record('b', 'install', 0, 1),
+            make_record('a', 'ceph', 10, 30, exitstatus=1, command='slow'),
+        ])
+        self.write_job('2', [
+            make_record('b', 'ceph', 0, 3),
+        ])
+        summary = trace.summarize(trace.load_records(self.run_dir), top=2)
+        assert summary['total']['commands'] == 4
+        assert summary['total']['failed'] == 1
+        assert summary['total']['stdout_bytes'] == 40
+        assert [r['command'] for r in summary['slowest']] == ['slow', 'true']
+        assert summary['slowest'][1]['duration'] == 5
+        assert summary['hosts']['a']['duration'] == 25
+        assert summary['hosts']['b']['commands'] == 2
+        assert summary['tasks']['ceph']['duration'] == 23
+        assert summary['tasks']['install']['commands'] == 2
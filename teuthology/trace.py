@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+
+import teuthology
+from .ls import get_jobs
+from .orchestra.trace import TRACE_FILENAME
+
+log = logging.getLogger(__name__)
+
+
+def main(args):
+    """
+    Main function; parses args and prints a summary of the command traces
+    found in the archive
+    """
+    if args['--verbose']:
+        teuthology.log.setLevel(logging.DEBUG)
+    records = load_records(args['<archive_dir>'])
+    summary = summarize(records, top=int(args['--top']))
+    if args['--json']:
+        print json.dumps(summary, indent=2, sort_keys=True)
+    else:
+        print_summary(summary)
+
+
+def find_trace_files(archive_dir):
+    """
+    Find the trace files below archive_dir, which may either be a single job's
+    archive directory or a run's archive directory
+
+    :returns: A list of (job_id, path) tuples
+    """
+    job_trace = os.path.join(archive_dir, TRACE_FILENAME)
+    if os.path.isfile(job_trace):
+        return [(os.path.basename(archive_dir.rstrip('/')), job_trace)]
+    found = list()
+    for job_id in get_jobs(archive_dir):
+        path = os.path.join(archive_dir, job_id, TRACE_FILENAME)
+        if os.path.isfile(path):
+            found.append((job_id, path))
+    return found
+
+
+def load_records(archive_dir):
+    """
+    Read every command record below archive_dir. Each record gets a 'job' key
+    and a 'duration' key added. Records which cannot be parsed, e.g. a line
+    truncated by a killed job, are skipped.
+    """
+    for job_id, path in find_trace_files(archive_dir):
+        with open(path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    log.debug("Skipping malformed record in %s", path)
+                    continue
+                record['job'] = job_id
+                if None not in (record.get('start'), record.get('end')):
+                    record['duration'] = record['end'] - record['start']
+                else:
+                    record['duration'] = 0.0
+                yield record
+
+
+def _new_totals():
+    return dict(
+        commands=0,
+        failed=0,
+        duration=0.0,
+        stdout_bytes=0,
+        stderr_bytes=0,
+    )
+
+
+def _add_to_totals(totals, record):
+    totals['commands'] += 1
+    if record.get('exitstatus') != 0:
+        totals['failed'] += 1
+    totals['duration'] += record['duration']
+    totals['stdout_bytes'] += record.get('stdout_bytes') or 0
+    totals['stderr_bytes'] += record.get('stderr_bytes') or 0
+
+
+def summarize(records, top=10):
+    """
+    Aggregate command records
+
+    :param records: An iterable of records, as returned by load_records()
+    :param top:     How many of the slowest commands to report
+    :returns:       A dict with the keys 'total', 'slowest', 'hosts' and
+                    'tasks'. 'hosts' and 'tasks' map a host or task name to
+                    its totals.
+    """
+    total = _new_totals()
+    hosts = dict()
+    tasks = dict()
+    slowest = list()
+    for record in records:
+        _add_to_totals(total, record)
+        _add_to_totals(
+            hosts.setdefault(record.get('host'), _new_totals()), record)
+        _add_to_totals(
+            tasks.setdefault(record.get('task'), _new_totals()), record)
+        slowest.append(record)
+        if len(slowest) > top * 2:
+            slowest.sort(key=lambda r: r['duration'], reverse=True)
+            del slowest[top:]
+    slowest.sort(key=lambda r: r['duration'], reverse=True)
+    return dict(
+        total=total,
+        slowest=slowest[:top],
+        hosts=hosts,
+        tasks=tasks,
+    )
+
+
+def print_summary(summary):
+    total = summary['total']
+    print "{commands} commands ({failed} failed) took {duration:.1f}s".format(
+        **total)
+
+    print "\nSlowest commands:"
+    for record in summary['slowest']:
+        print "  {duration:9.1f}s {job} {host} [{task}] {command}".format(
+            **record)
+
+    for kind in ('hosts', 'tasks'):
+        print "\nPer-{0} totals:".format(kind[:-1])
+        items = sorted(summary[kind].items(),
+                       key=lambda item: item[1]['duration'], reverse=True)
+        for name, totals in items:
+            print ("  {duration:9.1f}s {commands:6d} cmds {failed:4d} failed "
+                   "{stdout_bytes:12d} out {stderr_bytes:10d} err  {name}"
+                   ).format(name=name, **totals)